@@ -1,16 +1,18 @@
-import json
 import os
 import uuid
 from pathlib import Path
 import minecraft_launcher_lib
 from datetime import datetime, timedelta
 
+from state_store import open_store
+
 class AccountManager:
     """Gestisce gli account Minecraft (Microsoft e Offline)"""
     
     def __init__(self, launcher_directory):
         self.launcher_directory = launcher_directory
         self.accounts_file = os.path.join(launcher_directory, "accounts.json")
+        self.store = open_store(self.accounts_file, default=lambda: {"profiles": {}, "last_used": None})
         self.accounts = self.load_accounts()
         self.current_account = None
         
@@ -22,18 +24,11 @@ class AccountManager:
     
     def load_accounts(self):
         """Carica gli account salvati"""
-        if os.path.exists(self.accounts_file):
-            try:
-                with open(self.accounts_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except:
-                pass
-        return {"profiles": {}, "last_used": None}
+        return self.store.load()
     
     def save_accounts(self):
-        """Salva gli account su file"""
-        with open(self.accounts_file, 'w', encoding='utf-8') as f:
-            json.dump(self.accounts, f, indent=2)
+        """Salva gli account su file (subito: un refresh token rinnovato non deve andare perso)"""
+        self.store.save(self.accounts, immediate=True)
     
     def add_offline_account(self, username):
         """Aggiunge un account offline"""
@@ -74,6 +69,24 @@ class AccountManager:
         
         return account
     
+    def update_microsoft_tokens(self, account_id, auth_data):
+        """Aggiorna i token di un account dopo un rinnovo, senza cambiare l'account attivo"""
+        account = self.accounts["profiles"].get(account_id)
+        if not account or account.get("type") != "microsoft":
+            return False
+        account.update({
+            "username": auth_data.get("name", account["username"]),
+            "access_token": auth_data["access_token"],
+            "refresh_token": auth_data.get("refresh_token") or account.get("refresh_token"),
+            "expires_at": (datetime.now() + timedelta(seconds=auth_data.get("expires_in", 3600))).isoformat()
+        })
+        self.save_accounts()
+        return True
+    
+    def get_current_account_id(self):
+        """Ritorna l'id dell'account attivo"""
+        return self.accounts.get("last_used") if self.current_account else None
+    
     def remove_account(self, account_id):
         """Rimuove un account"""
         if account_id in self.accounts["profiles"]:
@@ -0,0 +1,79 @@
+import socket
+import threading
+
+
+class OperationCancelled(Exception):
+    """Sollevata dai cicli di download, hash e installazione quando l'operazione viene annullata"""
+
+
+def abort_response(response):
+    """
+    Interrompe da un altro thread una risposta requests in streaming.
+    response.close() non sblocca una lettura già in attesa sul socket: serve lo shutdown.
+    """
+    raw = getattr(response, "raw", None)
+    connection = getattr(raw, "_connection", None) or getattr(raw, "connection", None)
+    sock = getattr(connection, "sock", None)
+    if sock is None:
+        # La connessione può essere già staccata dalla risposta: socket di http.client
+        fp = getattr(getattr(raw, "_fp", None), "fp", None)
+        sock = getattr(getattr(fp, "raw", None), "_sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    response.close()
+
+
+class CancelToken:
+    """
+    Richiesta di annullamento condivisa tra il thread principale e un task in background.
+
+    I cicli lunghi chiamano check() a ogni blocco. Le operazioni bloccanti (una
+    lettura dalla rete) registrano con on_cancel una funzione che le interrompe,
+    ad esempio abort_response sulla risposta HTTP.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    def wait(self, timeout):
+        """Attende fino a timeout secondi; ritorna True se nel frattempo l'operazione è stata annullata"""
+        return self._event.wait(timeout)
+
+    def check(self):
+        if self._event.is_set():
+            raise OperationCancelled()
+
+    def on_cancel(self, callback):
+        """Registra callback da chiamare all'annullamento; ritorna una funzione per rimuoverla"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._remove(callback)
+        callback()
+        return lambda: None
+
+    def _remove(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
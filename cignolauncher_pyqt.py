@@ -1,28 +1,51 @@
 import sys
 import os
-import json
 import hashlib
 import requests
 import subprocess
 import threading
 import shutil
 import hashlib
+import time
 from pathlib import Path
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import minecraft_launcher_lib
 
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
-                             QPushButton, QLabel, QProgressBar, QStackedWidget, QPlainTextEdit,
+                             QPushButton, QLabel, QProgressBar, QStackedWidget,
                              QSpinBox, QFrame, QGroupBox, QMessageBox, QSpacerItem, QSizePolicy,
-                             QListWidget, QListWidgetItem, QButtonGroup, QTextBrowser)
-from PyQt6.QtGui import QIcon, QFont, QTextCursor, QPixmap, QMovie
-from PyQt6.QtCore import QObject, QThread, pyqtSignal, Qt, pyqtSlot, QEvent, QSize
+                             QListWidget, QListWidgetItem, QButtonGroup, QTextBrowser,
+                             QComboBox, QCheckBox, QSystemTrayIcon, QLineEdit)
+from PyQt6.QtGui import QIcon, QFont, QPixmap, QMovie, QPixmapCache
+from PyQt6.QtCore import QObject, QThread, pyqtSignal, Qt, pyqtSlot, QEvent, QSize, QTimer
 
 # Importa le classi convertite
 from account_manager import AccountManager
 from login_dialog_pyqt import LoginDialog, CustomMessageBox
-from utils import ImageDownloader
+from utils import ImageService
+from maintenance import OrphanCollector, VersionCollector, format_size
+from installer import VanillaInstaller, ForgeArtifactCache
+from launch_cache import LaunchCommandCache
+from jvm_tuning import (ClassDataSharing, JVM_PROFILES, MODPACK_MIN_HEAP_GB, GB, get_system_memory,
+                        get_java_major_version, recommend_heap_gb, free_memory_warning, build_jvm_arguments)
+from settings import LauncherSettings
+import process_tuning
+from game_log import GameLogPipeline
+from log_viewer import LogViewer, LEVEL_CODES, INFO, parse_game_level
+from game_session import BootPhaseParser, SessionHistory, mods_fingerprint
+from process_sampler import ProcessSampler, launcher_footprint, cpu_percent_between
+from gc_analysis import gc_log_arguments, parse_gc_log, recommend_heap_from_gc
+from watchdog import StallWatchdog
+from news_cache import NewsAssetCache
+from token_refresh import TokenRefresher
+from state_store import open_store, flush_all, set_error_handler
+from hash_index import HashIndex
+from sync_journal import SyncJournal
+from cancellation import CancelToken, OperationCancelled
+from downloads import Downloader, DOWNLOAD_ORDERS, order_files
+from mirrors import MirrorSet, pick_probe_file
+from retry import RetryPolicy, HostCircuitBreakers
 
 # Monkey-patch per nascondere le finestre della console su Windows
 # durante l'installazione di Forge.
@@ -61,28 +84,50 @@ class Worker(QObject):
     update_check_complete = pyqtSignal(list)
     news_ready = pyqtSignal(str)
     news_animation_ready = pyqtSignal(str)
+    version_gc_ready = pyqtSignal(dict)
+    critical_files_ready = pyqtSignal(dict)
     
     def __init__(self, target, *args, **kwargs):
         super().__init__()
         self.target = target
         self.args = args
         self.kwargs = kwargs
+        self.low_priority = False
+        self.cancel_token = CancelToken()
+        self.started_at = None
 
     def run(self):
+        self.started_at = time.perf_counter()
+        if self.low_priority:
+            process_tuning.demote_current_thread()
         try:
             self.target(*self.args, **self.kwargs)
+        except OperationCancelled:
+            self.log_message.emit("Operazione annullata. I download interrotti riprenderanno dal punto raggiunto.", "WARN")
+            self.status_update.emit("Operazione annullata", "WARN")
         except Exception as e:
             self.log_message.emit(f"Errore critico nel thread: {e}", "ERROR")
             self.status_update.emit(f"Errore: {e}", "ERROR")
         finally:
             self.finished.emit()
 
-# Classe evento per il logging
+# Resource pack e shader pack non servono per raggiungere il menu principale: continuano a scaricarsi
+# in background. Tutte le altre categorie (anche quelle aggiunte in futuro al manifest) sono essenziali
+DEFERRABLE_CATEGORIES = {"resourcepacks", "shaderpacks"}
+
+# Larghezza a cui viene mostrata (e salvata in cache) l'animazione delle news
+NEWS_ANIMATION_WIDTH = 350
+
+# Numero massimo di righe mantenute nella console
+LOG_CAPACITY = 1_000_000
+
+# Classe evento per il logging (un blocco di righe del gioco per evento)
 class LogEvent(QEvent):
     EVENT_TYPE = QEvent.Type(QEvent.registerEventType())
-    def __init__(self, message):
+    def __init__(self, lines, done):
         super().__init__(self.EVENT_TYPE)
-        self.message = message
+        self.lines = lines
+        self.done = done
 
 # Evento per la chiusura del gioco
 class GameClosedEvent(QEvent):
@@ -90,7 +135,32 @@ class GameClosedEvent(QEvent):
     def __init__(self):
         super().__init__(self.EVENT_TYPE)
 
+# Evento per un blocco del gioco rilevato dal watchdog
+class StallEvent(QEvent):
+    EVENT_TYPE = QEvent.Type(QEvent.registerEventType())
+    def __init__(self, reason, bundle):
+        super().__init__(self.EVENT_TYPE)
+        self.reason = reason
+        self.bundle = bundle
+
+# Evento per un salvataggio dei file di stato non riuscito (dal thread che scrive)
+class StoreErrorEvent(QEvent):
+    EVENT_TYPE = QEvent.Type(QEvent.registerEventType())
+    def __init__(self, message):
+        super().__init__(self.EVENT_TYPE)
+        self.message = message
+
 class MinecraftLauncher(QMainWindow):
+
+    # Sessioni precedenti con log del GC usate per il confronto
+    GC_COMPARE_SESSIONS = 5
+    # Finestre di misura del consumo del launcher prima e durante la modalità gioco
+    GAME_MODE_BASELINE_MS = 3000
+    GAME_MODE_MEASURE_MS = 10000
+    # Attesa massima del task in background alla chiusura, dopo averlo annullato
+    SHUTDOWN_TIMEOUT_MS = 3000
+    # Download paralleli durante la sincronizzazione del modpack
+    DOWNLOAD_WORKERS = 4
     
     def __init__(self):
         super().__init__()
@@ -100,16 +170,61 @@ class MinecraftLauncher(QMainWindow):
         self.forge_version = "1.20.1-47.4.6"
         self.setup_paths()
         self.account_manager = AccountManager(self.launcher_directory)
+        self.image_service = ImageService(self.heads_folder, parent=self)
+        self.news_cache = NewsAssetCache(self.news_assets_folder, log=lambda message, level="INFO": self.worker.log_message.emit(message, level))
+        self.settings = LauncherSettings(self.launcher_directory)
         self.game_process = None
         self.AZURE_CLIENT_ID = os.getenv("AZURE_CLIENT_ID", "your-client-id")
         self.AZURE_CLIENT_SECRET = os.getenv("AZURE_CLIENT_SECRET", "your-secret-value")
         self.install_state_file = os.path.join(self.launcher_directory, "install_state.json")
+        self.install_state = open_store(self.install_state_file)
+        self.shutdown_stats = open_store(os.path.join(self.launcher_directory, "shutdown.json"))
+        self.hash_index = HashIndex(self.launcher_directory)
+        self.launch_cache = LaunchCommandCache(self.launcher_directory, self.minecraft_directory)
+        self.last_launch_timing = None
+        self.class_data_sharing = ClassDataSharing(self.launcher_directory)
+        self.game_start_time = None
+        self.boot_completed = False
+        self.game_log = None
+        self.session_history = SessionHistory(self.launcher_directory)
+        self.current_session = None
+        self.boot_parser = None
+        self.downloader = None
+        self.process_sampler = None
+        self.priority_warning_shown = False
+        self.gc_log_path = None
+        self.stall_watchdog = None
+        self.game_mode = False
+        self.game_mode_footprint = None
+        self.footprint_baseline = None
+        self.footprint_game = None
+        self.tray_icon = None
+        self.pending_launch_since = None
+        self.playable_during_task = False
+        self.sampler_timer = QTimer(self)
+        self.sampler_timer.timeout.connect(self.sample_game_process)
         self.setupUi()
         self.apply_stylesheet()
+        # Da qui la console esiste: gli errori di salvataggio (anche quelli già avvenuti) finiscono nel log
+        set_error_handler(lambda message: QApplication.postEvent(self, StoreErrorEvent(message)))
+        last_shutdown = self.shutdown_stats.load()
+        if last_shutdown.get("close_to_exit_ms") is not None:
+            self.log(f"Ultima chiusura del launcher in {last_shutdown['close_to_exit_ms']} ms"
+                     f"{' (task in background annullato)' if last_shutdown.get('cancelled_task') else ''}", "INFO")
+        if last_shutdown.get("warning"):
+            # La console della chiusura precedente non è più visibile: l'avviso viene ripetuto qui
+            self.log(f"Ultima chiusura: {last_shutdown['warning']}", "WARN")
         self.worker_thread = None
         self.worker = None
+        self.token_refresher = TokenRefresher(
+            self.account_manager, self.AZURE_CLIENT_ID, self.AZURE_CLIENT_SECRET,
+            is_busy=lambda: bool(self.worker_thread and self.worker_thread.isRunning()), log=self.log, parent=self
+        )
+        self.token_refresher.refreshed.connect(self.on_account_token_refreshed)
+        self.token_refresher.failed.connect(self.on_account_token_failed)
         self.check_installation_status()
         self.check_updates_on_startup()
+        self.token_refresher.start()
 
     def setup_paths(self):
         if sys.platform == "win32":
@@ -127,6 +242,7 @@ class MinecraftLauncher(QMainWindow):
         self.saves_folder = os.path.join(self.launcher_directory, "saves")
         self.heads_folder = os.path.join(self.launcher_directory, "heads")
         self.news_assets_folder = os.path.join(self.launcher_directory, "news_assets")
+        self.forge_cache_folder = os.path.join(self.launcher_directory, "forge_cache")
 
         for folder in [self.launcher_directory, self.minecraft_directory, self.modpack_folder, self.config_folder, self.resourcepacks_folder, self.shaderpacks_folder, self.saves_folder, self.heads_folder, self.news_assets_folder]:
             Path(folder).mkdir(parents=True, exist_ok=True)
@@ -211,7 +327,7 @@ class MinecraftLauncher(QMainWindow):
             QPushButton:disabled { background-color: #3d3d3d; color: #b0b0b0; }
             QProgressBar { border: 1px solid #404040; border-radius: 4px; text-align: center; height: 10px; }
             QProgressBar::chunk { background-color: #0078d4; border-radius: 4px; }
-            QPlainTextEdit, QGroupBox { border: 1px solid #404040; border-radius: 4px; }
+            QListView#LogView, QGroupBox { border: 1px solid #404040; border-radius: 4px; }
             QGroupBox { font-size: 11pt; font-weight: bold; margin-top: 10px; }
             QGroupBox::title { subcontrol-origin: margin; subcontrol-position: top left; padding: 0 10px; }
 
@@ -223,7 +339,7 @@ class MinecraftLauncher(QMainWindow):
             }               
 
             /* --- STILE MIGLIORATO PER QSPINBOX --- */
-            QSpinBox {
+            QSpinBox, QLineEdit {
                 background-color: #1e1e1e;
                 border: 1px solid #404040;
                 border-radius: 4px;
@@ -231,7 +347,7 @@ class MinecraftLauncher(QMainWindow):
                 padding: 5px;
                 font-size: 10pt;
             }
-            QSpinBox:focus {
+            QSpinBox:focus, QLineEdit:focus {
                 border: 1px solid #0078d4;
             }
             QSpinBox::up-button, QSpinBox::down-button {
@@ -260,6 +376,16 @@ class MinecraftLauncher(QMainWindow):
                 height: 10px;
             }
             /* --- FINE STILE QSPINBOX --- */
+            QComboBox {
+                background-color: #1e1e1e;
+                border: 1px solid #404040;
+                border-radius: 4px;
+                color: white;
+                padding: 5px;
+                font-size: 10pt;
+            }
+            QComboBox:focus { border: 1px solid #0078d4; }
+            QComboBox QAbstractItemView { background-color: #1e1e1e; selection-background-color: #0078d4; }
         """)
 
     def setup_home_tab(self):
@@ -332,12 +458,16 @@ class MinecraftLauncher(QMainWindow):
         self.status_label.setObjectName("StatusLabel")
         self.install_btn = QPushButton("Installa/Aggiorna")
         self.install_btn.clicked.connect(self.start_installation)
+        self.cancel_btn = QPushButton("Annulla")
+        self.cancel_btn.clicked.connect(self.cancel_task)
+        self.cancel_btn.hide()
         self.play_btn = QPushButton("GIOCA")
         self.play_btn.clicked.connect(self.start_game)
         self.play_btn.setEnabled(False)
         button_layout = QHBoxLayout()
         button_layout.addSpacerItem(QSpacerItem(40, 20, QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Minimum))
         button_layout.addWidget(self.install_btn)
+        button_layout.addWidget(self.cancel_btn)
         button_layout.addWidget(self.play_btn)
         button_layout.addSpacerItem(QSpacerItem(40, 20, QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Minimum))
         bottom_layout.addWidget(self.progress_bar)
@@ -372,34 +502,185 @@ class MinecraftLauncher(QMainWindow):
         ram_layout.setContentsMargins(0, 0, 0, 0)
         ram_layout.setSpacing(5)
 
+        profile_label = QLabel("Profilo JVM")
+        self.profile_combo = QComboBox()
+        for key, profile in JVM_PROFILES.items():
+            self.profile_combo.addItem(profile["label"], key)
+        self.profile_combo.setCurrentIndex(max(0, self.profile_combo.findData(self.settings.get("jvm_profile"))))
+        self.profile_combo.setFixedWidth(200)
+        self.profile_combo.currentIndexChanged.connect(self.on_jvm_settings_changed)
+
         ram_label = QLabel("RAM Allocata (GB)")
         self.ram_spinbox = QSpinBox()
         self.ram_spinbox.setRange(2, 16)
-        self.ram_spinbox.setValue(4)
+        self.ram_spinbox.setValue(self.settings.get("ram_gb"))
         self.ram_spinbox.setFixedWidth(120)
+        self.ram_spinbox.valueChanged.connect(self.on_jvm_settings_changed)
+
+        self.auto_ram_checkbox = QCheckBox("Calcola automaticamente in base alla memoria del sistema")
+        self.auto_ram_checkbox.setChecked(self.settings.get("auto_ram"))
+        self.auto_ram_checkbox.toggled.connect(self.on_jvm_settings_changed)
         
+        ram_layout.addWidget(profile_label)
+        ram_layout.addWidget(self.profile_combo)
         ram_layout.addWidget(ram_label)
         ram_layout.addWidget(self.ram_spinbox)
+        ram_layout.addWidget(self.auto_ram_checkbox)
         
-        ram_info = QLabel("La RAM consigliata per il modpack è tra 4 e 8 GB.")
-        ram_info.setObjectName("StatusLabel")
+        self.ram_info = QLabel()
+        self.ram_info.setObjectName("StatusLabel")
         
         group_layout.addWidget(ram_widget, alignment=Qt.AlignmentFlag.AlignLeft)
         group_layout.addSpacerItem(QSpacerItem(20, 10, QSizePolicy.Policy.Minimum, QSizePolicy.Policy.Minimum))
-        group_layout.addWidget(ram_info)
+        group_layout.addWidget(self.ram_info)
+        self.on_jvm_settings_changed()
+
+        self.performance_checkbox = QCheckBox("Modalità prestazioni (priorità al gioco)")
+        self.performance_checkbox.setChecked(self.settings.get("performance_mode"))
+        self.performance_checkbox.toggled.connect(lambda checked: self.settings.set("performance_mode", checked))
+        self.affinity_checkbox = QCheckBox("Riserva un core della CPU al launcher")
+        self.affinity_checkbox.setChecked(self.settings.get("performance_affinity"))
+        self.affinity_checkbox.toggled.connect(lambda checked: self.settings.set("performance_affinity", checked))
+        self.affinity_checkbox.setVisible(hasattr(os, "sched_setaffinity"))
+        self.gc_logging_checkbox = QCheckBox("Registra il log del garbage collector (analisi della RAM)")
+        self.gc_logging_checkbox.setChecked(self.settings.get("gc_logging"))
+        self.gc_logging_checkbox.toggled.connect(lambda checked: self.settings.set("gc_logging", checked))
+        group_layout.addWidget(self.performance_checkbox)
+        group_layout.addWidget(self.affinity_checkbox)
+        group_layout.addWidget(self.gc_logging_checkbox)
+        self.tray_checkbox = QCheckBox("Durante il gioco riduci il launcher nella barra di sistema")
+        self.tray_checkbox.setChecked(self.settings.get("game_mode_tray"))
+        self.tray_checkbox.toggled.connect(lambda checked: self.settings.set("game_mode_tray", checked))
+        self.tray_checkbox.setVisible(QSystemTrayIcon.isSystemTrayAvailable())
+        group_layout.addWidget(self.tray_checkbox)
+
+        sampler_layout = QHBoxLayout()
+        sampler_layout.addWidget(QLabel("Monitoraggio risorse del gioco ogni"))
+        self.sampler_spinbox = QSpinBox()
+        self.sampler_spinbox.setRange(1, 60)
+        self.sampler_spinbox.setSuffix(" s")
+        self.sampler_spinbox.setValue(self.settings.get("sampler_interval"))
+        self.sampler_spinbox.setFixedWidth(80)
+        self.sampler_spinbox.valueChanged.connect(self.on_sampler_interval_changed)
+        sampler_layout.addWidget(self.sampler_spinbox)
+        sampler_layout.addStretch()
+        group_layout.addLayout(sampler_layout)
         
         layout.addWidget(group_box)
+
+        download_box = QGroupBox("Download")
+        download_box_layout = QVBoxLayout(download_box)
+        download_layout = QHBoxLayout()
+        download_layout.addWidget(QLabel("Ordine"))
+        self.download_order_combo = QComboBox()
+        for key, label in DOWNLOAD_ORDERS.items():
+            self.download_order_combo.addItem(label, key)
+        self.download_order_combo.setCurrentIndex(max(0, self.download_order_combo.findData(self.settings.get("download_order"))))
+        self.download_order_combo.currentIndexChanged.connect(
+            lambda index: self.settings.set("download_order", self.download_order_combo.itemData(index)))
+        download_layout.addWidget(self.download_order_combo)
+        download_layout.addSpacing(20)
+        download_layout.addWidget(QLabel("Limite di banda"))
+        self.bandwidth_spinbox = QSpinBox()
+        self.bandwidth_spinbox.setRange(0, 1000)
+        self.bandwidth_spinbox.setSuffix(" MB/s")
+        self.bandwidth_spinbox.setSpecialValueText("Nessuno")
+        self.bandwidth_spinbox.setValue(self.settings.get("bandwidth_limit_mb"))
+        self.bandwidth_spinbox.setFixedWidth(110)
+        self.bandwidth_spinbox.valueChanged.connect(lambda value: self.settings.set("bandwidth_limit_mb", value))
+        download_layout.addWidget(self.bandwidth_spinbox)
+        download_layout.addSpacing(20)
+        download_layout.addWidget(QLabel("Tentativi"))
+        self.retries_spinbox = QSpinBox()
+        self.retries_spinbox.setRange(1, 10)
+        self.retries_spinbox.setValue(self.settings.get("download_retries"))
+        self.retries_spinbox.setFixedWidth(70)
+        self.retries_spinbox.valueChanged.connect(lambda value: self.settings.set("download_retries", value))
+        download_layout.addWidget(self.retries_spinbox)
+        download_layout.addStretch()
+        download_box_layout.addLayout(download_layout)
+        mirror_layout = QHBoxLayout()
+        mirror_layout.addWidget(QLabel("Mirror aggiuntivo"))
+        self.download_mirror_input = QLineEdit(self.settings.get("download_mirror"))
+        self.download_mirror_input.setPlaceholderText("URL base, ad esempio una cache in LAN (facoltativo)")
+        self.download_mirror_input.editingFinished.connect(
+            lambda: self.settings.set("download_mirror", self.download_mirror_input.text().strip()))
+        mirror_layout.addWidget(self.download_mirror_input)
+        download_box_layout.addLayout(mirror_layout)
+        layout.addWidget(download_box)
+
+        maintenance_box = QGroupBox("Manutenzione")
+        maintenance_layout = QVBoxLayout(maintenance_box)
+        self.version_gc_btn = QPushButton("Pulisci versioni obsolete")
+        self.version_gc_btn.clicked.connect(self.start_version_gc)
+        version_gc_info = QLabel("Rimuove librerie e versioni di Minecraft/Forge non più utilizzate.")
+        version_gc_info.setObjectName("StatusLabel")
+        maintenance_layout.addWidget(self.version_gc_btn, alignment=Qt.AlignmentFlag.AlignLeft)
+        maintenance_layout.addWidget(version_gc_info)
+        layout.addWidget(maintenance_box)
         layout.addSpacerItem(QSpacerItem(20, 40, QSizePolicy.Policy.Minimum, QSizePolicy.Policy.Expanding))
 
+    def on_jvm_settings_changed(self, *args):
+        """Salva profilo JVM e RAM e aggiorna il valore consigliato"""
+        profile = self.profile_combo.currentData()
+        auto_ram = self.auto_ram_checkbox.isChecked()
+        total, available = get_system_memory()
+        if auto_ram:
+            self.ram_spinbox.blockSignals(True)
+            self.ram_spinbox.setValue(recommend_heap_gb(profile, total, available))
+            self.ram_spinbox.blockSignals(False)
+        self.ram_spinbox.setEnabled(not auto_ram)
+
+        self.settings.set("jvm_profile", profile)
+        self.settings.set("auto_ram", auto_ram)
+        self.settings.set("ram_gb", self.ram_spinbox.value())
+
+        info = f"La RAM consigliata per il modpack è tra {MODPACK_MIN_HEAP_GB} e 8 GB."
+        if total:
+            info += f" Sistema: {total / GB:.1f} GB totali, {available / GB:.1f} GB liberi, {os.cpu_count()} core."
+        warning = free_memory_warning(self.ram_spinbox.value(), available)
+        if warning:
+            info += f" {warning}."
+        last_gc = self.session_history.recent("gc", 1)
+        if last_gc:
+            recommended, reason = recommend_heap_from_gc(last_gc[0]["gc"], last_gc[0].get("heap_gb") or self.ram_spinbox.value(),
+                                                         min_gb=MODPACK_MIN_HEAP_GB)
+            if recommended:
+                info += f" Analisi GC dell'ultima sessione: {reason}."
+        self.ram_info.setText(info)
+        self.ram_info.setWordWrap(True)
+
+    def get_jvm_arguments(self, java_executable):
+        """Argomenti JVM per l'avvio, ricalcolando la RAM automatica sulla memoria libera attuale"""
+        profile = self.settings.get("jvm_profile")
+        ram_gb = self.ram_spinbox.value()
+        total, available = get_system_memory()
+        if self.settings.get("auto_ram"):
+            ram_gb = recommend_heap_gb(profile, total, available)
+            if ram_gb < MODPACK_MIN_HEAP_GB and profile != "low_memory":
+                # Heap ridotto dalla memoria libera: heap iniziale piccolo e meno thread GC
+                profile = "low_memory"
+                self.log(f"Poca memoria libera: heap di {ram_gb} GB con il profilo {JVM_PROFILES[profile]['label']}", "INFO")
+        warning = free_memory_warning(ram_gb, available)
+        if warning:
+            self.log(warning, "WARN")
+        return build_jvm_arguments(profile, ram_gb, java_major=get_java_major_version(java_executable))
+
     def setup_log_tab(self):
         layout = QVBoxLayout(self.log_tab)
         layout.setContentsMargins(20, 20, 20, 20)
         log_label = QLabel("Console")
         log_label.setFont(QFont("Segoe UI", 14, QFont.Weight.Bold))
-        self.log_text = QPlainTextEdit()
-        self.log_text.setReadOnly(True)
-        layout.addWidget(log_label)
-        layout.addWidget(self.log_text)
+        self.resource_label = QLabel("")
+        self.resource_label.setObjectName("StatusLabel")
+        header_layout = QHBoxLayout()
+        header_layout.addWidget(log_label)
+        header_layout.addStretch()
+        header_layout.addWidget(self.resource_label)
+        # Buffer circolare: oltre LOG_CAPACITY righe le più vecchie restano solo in logs/game.log
+        self.log_viewer = LogViewer(LOG_CAPACITY)
+        layout.addLayout(header_layout)
+        layout.addWidget(self.log_viewer)
 
     def _perform_startup_tasks(self):
         """
@@ -414,6 +695,8 @@ class MinecraftLauncher(QMainWindow):
             else:
                 files_to_update = self.check_modpack_needs_update(manifest)
                 self.worker.update_check_complete.emit(files_to_update)
+        except OperationCancelled:
+            raise
         except Exception as e:
             self.worker.log_message.emit(f"Errore controllo aggiornamenti: {e}", "ERROR")
 
@@ -426,28 +709,12 @@ class MinecraftLauncher(QMainWindow):
             # Processa la GIF animata (se presente nel primo articolo)
             if news_data and 'image_url' in news_data[0]:
                 item = news_data[0]
-                image_url = news_data[0]['image_url']
-                expected_hash = item.get('sha256') # Ottieni l'hash dal JSON
-                file_extension = os.path.splitext(image_url)[1]
-                hashed_name = hashlib.md5(image_url.encode()).hexdigest()
-                local_path = os.path.join(self.news_assets_folder, f"{hashed_name}{file_extension}")
-
-                needs_download = True
-
-                if os.path.exists(local_path) and expected_hash and self.calculate_sha256(local_path) == expected_hash:
-                    needs_download = False
-                
-                if needs_download:
-                    try:
-                        # Se il file esiste ma ha l'hash sbagliato, lo sovrascriviamo
-                        self.worker.log_message.emit(f"Download nuova versione di: {os.path.basename(image_url)}", "INFO")
-                        img_response = requests.get(image_url, timeout=15)
-                        img_response.raise_for_status()
-                        with open(local_path, 'wb') as f: f.write(img_response.content)
-                    except Exception as img_e:
-                        self.worker.log_message.emit(f"Errore scaricando immagine news: {img_e}", "ERROR")
-
-                self.worker.news_animation_ready.emit(local_path)
+                image_url = item['image_url']
+                # Validazione tramite stat e hash atteso dal JSON: nessun ricalcolo dell'hash ad ogni avvio
+                local_path = self.news_cache.get(image_url, item.get('sha256'))
+                if local_path:
+                    scaled_path = self.news_cache.scaled_animation(image_url, NEWS_ANIMATION_WIDTH)
+                    self.worker.news_animation_ready.emit(scaled_path or local_path)
 
             html = """<style>
                 h3 { color: #0078d4; margin-bottom: 5px; }
@@ -482,12 +749,13 @@ class MinecraftLauncher(QMainWindow):
         original_width = self.news_movie.frameRect().width()
 
         # Eseguiamo il ridimensionamento SOLO SE la larghezza è valida (maggiore di 0)
-        # per evitare la divisione per zero.
-        if original_width > 0:
+        # per evitare la divisione per zero. Se la GIF è già in cache alla dimensione
+        # giusta non serve: QMovie riscalerebbe comunque ogni frame.
+        if original_width > 0 and original_width != NEWS_ANIMATION_WIDTH:
             original_height = self.news_movie.frameRect().height()
             # Calcoliamo la nuova altezza mantenendo le proporzioni
-            new_height = int(350 * original_height / original_width)
-            self.news_movie.setScaledSize(QSize(350, new_height))
+            new_height = int(NEWS_ANIMATION_WIDTH * original_height / original_width)
+            self.news_movie.setScaledSize(QSize(NEWS_ANIMATION_WIDTH, new_height))
         # Se la larghezza è 0 (perché il file non è ancora caricato), non facciamo nulla.
         # La QMovie userà la sua dimensione predefinita una volta caricata.
         # --- FINE CORREZIONE ---
@@ -506,12 +774,12 @@ class MinecraftLauncher(QMainWindow):
 
     @pyqtSlot(str, str)
     def log(self, message, level="INFO"):
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        color_map = {"INFO": "#4fc3f7", "ERROR": "#ef5350", "SUCCESS": "#66bb6a", "GAME": "#ffa726"}
-        color = color_map.get(level, "#ffffff")
-        formatted_message = f'<span style="color: {color};">[{timestamp}] [{level}] {message}</span>'
-        self.log_text.appendHtml(formatted_message)
-        self.log_text.moveCursor(QTextCursor.MoveOperation.End)
+        self.log_viewer.append_records([(time.time(), LEVEL_CODES.get(level, INFO), message)])
+
+    def log_batch(self, lines):
+        """Aggiunge un blocco di righe del gioco alla console con un solo aggiornamento del modello"""
+        now = time.time()
+        self.log_viewer.append_records([(now, parse_game_level(line), line) for line in lines])
     
     def update_account_display(self):
         # Pulisci il frame precedente
@@ -571,38 +839,15 @@ class MinecraftLauncher(QMainWindow):
             self.account_frame_layout.addWidget(hint_label)
 
     def load_head_image(self, uuid, target_label):
-        cached_path = os.path.join(self.heads_folder, f"{uuid}.png")
-        if os.path.exists(cached_path):
-            pixmap = QPixmap(cached_path)
-            target_label.setPixmap(pixmap.scaled(48, 48, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation))
-            return
-
-        # Imposta un'immagine di placeholder mentre scarica
-        placeholder = QPixmap(resource_path("assets/steve_head.png"))
-        target_label.setPixmap(placeholder.scaled(48, 48, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation))
-
-        # Scarica in background
-        self.downloader_thread = QThread()
-        self.image_worker = ImageDownloader(uuid, self.heads_folder)
-        self.image_worker.moveToThread(self.downloader_thread)
-        
-        # Connetti i segnali
-        self.image_worker.image_ready.connect(lambda u, p: self.on_image_loaded(u, p, target_label))
-        self.downloader_thread.started.connect(self.image_worker.run)
-        self.image_worker.finished.connect(self.downloader_thread.quit)
-        self.image_worker.finished.connect(self.image_worker.deleteLater)
-        self.downloader_thread.finished.connect(self.downloader_thread.deleteLater)
-        
-        self.downloader_thread.start()
-
-    def on_image_loaded(self, uuid, pixmap, target_label):
-        # Assicurati di aggiornare il label corretto
-        if target_label and not pixmap.isNull():
-             target_label.setPixmap(pixmap.scaled(48, 48, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation))
+        self.image_service.load_into(target_label, uuid, 48, placeholder=resource_path("assets/steve_head.png"))
 
     def show_account_dialog(self):
         dialog = LoginDialog(self, self.account_manager, client_id=self.AZURE_CLIENT_ID, client_secret=self.AZURE_CLIENT_SECRET)
         dialog.exec()
+        if self.pending_launch_since is not None:
+            # L'avvio in attesa del rinnovo viene annullato se l'utente cambia account
+            self.pending_launch_since = None
+            self.check_installation_status()
         self.update_account_display()
         
     @pyqtSlot(str, str)
@@ -620,6 +865,8 @@ class MinecraftLauncher(QMainWindow):
             return
         self.worker_thread = QThread()
         self.worker = Worker(target, *args, **kwargs)
+        # Mentre il gioco è in esecuzione i task del launcher non devono rubargli CPU
+        self.worker.low_priority = bool(self.game_process and self.settings.get("performance_mode"))
         self.worker.moveToThread(self.worker_thread)
         self.worker.finished.connect(self.worker_thread.quit)
         self.worker.finished.connect(self.worker.deleteLater)
@@ -632,17 +879,42 @@ class MinecraftLauncher(QMainWindow):
         self.worker.update_check_complete.connect(self.on_update_check_finished)
         self.worker.news_ready.connect(self.update_news_display)
         self.worker.news_animation_ready.connect(self.set_news_animation)
+        self.worker.version_gc_ready.connect(self.on_version_gc_report)
+        self.worker.critical_files_ready.connect(self.on_critical_files_ready)
         self.worker_thread.started.connect(self.worker.run)
         self.worker_thread.start()
+        self.playable_during_task = False
         self.install_btn.setEnabled(False)
         self.play_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
+        self.cancel_btn.show()
+
+    def cancel_task(self):
+        if self.worker:
+            self.worker.cancel_token.cancel()
+            self.cancel_btn.setEnabled(False)
+            self.status_label.setText("Annullamento in corso...")
 
     def on_task_finished(self):
         self.log("Operazione in background terminata.", "INFO")
-        self.install_btn.setEnabled(True)
-        self.check_installation_status()
+        self.cancel_btn.hide()
+        self.playable_during_task = False
         self.worker_thread = None
         self.worker = None
+        if self.game_process:
+            # Sincronizzazione terminata a gioco già avviato: i pulsanti restano disattivati
+            return
+        self.install_btn.setEnabled(True)
+        self.check_installation_status()
+
+    @pyqtSlot(dict)
+    def on_critical_files_ready(self, report):
+        self.log(f"Pronto per giocare dopo {report['seconds']:.1f} s: {report['critical']} file essenziali verificati, "
+                 f"{report['deferred']} file (resource pack e shader) in download in background.", "SUCCESS")
+        if self.game_process or not self.check_installation_status():
+            return
+        self.playable_during_task = True
+        self.status_label.setText("Pronto per giocare (download di resource pack e shader in corso)")
 
     @pyqtSlot(list)
     def on_update_check_finished(self, files_to_update):
@@ -660,14 +932,41 @@ class MinecraftLauncher(QMainWindow):
         CustomMessageBox(title, message, msg_type, self).exec()
 
     def get_install_state(self):
-        if os.path.exists(self.install_state_file):
-            try:
-                with open(self.install_state_file, 'r') as f: return json.load(f)
-            except: pass
-        return {}
+        state = self.install_state.load()
+        if not state and self.install_state.status != "missing":
+            # File illeggibile e senza copia valida: lo stato viene ricostruito da ciò che è
+            # installato, invece di ripetere l'installazione di Forge
+            state = self.recover_install_state()
+            if state:
+                self.log(f"Stato dell'installazione ricostruito dai file presenti: {state}", "WARN")
+                self.save_install_state(state)
+        return dict(state)
     
     def save_install_state(self, state):
-        with open(self.install_state_file, 'w') as f: json.dump(state, f, indent=2)
+        self.install_state.save(dict(state), immediate=True)
+
+    def recover_install_state(self):
+        versions_folder = os.path.join(self.minecraft_directory, "versions")
+        state = {}
+        vanilla = os.path.join(versions_folder, self.minecraft_version, self.minecraft_version)
+        if not (os.path.isfile(vanilla + ".json") and os.path.isfile(vanilla + ".jar")):
+            return state
+        state['minecraft_version'] = self.minecraft_version
+        # Forge è installato se il suo JSON, le sue librerie e quelle generate dai processori sono presenti
+        forge_version_id = ForgeArtifactCache.forge_version_id(self.forge_version)
+        versions = VersionCollector(self.minecraft_directory)
+        data = versions.load_version_json(forge_version_id)
+        if not data:
+            return state
+        libraries_folder = os.path.join(self.minecraft_directory, "libraries")
+        library_files, _ = versions.referenced_libraries([forge_version_id])
+        generated = versions.forge_generated_prefixes(data)
+        if (generated and all(os.path.isfile(os.path.join(libraries_folder, path)) for path in library_files)
+                and all(os.path.isdir(os.path.join(libraries_folder, prefix)) for prefix in generated)
+                and ForgeArtifactCache(self.forge_cache_folder, self.minecraft_directory).outputs_present(self.minecraft_version, self.forge_version)):
+            state['forge_installed'] = True
+            state['forge_version'] = self.forge_version
+        return state
     
     def check_installation_status(self):
         state = self.get_install_state()
@@ -688,25 +987,35 @@ class MinecraftLauncher(QMainWindow):
             state = self.get_install_state()
             if state.get('minecraft_version') != self.minecraft_version:
                 self.worker.status_update.emit("Installazione Minecraft...", "INFO")
-                minecraft_launcher_lib.install.install_minecraft_version(
-                    self.minecraft_version, self.minecraft_directory, 
-                    callback={"setStatus": lambda t: self.worker.status_update.emit(t,"INFO"), "setProgress": lambda v: self.worker.progress.emit(v)}
-                )
+                installer = VanillaInstaller(self.minecraft_directory, callback=self.make_install_callback(),
+                                             cancel=self.worker.cancel_token, policy=self.make_retry_policy())
+                stats = installer.install(self.minecraft_version)
+                self.worker.log_message.emit(f"File scaricati: {stats['downloaded']} ({format_size(stats['bytes'])}), già presenti: {stats['skipped']}", "INFO")
                 state['minecraft_version'] = self.minecraft_version
                 self.save_install_state(state)
                 self.worker.log_message.emit(f"Minecraft {self.minecraft_version} installato!", "SUCCESS")
-            if not (state.get('forge_installed') and state.get('forge_version') == self.forge_version):
+            forge_cache = ForgeArtifactCache(self.forge_cache_folder, self.minecraft_directory, log=self.worker.log_message.emit,
+                                             cancel=self.worker.cancel_token)
+            forge_ready = state.get('forge_installed') and state.get('forge_version') == self.forge_version
+            if not (forge_ready and forge_cache.outputs_present(self.minecraft_version, self.forge_version)):
                 self.worker.status_update.emit(f"Installazione Forge {self.forge_version}...", "INFO")
                 self.worker.progress.emit(0)
                 try:
-                    minecraft_launcher_lib.forge.install_forge_version(
-                        self.forge_version, self.minecraft_directory,
-                        callback={"setStatus": lambda t: self.worker.status_update.emit(t, "INFO")}
-                    )
+                    if forge_cache.restore(self.minecraft_version, self.forge_version):
+                        self.worker.log_message.emit("Forge ripristinato dalla cache locale.", "SUCCESS")
+                    else:
+                        minecraft_launcher_lib.forge.install_forge_version(
+                            self.forge_version, self.minecraft_directory,
+                            callback={"setStatus": self.make_install_callback()["setStatus"]}
+                        )
+                        if forge_cache.store(self.minecraft_version, self.forge_version):
+                            self.worker.log_message.emit("Output di Forge salvati nella cache locale.", "INFO")
                     state['forge_installed'] = True
                     state['forge_version'] = self.forge_version
                     self.save_install_state(state)
                     self.worker.log_message.emit(f"Forge {self.forge_version} installato!", "SUCCESS")
+                except OperationCancelled:
+                    raise
                 except Exception as e:
                     self.worker.log_message.emit(f"Errore installazione Forge: {e}", "ERROR")
                     self.worker.show_dialog.emit("Errore Forge", f"L'installazione è fallita:\n{e}", 'error')
@@ -715,12 +1024,37 @@ class MinecraftLauncher(QMainWindow):
             self.update_modpack()
             self.worker.status_update.emit("Installazione completata!", "SUCCESS")
             self.worker.progress.emit(100)
-            self.worker.show_dialog.emit("Successo", "Installazione/Aggiornamento completato!", 'success')
+            if not self.game_process:
+                self.worker.show_dialog.emit("Successo", "Installazione/Aggiornamento completato!", 'success')
+        except OperationCancelled:
+            raise
         except Exception as e:
             self.worker.status_update.emit(f"Errore: {e}", "ERROR")
             self.worker.log_message.emit(f"Errore durante l'installazione: {e}", "ERROR")
             self.worker.show_dialog.emit("Errore", f"Si è verificato un errore:\n{e}", 'error')
 
+    def make_install_callback(self):
+        """
+        Callback nel formato di minecraft_launcher_lib che converte il progresso in percentuale.
+        Controlla anche l'annullamento: l'eccezione interrompe l'installazione della libreria.
+        """
+        cancel = self.worker.cancel_token
+        maximum = {"value": 0}
+        def set_status(text):
+            cancel.check()
+            self.worker.status_update.emit(text, "INFO")
+        def set_max(value):
+            maximum["value"] = value
+        def set_progress(value):
+            cancel.check()
+            if maximum["value"] > 0:
+                self.worker.progress.emit(min(100, int(value / maximum["value"] * 100)))
+        return {
+            "setStatus": set_status,
+            "setProgress": set_progress,
+            "setMax": set_max
+        }
+
     def update_modpack(self):
         try:
             manifest = self.get_modpack_manifest()
@@ -735,40 +1069,146 @@ class MinecraftLauncher(QMainWindow):
             if not all_files:
                 self.worker.log_message.emit("Nessun file da elaborare nel manifest.", "INFO")
                 return
-            total_files = len(all_files)
-            for i, file_info in enumerate(all_files):
-                self.process_file(file_info, file_info['target_folder'], file_info['category'], i + 1, total_files)
-            if 'mods' in manifest:
-                self.clean_mods_folder(manifest['mods'], self.modpack_folder)
-            self.worker.log_message.emit("Tutti i file del modpack sono aggiornati!", "SUCCESS")
+            # Prima i file essenziali per l'avvio, poi quelli rimandabili; in ogni gruppo l'ordine dipende dalle impostazioni
+            order = self.settings.get("download_order")
+            critical = order_files([f for f in all_files if f['category'] not in DEFERRABLE_CATEGORIES], order)
+            deferred = order_files([f for f in all_files if f['category'] in DEFERRABLE_CATEGORIES], order)
+            progress = {"scheduled": 0, "done": 0, "total": len(all_files)}
+            breakers = HostCircuitBreakers(log=lambda message: self.worker.log_message.emit(message, "WARN"))
+            mirrors = MirrorSet.from_manifest(manifest, self.modpack_url.rsplit("/", 1)[0],
+                                              extra_urls=[self.settings.get("download_mirror")], breakers=breakers)
+            self.downloader = Downloader(cancel=self.worker.cancel_token, max_workers=self.DOWNLOAD_WORKERS,
+                                         bandwidth_limit=self.settings.get("bandwidth_limit_mb") * 1024 * 1024,
+                                         mirrors=mirrors, policy=self.make_retry_policy(),
+                                         hedging=self.settings.get("download_hedging"))
+            if len(mirrors) > 1:
+                self.worker.status_update.emit("Verifica delle sorgenti di download...", "INFO")
+                for line in self.downloader.probe_mirrors(pick_probe_file(all_files)):
+                    self.worker.log_message.emit(f"Sorgente {line}", "INFO")
+            journal = SyncJournal(self.launcher_directory)
+            if journal.load():
+                self.worker.log_message.emit(f"Ripresa della sincronizzazione interrotta: {len(journal.committed)} file già completati.", "INFO")
+            journal.begin(manifest.get("version"))
+            try:
+                self.sync_files(critical, journal, progress)
+                # I file obsoleti vanno rimossi prima che il gioco possa partire (mod vecchie nella cartella mods)
+                self.collect_orphans(manifest)
+                self.worker.critical_files_ready.emit({
+                    "seconds": time.perf_counter() - self.worker.started_at,
+                    "critical": len(critical), "deferred": len(deferred)
+                })
+                # Il resto del download non deve competere con il gioco che potrebbe essere già avviato
+                self.sync_files(deferred, journal, progress, low_priority=True)
+                journal.finish()
+            finally:
+                journal.close()
+                self.downloader.close()
+            for line in self.downloader.summary():
+                self.worker.log_message.emit(f"Download {line}", "INFO")
+            if len(mirrors) > 1:
+                for line in mirrors.summary():
+                    self.worker.log_message.emit(f"Sorgente {line}", "INFO")
+            self.worker.log_message.emit(f"Tutti i file del modpack sono aggiornati! "
+                                         f"(sincronizzazione completata in {time.perf_counter() - self.worker.started_at:.1f} s)", "SUCCESS")
+        except OperationCancelled:
+            raise
         except Exception as e:
             self.worker.log_message.emit(f"Errore aggiornamento modpack: {e}", "ERROR")
             raise
 
+    def make_retry_policy(self):
+        return RetryPolicy(max_attempts=self.settings.get("download_retries"),
+                           read_timeout=self.settings.get("download_timeout"))
+
     def get_target_folder(self, category):
         folder_map = { "root": self.launcher_directory, "mods": self.modpack_folder, "config": self.config_folder, "resourcepacks": self.resourcepacks_folder, "shaderpacks": self.shaderpacks_folder }
         return folder_map.get(category, os.path.join(self.launcher_directory, category))
 
-    def process_file(self, file_info, target_folder, file_type, current, total):
+    def sync_files(self, files, journal, progress, low_priority=False):
+        """
+        Elabora i file nell'ordine dato con DOWNLOAD_WORKERS download in parallelo.
+        Un file che fallisce anche dopo i tentativi non ferma gli altri: l'errore
+        viene sollevato alla fine e i file completati restano nel registro.
+        """
+        if not files:
+            return
+        initializer = process_tuning.demote_current_thread if low_priority else None
+        self.downloader.thread_initializer = initializer
+        failed = []
+        with ThreadPoolExecutor(max_workers=self.DOWNLOAD_WORKERS, initializer=initializer) as executor:
+            futures = {}
+            for file_info in files:
+                progress["scheduled"] += 1
+                future = executor.submit(self.process_file, file_info, file_info['target_folder'], file_info['category'],
+                                         progress["scheduled"], progress["total"], journal)
+                futures[future] = file_info
+            try:
+                for future in as_completed(futures):
+                    try:
+                        future.result()
+                    except OperationCancelled:
+                        raise
+                    except Exception as e:
+                        failed.append(futures[future]["name"])
+                        self.worker.log_message.emit(f"Download non riuscito: {futures[future]['name']}: {e}", "ERROR")
+                        continue
+                    progress["done"] += 1
+                    self.worker.progress.emit(int(progress["done"] / progress["total"] * 100))
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                raise
+        if failed:
+            names = ", ".join(failed[:3]) + (f" e altri {len(failed) - 3}" if len(failed) > 3 else "")
+            raise Exception(f"{len(failed)} file non scaricati ({names}). Riprova: i file completati non verranno riscaricati.")
+
+    def process_file(self, file_info, target_folder, file_type, current, total, journal=None):
         file_name, file_url, expected_hash = file_info["name"], file_info["url"], file_info.get("sha256", "")
         file_path = os.path.normpath(os.path.join(target_folder, file_info.get("path", file_name)))
-        Path(os.path.dirname(file_path)).mkdir(parents=True, exist_ok=True)
+        journal_key = OrphanCollector.make_key(file_type, file_info.get("path", file_name))
         if os.path.exists(file_path) and (file_type == 'config' or file_name in ['options.txt', 'servers.dat']):
-            self.worker.progress.emit(int((current / total) * 100))
             return
+        cancel = self.worker.cancel_token
+        cancel.check()
+        if journal and journal.is_committed(journal_key, file_path, expected_hash):
+            # Già completato prima dell'interruzione e non modificato: nessun controllo dell'hash
+            return
+        Path(os.path.dirname(file_path)).mkdir(parents=True, exist_ok=True)
         needs_download = True
-        if os.path.exists(file_path) and expected_hash and self.calculate_sha256(file_path) == expected_hash:
+        digest = self.hash_index.sha256(file_path, cancel) if os.path.exists(file_path) and expected_hash else ""
+        if digest and digest == expected_hash:
             needs_download = False
         if needs_download:
             self.worker.status_update.emit(f"Download ({current}/{total}): {file_name}", "INFO")
             try:
-                self.download_file(file_url, file_path)
-                if expected_hash and self.calculate_sha256(file_path) != expected_hash:
-                    raise Exception(f"Hash mismatch per {file_name}")
+                # Il Downloader verifica l'hash e, se non corrisponde, riprova da un'altra sorgente
+                digest = self.downloader.fetch(file_url, file_path, file_type, expected_hash, file_info.get("size") or 0)
+                self.hash_index.record(file_path, digest)
+            except OperationCancelled:
+                # Il file .part resta su disco e il download riprenderà da lì
+                raise
             except Exception as e:
                 if os.path.exists(file_path): os.remove(file_path)
+                self.hash_index.forget(file_path)
                 raise
-        self.worker.progress.emit(int((current / total) * 100))
+        if journal:
+            journal.commit(journal_key, file_path, digest if expected_hash else "", sync=needs_download)
+
+    def collect_orphans(self, manifest):
+        """Rimuove i file del launcher non più presenti nel manifest, in tutte le categorie"""
+        collector = OrphanCollector(self.launcher_directory, self.get_target_folder, log=self.worker.log_message.emit)
+        if not collector.has_record() and 'mods' in manifest:
+            # Primo avvio senza registro: pulizia delle mod come nelle versioni precedenti
+            self.clean_mods_folder(manifest['mods'], self.modpack_folder)
+        report = collector.collect(manifest)
+        collector.record_applied(manifest)
+        for key in report["removed"]:
+            self.worker.log_message.emit(f"Rimosso file obsoleto: {key}", "INFO")
+        for key in report["kept"]:
+            self.worker.log_message.emit(f"File obsoleto modificato dall'utente, mantenuto: {key}", "INFO")
+        if report["files"]:
+            self.worker.log_message.emit(f"Pulizia completata: {report['files']} file rimossi, {format_size(report['bytes'])} recuperati.", "SUCCESS")
+        return report
 
     def clean_mods_folder(self, manifest_files, mods_folder):
         if not os.path.exists(mods_folder): return
@@ -781,22 +1221,60 @@ class MinecraftLauncher(QMainWindow):
                 except Exception as e:
                     self.worker.log_message.emit(f"Errore rimozione {item}: {e}", "ERROR")
 
+    def get_version_gc_roots(self):
+        """Versioni ancora in uso: quelle registrate in install_state.json e quelle configurate"""
+        state = self.get_install_state()
+        roots = {self.minecraft_version, self.forge_version.replace("-", "-forge-", 1)}
+        if state.get('minecraft_version'):
+            roots.add(state['minecraft_version'])
+        if state.get('forge_version'):
+            roots.add(state['forge_version'].replace("-", "-forge-", 1))
+        return roots
+
+    def start_version_gc(self):
+        if self.game_process:
+            self.show_message_box("Attendi", "Chiudi il gioco prima di pulire le versioni.", "info")
+            return
+        self.run_task(self.collect_old_versions, dry_run=True)
+
+    def collect_old_versions(self, dry_run=True):
+        collector = VersionCollector(self.minecraft_directory, log=self.worker.log_message.emit)
+        report = collector.collect(self.get_version_gc_roots(), dry_run=dry_run)
+        for version in report["versions"]:
+            self.worker.log_message.emit(f"Versione non utilizzata: {version['id']} ({format_size(version['bytes'])})", "INFO")
+        self.worker.log_message.emit(f"Librerie non utilizzate: {len(report['libraries'])}", "INFO")
+        if dry_run:
+            self.worker.version_gc_ready.emit(report)
+        else:
+            self.worker.status_update.emit(f"Pulizia versioni completata: {format_size(report['bytes'])} recuperati.", "SUCCESS")
+
+    @pyqtSlot(dict)
+    def on_version_gc_report(self, report):
+        if not report["files"]:
+            self.show_message_box("Manutenzione", "Nessuna versione o libreria obsoleta da rimuovere.", "info")
+            return
+        msg = (f"Versioni obsolete: {len(report['versions'])}\n"
+               f"Librerie obsolete: {len(report['libraries'])}\n"
+               f"Spazio recuperabile: {format_size(report['bytes'])}\n\nVuoi rimuoverle ora?")
+        reply = CustomMessageBox("Pulizia versioni", msg, 'question', self).exec()
+        if reply == QMessageBox.StandardButton.Yes:
+            self.run_task(self.collect_old_versions, dry_run=False)
+
     def get_modpack_manifest(self):
-        try:
-            self.log("Scaricamento manifest...", "INFO")
-            response = requests.get(self.modpack_url, timeout=15)
-            response.raise_for_status()
-            return response.json()
-        except requests.RequestException as e:
-            self.log(f"Errore di rete scaricando il manifest: {e}", "ERROR")
-            return None
+        self.log("Scaricamento manifest...", "INFO")
+        urls = [self.modpack_url]
+        if self.settings.get("download_mirror"):
+            # Il mirror configurato (ad esempio una cache in LAN) serve anche quando GitHub non risponde
+            urls.append(self.settings.get("download_mirror").strip().rstrip("/") + "/manifest.json")
+        for url in urls:
+            try:
+                response = requests.get(url, timeout=15)
+                response.raise_for_status()
+                return response.json()
+            except (requests.RequestException, ValueError) as e:
+                self.log(f"Errore di rete scaricando il manifest da {url}: {e}", "ERROR")
+        return None
     
-    def download_file(self, url, destination):
-        with requests.get(url, stream=True, timeout=30) as r:
-            r.raise_for_status()
-            with open(destination, 'wb') as f:
-                for chunk in r.iter_content(chunk_size=8192): f.write(chunk)
-
     def calculate_sha256(self, file_path):
         sha256_hash = hashlib.sha256()
         try:
@@ -806,25 +1284,52 @@ class MinecraftLauncher(QMainWindow):
         except IOError: return ""
 
     def start_game(self):
-        if self.worker_thread and self.worker_thread.isRunning():
+        click_time = time.perf_counter()
+        if self.worker_thread and self.worker_thread.isRunning() and not self.playable_during_task:
             self.show_message_box("Attendi", "Un'altra operazione è in corso.", "info")
             return
         if not self.account_manager.current_account:
             self.show_message_box("Account richiesto", "Configura un account prima di giocare!", 'info')
             self.show_account_dialog()
             return
-        if not self.refresh_current_account_token():
-            self.show_message_box("Accesso Scaduto", "Il tuo accesso Microsoft è scaduto. Accedi di nuovo.", 'error')
-            self.show_account_dialog()
+        if self.account_manager.is_token_expired():
+            # Di norma il token è già stato rinnovato in background; se non è così il gioco
+            # parte appena il rinnovo termina, senza bloccare l'interfaccia
+            if not self.account_manager.current_account.get("refresh_token"):
+                self.show_message_box("Accesso Scaduto", "Il tuo accesso Microsoft è scaduto. Accedi di nuovo.", 'error')
+                self.show_account_dialog()
+                return
+            if self.pending_launch_since is None:
+                self.pending_launch_since = click_time
+            self.play_btn.setEnabled(False)
+            self.update_status("Rinnovo dell'accesso Microsoft...", "INFO")
+            self.token_refresher.refresh(self.account_manager.get_current_account_id())
             return
+        auth_wait_ms = round((click_time - self.pending_launch_since) * 1000, 1) if self.pending_launch_since else 0
+        self.pending_launch_since = None
         
         account_options = self.account_manager.get_launch_options()
-        ram_gb = self.ram_spinbox.value()
-        options = { "username": account_options["username"], "uuid": account_options["uuid"], "token": account_options["token"], "jvmArguments": [f"-Xmx{ram_gb}G", f"-Xms{ram_gb}G"], "launcherName": "CignoLauncher", "launcherVersion": self.launcher_version, "gameDirectory": self.launcher_directory }
+        static_options = { "launcherName": "CignoLauncher", "launcherVersion": self.launcher_version, "gameDirectory": self.launcher_directory }
         forge_version_id = self.forge_version.replace("-", "-forge-", 1)
         
         try:
-            minecraft_command = minecraft_launcher_lib.command.get_minecraft_command(forge_version_id, self.minecraft_directory, options)
+            template, from_cache = self.launch_cache.get_template(forge_version_id, static_options)
+            jvm_arguments = self.get_jvm_arguments(template[0])
+            if self.settings.get("performance_mode"):
+                jvm_arguments += process_tuning.large_pages_jvm_arguments()
+            jvm_arguments += self.class_data_sharing.jvm_arguments(self.modpack_folder, self.forge_version, template[0])
+            self.gc_log_path = None
+            if self.settings.get("gc_logging"):
+                self.gc_log_path = os.path.join(self.launcher_directory, "logs", "gc.log")
+                os.makedirs(os.path.dirname(self.gc_log_path), exist_ok=True)
+                if os.path.exists(self.gc_log_path):
+                    os.remove(self.gc_log_path)
+                jvm_arguments += gc_log_arguments(self.gc_log_path)
+            heap_gb = next((int(arg[4:-1]) for arg in jvm_arguments if arg.startswith("-Xmx")), None)
+            minecraft_command = self.launch_cache.fill_template(
+                template, account_options["username"], account_options["uuid"], account_options["token"], jvm_arguments
+            )
+            command_time = time.perf_counter()
             self.update_status("Avvio del gioco...", "SUCCESS")
             
             self.button_group.button(3).setChecked(True)
@@ -839,34 +1344,268 @@ class MinecraftLauncher(QMainWindow):
                 subprocess_args['creationflags'] = subprocess.CREATE_NO_WINDOW
 
             self.game_process = subprocess.Popen(minecraft_command, **subprocess_args)
+            popen_time = time.perf_counter()
+            self.game_start_time = popen_time
+            if self.settings.get("performance_mode"):
+                applied, refused = process_tuning.apply_game_priority(self.game_process, self.settings.get("performance_affinity"))
+                self.log(f"Modalità prestazioni: {', '.join(applied) if applied else 'nessuna modifica consentita dal sistema'}", "INFO")
+                if refused and not self.priority_warning_shown:
+                    # Un solo avviso per esecuzione del launcher: il sistema rifiuterà anche i prossimi avvii
+                    self.priority_warning_shown = True
+                    self.log(f"Modalità prestazioni: non applicate {', '.join(refused)}", "WARN")
+            self.boot_completed = False
+            self.last_launch_timing = {
+                "command_ms": round((command_time - click_time) * 1000, 1),
+                "click_to_popen_ms": round((popen_time - click_time) * 1000, 1),
+                "command_from_cache": from_cache,
+                "auth_wait_ms": auth_wait_ms,
+                "during_sync": self.playable_during_task
+            }
+            self.log(f"Processo avviato in {self.last_launch_timing['click_to_popen_ms']} ms "
+                     f"(comando {'da cache' if from_cache else 'ricostruito'} in {self.last_launch_timing['command_ms']} ms)", "INFO")
+            if self.class_data_sharing.session_mode == "training":
+                self.log("Registrazione archivio CDS per velocizzare i prossimi avvii...", "INFO")
+            mod_count, fingerprint = mods_fingerprint(self.modpack_folder)
+            self.current_session = self.session_history.begin(
+                forge_version=self.forge_version, mods=mod_count, mods_fingerprint=fingerprint,
+                jvm_profile=self.settings.get("jvm_profile"), heap_gb=heap_gb, cds=self.class_data_sharing.session_mode,
+                launch_timing=self.last_launch_timing
+            )
+            self.boot_parser = BootPhaseParser(popen_time)
+            self.start_process_sampler()
             
             self.install_btn.setEnabled(False)
             self.play_btn.setEnabled(False)
 
             threading.Thread(target=self.monitor_game_process, daemon=True).start()
-            threading.Thread(target=self.read_game_output, args=(self.game_process.stdout,), daemon=True).start()
+            game_log = GameLogPipeline(os.path.join(self.launcher_directory, "logs"),
+                                       lambda lines: QApplication.postEvent(self, LogEvent(lines, game_log.batch_done)),
+                                       on_line=self.boot_parser.feed)
+            self.game_log = game_log
+            self.game_log.start(self.game_process.stdout)
+            if self.settings.get("stall_watchdog"):
+                parser = self.boot_parser
+                self.stall_watchdog = StallWatchdog(
+                    self.game_process, self.game_log, template[0], os.path.join(self.launcher_directory, "diagnostics"),
+                    lambda reason, bundle: QApplication.postEvent(self, StallEvent(reason, bundle)),
+                    boot_progress=lambda: (len(parser.marks), parser.completed),
+                    session_info={"launcher_version": self.launcher_version, "forge_version": self.forge_version,
+                                  "jvm_arguments": jvm_arguments, "session": dict(self.current_session)}
+                )
+                self.stall_watchdog.start()
+            if self.settings.get("game_mode"):
+                # Breve misura del consumo del launcher prima di entrare in modalità gioco
+                self.footprint_baseline = launcher_footprint()
+                QTimer.singleShot(self.GAME_MODE_BASELINE_MS, self.enter_game_mode)
 
         except Exception as e:
             self.log(f"Errore durante l'avvio: {e}", "ERROR")
             self.show_message_box("Errore Avvio", f"Impossibile avviare il gioco:\n{e}", 'error')
             self.check_installation_status()
 
-    def read_game_output(self, pipe):
-        for line in iter(pipe.readline, ''):
-            if line: QApplication.postEvent(self, LogEvent(line.strip()))
-    
     def event(self, event):
         if event.type() == LogEvent.EVENT_TYPE:
-            self.log(event.message, "GAME")
+            self.log_batch(event.lines)
+            event.done()
+            if not self.boot_completed and self.boot_parser and self.boot_parser.completed:
+                self.on_boot_completed(self.boot_parser.result())
             return True
         if event.type() == GameClosedEvent.EVENT_TYPE:
             self.on_game_closed()
             return True
+        if event.type() == StallEvent.EVENT_TYPE:
+            self.on_game_stalled(event.reason, event.bundle)
+            return True
+        if event.type() == StoreErrorEvent.EVENT_TYPE:
+            self.log(event.message, "WARN")
+            return True
         return super().event(event)
     
+    def on_boot_completed(self, boot):
+        self.boot_completed = True
+        seconds = boot["total"]
+        self.class_data_sharing.record_boot_time(seconds)
+        self.log(f"Gioco avviato in {seconds:.1f} s", "SUCCESS")
+        for phase in boot["phases"]:
+            self.log(f"  {phase['label']}: {phase['seconds']:.1f} s", "INFO")
+        if self.current_session is not None:
+            self.current_session["boot"] = boot
+            regressions, mods_changed = self.session_history.find_regressions(self.current_session)
+            for regression in regressions:
+                self.log(f"{regression['label']} più lento del solito: {regression['seconds']:.1f} s "
+                         f"(mediana {regression['median']:.1f} s{', modpack aggiornato' if mods_changed else ''})", "WARN")
+        summary = self.class_data_sharing.boot_time_summary()
+        if "cds" in summary and "no_cds" in summary:
+            self.log(f"Tempo medio di avvio: {summary['cds']} s con CDS, {summary['no_cds']} s senza", "INFO")
+
+    def start_process_sampler(self):
+        self.process_sampler = ProcessSampler(self.game_process.pid)
+        if not self.process_sampler.available:
+            self.resource_label.setText("Monitoraggio risorse non disponibile su questo sistema")
+            return
+        self.sampler_timer.setInterval(self.settings.get("sampler_interval") * 1000)
+        self.set_sampling_active(not self.isMinimized())
+
+    def set_sampling_active(self, active):
+        """Avvia o sospende il campionamento (sospeso quando il launcher non è visibile)"""
+        if not self.process_sampler or not self.process_sampler.available:
+            return
+        if active and self.game_process:
+            if not self.sampler_timer.isActive():
+                self.sample_game_process()
+                self.sampler_timer.start()
+        else:
+            self.sampler_timer.stop()
+
+    def on_sampler_interval_changed(self, seconds):
+        self.settings.set("sampler_interval", seconds)
+        self.sampler_timer.setInterval(seconds * 1000)
+
+    def sample_game_process(self):
+        if not self.process_sampler or not self.game_start_time:
+            return
+        sample = self.process_sampler.sample(time.perf_counter() - self.game_start_time)
+        if sample is None:
+            return
+        cpu = f"{sample['cpu_percent']:.0f}%" if sample['cpu_percent'] is not None else "-"
+        threads = f"{sample['threads']} thread · " if sample['threads'] is not None else ""
+        self.resource_label.setText(f"CPU {cpu} · RAM {format_size(sample['rss'])} · {threads}"
+                                    f"I/O {format_size(sample['read_bytes'])} letti, {format_size(sample['write_bytes'])} scritti")
+
+    def changeEvent(self, event):
+        # Con il launcher minimizzato il campionamento si ferma: nessuno guarda i valori
+        if event.type() == QEvent.Type.WindowStateChange:
+            self.set_sampling_active(not self.isMinimized())
+        super().changeEvent(event)
+
+    def enter_game_mode(self):
+        """Riduce il consumo del launcher mentre il gioco è in esecuzione"""
+        if not self.game_process or self.game_mode:
+            return
+        before = launcher_footprint()
+        self.game_mode = True
+        if getattr(self, "news_movie", None):
+            self.news_movie.setPaused(True)
+        self.log_viewer.set_tail_mode(True)
+        QPixmapCache.clear()
+        self.image_service.clear_memory()
+        if self.settings.get("game_mode_tray") and QSystemTrayIcon.isSystemTrayAvailable():
+            self.hide_to_tray()
+        self.game_mode_footprint = {"cpu_percent_before": cpu_percent_between(self.footprint_baseline, before),
+                                    "rss_before": before[2]}
+        self.footprint_game = launcher_footprint()
+        QTimer.singleShot(self.GAME_MODE_MEASURE_MS, self.measure_game_mode)
+
+    def measure_game_mode(self):
+        if not self.game_mode or not self.game_mode_footprint:
+            return
+        now = launcher_footprint()
+        footprint = self.game_mode_footprint
+        footprint.update({"cpu_percent_game_mode": cpu_percent_between(self.footprint_game, now), "rss_game_mode": now[2]})
+        message = f"Modalità gioco: CPU del launcher {footprint['cpu_percent_before']}% → {footprint['cpu_percent_game_mode']}%"
+        if footprint["rss_before"] and footprint["rss_game_mode"]:
+            message += f", RAM {format_size(footprint['rss_before'])} → {format_size(footprint['rss_game_mode'])}"
+        self.log(message, "INFO")
+        if self.current_session is not None:
+            self.current_session["launcher_footprint"] = footprint
+
+    def exit_game_mode(self):
+        if not self.game_mode:
+            return
+        self.game_mode = False
+        self.game_mode_footprint = None
+        self.log_viewer.set_tail_mode(False)
+        if getattr(self, "news_movie", None):
+            self.news_movie.setPaused(False)
+        if self.tray_icon and self.tray_icon.isVisible():
+            self.restore_from_tray()
+
+    def hide_to_tray(self):
+        if self.tray_icon is None:
+            self.tray_icon = QSystemTrayIcon(self.windowIcon(), self)
+            self.tray_icon.setToolTip("CignoLauncher - gioco in esecuzione")
+            self.tray_icon.activated.connect(lambda reason: self.restore_from_tray())
+        self.tray_icon.show()
+        self.hide()
+        self.set_sampling_active(False)
+
+    def restore_from_tray(self):
+        if self.tray_icon:
+            self.tray_icon.hide()
+        self.showNormal()
+        self.activateWindow()
+        self.set_sampling_active(True)
+
+    def analyze_gc_log(self, session):
+        """Riepiloga il log del GC della sessione, lo confronta con le precedenti e suggerisce la RAM"""
+        summary = parse_gc_log(self.gc_log_path)
+        self.gc_log_path = None
+        if not summary:
+            self.log("Log del GC vuoto o non leggibile.", "INFO")
+            return None
+        alloc = f", allocazione {summary['alloc_rate_mb_s']} MB/s" if summary["alloc_rate_mb_s"] is not None else ""
+        self.log(f"GC: {summary['pauses']} pause, p50 {summary['pause_p50_ms']} ms, p99 {summary['pause_p99_ms']} ms, "
+                 f"max {summary['pause_max_ms']} ms{alloc}", "INFO")
+        previous = self.session_history.recent("gc", self.GC_COMPARE_SESSIONS)
+        if previous:
+            p99 = sorted(s["gc"]["pause_p99_ms"] for s in previous)
+            self.log(f"p99 delle pause nelle ultime {len(previous)} sessioni: mediana {p99[len(p99) // 2]} ms", "INFO")
+        recommended, reason = recommend_heap_from_gc(summary, session.get("heap_gb") or self.ram_spinbox.value(),
+                                                     min_gb=MODPACK_MIN_HEAP_GB)
+        if recommended:
+            self.log(f"RAM: {reason}.", "SUCCESS" if recommended == session.get("heap_gb") else "WARN")
+        return summary
+
+    def on_game_stalled(self, reason, bundle):
+        self.log(f"Il gioco sembra bloccato ({reason}).", "WARN")
+        if bundle:
+            self.log(f"Diagnostica salvata in {bundle}: allegala alla segnalazione del problema.", "WARN")
+        else:
+            self.log("Impossibile salvare la diagnostica del blocco.", "ERROR")
+
     def on_game_closed(self):
+        self.exit_game_mode()
         self.log("Il processo di gioco è terminato.", "SUCCESS")
+        stall_bundles = []
+        if self.stall_watchdog:
+            self.stall_watchdog.stop()
+            stall_bundles = self.stall_watchdog.bundles
+            self.stall_watchdog = None
+        self.sampler_timer.stop()
+        resources = self.process_sampler.summary() if self.process_sampler else None
+        if resources:
+            cpu = f", CPU media {resources['avg_cpu_percent']:.0f}%" if resources['avg_cpu_percent'] is not None else ""
+            threads = f", massimo {resources['max_threads']} thread" if resources['max_threads'] else ""
+            self.log(f"Risorse del gioco: picco RAM {format_size(resources['peak_rss'])}{cpu}{threads}", "INFO")
+        if self.process_sampler:
+            self.process_sampler.close()
+        self.process_sampler = None
+        self.resource_label.setText("")
+        if self.boot_parser and not self.boot_completed:
+            self.boot_parser.finish()
+            if self.boot_parser.result()["menu_reached"]:
+                self.on_boot_completed(self.boot_parser.result())
+        if self.current_session is not None:
+            if self.boot_parser:
+                self.current_session["boot"] = self.boot_parser.result()
+            if self.game_start_time:
+                self.current_session["duration"] = round(time.perf_counter() - self.game_start_time, 1)
+            self.current_session["exit_code"] = self.game_process.returncode if self.game_process else None
+            self.current_session["resources"] = resources
+            if stall_bundles:
+                self.current_session["stall_bundles"] = stall_bundles
+            if self.gc_log_path:
+                self.current_session["gc"] = self.analyze_gc_log(self.current_session)
+            self.session_history.finish(self.current_session)
+            self.current_session = None
+            # Aggiorna il suggerimento sulla RAM nelle impostazioni
+            self.on_jvm_settings_changed()
+        self.boot_parser = None
+        cds_mode = self.class_data_sharing.session_mode
+        if self.class_data_sharing.finish_session() == "ready" and cds_mode == "training":
+            self.log("Archivio CDS creato: i prossimi avvii saranno più veloci.", "SUCCESS")
         self.game_process = None
+        self.game_start_time = None
         self.button_group.button(0).setChecked(True)
         self.pages.setCurrentIndex(0)
         self.check_installation_status()
@@ -898,46 +1637,36 @@ class MinecraftLauncher(QMainWindow):
                 if os.path.exists(file_path) and (category == 'config' or os.path.basename(file_path) in ['options.txt', 'servers.dat']):
                     continue
                 needs_update = True
-                if os.path.exists(file_path) and file_info.get("sha256") and self.calculate_sha256(file_path) == file_info["sha256"]: 
+                if os.path.exists(file_path) and file_info.get("sha256") and self.hash_index.sha256(file_path, self.worker.cancel_token) == file_info["sha256"]: 
                     needs_update = False
                 if needs_update:
                     files_to_update.append(file_info)
         return files_to_update
 
-    def refresh_current_account_token(self):
-        account = self.account_manager.current_account
-        if not account or account.get("type") != "microsoft": return True
-        if not self.account_manager.is_token_expired(): return True
-
-        self.log("Token Microsoft scaduto. Tentativo di refresh...", "INFO")
-        refresh_token = account.get("refresh_token")
-        if not refresh_token:
-            self.log("Refresh token non trovato. E necessario un nuovo accesso.", "ERROR")
-            return False
-            
-        try:
-            # --- QUESTA E' LA CHIAMATA CORRETTA CON TUTTI I PARAMETRI ---
-            new_data = minecraft_launcher_lib.microsoft_account.complete_refresh(
-                client_id=self.AZURE_CLIENT_ID,
-                client_secret=self.AZURE_CLIENT_SECRET,
-                redirect_uri="http://localhost:5000/callback",
-                refresh_token=refresh_token
-            )
-            # -----------------------------------------------------------------
+    def on_account_token_refreshed(self, account_id, new_data):
+        if account_id != self.account_manager.get_current_account_id():
+            return
+        self.update_account_display()
+        if self.pending_launch_since is not None:
+            if self.account_manager.is_token_expired():
+                self.on_account_token_failed(account_id, "il token rinnovato è già in scadenza")
+            else:
+                self.start_game()
 
-            self.account_manager.add_microsoft_account(new_data)
-            self.log("Token Microsoft aggiornato con successo!", "SUCCESS")
-            self.update_account_display()
-            return True
-        except Exception as e:
-            self.log(f"Impossibile aggiornare il token: {e}", "ERROR")
-            return False
+    def on_account_token_failed(self, account_id, error):
+        if account_id != self.account_manager.get_current_account_id() or self.pending_launch_since is None:
+            return
+        self.pending_launch_since = None
+        self.check_installation_status()
+        self.show_message_box("Accesso Scaduto", "Il tuo accesso Microsoft è scaduto. Accedi di nuovo.", 'error')
+        self.show_account_dialog()
     
     def closeEvent(self, event):
         """
         Gestisce l'evento di chiusura della finestra per terminare
         i processi in modo pulito.
         """
+        close_requested = time.perf_counter()
         # Controlla se il processo del gioco è in esecuzione e terminalo
         if self.game_process:
             self.log("Tentativo di chiudere il processo di gioco...", "INFO")
@@ -948,11 +1677,28 @@ class MinecraftLauncher(QMainWindow):
             except Exception as e:
                 self.log(f"Errore durante la chiusura del gioco: {e}", "ERROR")
 
-        # Controlla se un thread del worker è in esecuzione e attendi che finisca
+        # Annulla il task in background e attendi (per un tempo limitato) che si fermi
+        cancelled_task = False
+        task_stopped = True
         if self.worker_thread and self.worker_thread.isRunning():
-            self.log("Attendo la fine del task in background prima di chiudere...", "INFO")
+            self.log("Annullamento del task in background prima di chiudere...", "INFO")
+            cancelled_task = True
+            self.worker.cancel_token.cancel()
             self.worker_thread.quit()
-            self.worker_thread.wait() # Attende bloccando che il thread finisca
+            task_stopped = self.worker_thread.wait(self.SHUTDOWN_TIMEOUT_MS)
+
+        warning = None
+        if not task_stopped:
+            warning = "Task in background non terminato entro il limite: chiusura forzata."
+            self.log(warning, "WARN")
+        self.shutdown_stats.save({"close_to_exit_ms": round((time.perf_counter() - close_requested) * 1000, 1),
+                                  "cancelled_task": cancelled_task, "task_stopped": task_stopped, "warning": warning})
+        # Scrive i file di stato con salvataggi ancora in attesa
+        flush_all()
+        if not task_stopped:
+            # Il task non si è fermato in tempo (ad esempio un'operazione di Forge non interrompibile):
+            # lo stato è già salvato e i .part restano su disco, quindi si esce senza attenderlo
+            os._exit(0)
 
         # Accetta l'evento e permette alla finestra di chiudersi
         event.accept()
@@ -0,0 +1,440 @@
+import os
+import time
+import hashlib
+import threading
+from collections import deque
+from statistics import median
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from cancellation import CancelToken, OperationCancelled, abort_response
+from maintenance import format_size
+from retry import RetryPolicy, HostCircuitBreakers, host_of, http_status, retry_after
+
+
+# Ordinamenti dei download del modpack (chiave dell'impostazione -> etichetta)
+DOWNLOAD_ORDERS = {
+    "small_first": "Prima i file piccoli",
+    "large_first": "Prima i file grandi",
+    "manifest": "Ordine del manifest"
+}
+
+
+# Richieste duplicate (hedging): un download parte una seconda volta, su un'altra sorgente
+# se possibile, quando dura HEDGE_FACTOR volte il tempo atteso in base ai download precedenti
+HEDGE_FACTOR = 4
+HEDGE_MIN_SECONDS = 2.0
+HEDGE_MIN_SAMPLES = 5
+# Al massimo il 10% dei file (più due) viene duplicato: niente raddoppio del carico su un host lento
+HEDGE_MAX_RATIO = 0.1
+
+
+class HashMismatch(Exception):
+    """Il contenuto scaricato non corrisponde allo SHA-256 del manifest"""
+
+
+def order_files(files, strategy):
+    """
+    Ordina i file da sincronizzare in base alla dimensione dichiarata nel manifest.
+    small_first fa avanzare subito il progresso (molti config piccoli completati),
+    large_first avvia per primi i download lunghi e riduce il tempo totale con più thread.
+    """
+    if strategy == "small_first":
+        return sorted(files, key=lambda f: f.get("size") or 0)
+    if strategy == "large_first":
+        return sorted(files, key=lambda f: f.get("size") or 0, reverse=True)
+    return list(files)
+
+
+class BandwidthLimiter:
+    """Limite di banda globale (token bucket) condiviso da tutti i thread di download"""
+
+    def __init__(self, bytes_per_second):
+        self.rate = bytes_per_second
+        # Il secchio contiene al massimo mezzo secondo di traffico: niente raffiche dopo una pausa
+        self.capacity = bytes_per_second / 2
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, amount, cancel=None):
+        if not self.rate:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        # L'attesa avviene fuori dal lock: gli altri thread accumulano il proprio debito in parallelo
+        if wait > 0:
+            if cancel:
+                cancel.wait(wait)
+                cancel.check()
+            else:
+                time.sleep(wait)
+
+
+class ThroughputStats:
+    """Byte scaricati e tempo attivo per categoria, per il riepilogo a fine sincronizzazione"""
+
+    def __init__(self):
+        self.categories = {}
+        self.lock = threading.Lock()
+
+    def add(self, category, num_bytes, started, finished):
+        with self.lock:
+            entry = self.categories.setdefault(category, {"bytes": 0, "files": 0, "first": started, "last": finished})
+            entry["bytes"] += num_bytes
+            entry["files"] += 1
+            entry["first"] = min(entry["first"], started)
+            entry["last"] = max(entry["last"], finished)
+
+    def summary(self):
+        """Righe del riepilogo: la velocità è calcolata sul tempo trascorso tra primo e ultimo download"""
+        lines = []
+        with self.lock:
+            for category, entry in sorted(self.categories.items()):
+                elapsed = entry["last"] - entry["first"]
+                rate = f"{format_size(entry['bytes'] / elapsed)}/s" if elapsed > 0 else "-"
+                lines.append(f"{category}: {entry['files']} file, {format_size(entry['bytes'])} in {elapsed:.1f} s ({rate})")
+        return lines
+
+
+class LatencyStats:
+    """
+    Durata dei download di una sincronizzazione: percentili per il riepilogo e
+    tempo atteso di un file (latenza e velocità mediane) per decidere l'hedging.
+    """
+
+    def __init__(self):
+        self.samples = deque(maxlen=50)   # (latenza, byte, secondi di trasferimento)
+        self.durations = []               # durata totale di ogni file, tentativi compresi
+        self.failed_attempts = 0
+        self.hedges = 0
+        self.hedges_won = 0
+        self.lock = threading.Lock()
+
+    def add_sample(self, latency, num_bytes, transfer):
+        with self.lock:
+            self.samples.append((latency, num_bytes, transfer))
+
+    def add_file(self, seconds):
+        with self.lock:
+            self.durations.append(seconds)
+
+    def add_failure(self):
+        with self.lock:
+            self.failed_attempts += 1
+
+    def hedge_after(self, size):
+        """Secondi dopo i quali duplicare il download di size byte, None finché mancano dati"""
+        with self.lock:
+            if len(self.samples) < HEDGE_MIN_SAMPLES:
+                return None
+            latency = median(sample[0] for sample in self.samples)
+            rates = [num_bytes / transfer for _, num_bytes, transfer in self.samples if num_bytes >= 65536 and transfer > 0]
+        expected = latency + (size / median(rates) if rates else 0)
+        return max(HEDGE_MIN_SECONDS, HEDGE_FACTOR * expected)
+
+    def claim_hedge(self):
+        with self.lock:
+            if self.hedges >= 2 + HEDGE_MAX_RATIO * len(self.durations):
+                return False
+            self.hedges += 1
+            return True
+
+    def hedge_won(self):
+        with self.lock:
+            self.hedges_won += 1
+
+    @staticmethod
+    def percentile(values, fraction):
+        return values[min(len(values) - 1, max(0, int(len(values) * fraction + 0.5) - 1))]
+
+    def summary(self):
+        with self.lock:
+            durations = sorted(self.durations)
+            if not durations:
+                return None
+            p50, p90, p99 = (self.percentile(durations, f) for f in (0.5, 0.9, 0.99))
+            return (f"latenza per file p50 {p50:.2f} s, p90 {p90:.2f} s, p99 {p99:.2f} s, max {durations[-1]:.2f} s; "
+                    f"{self.failed_attempts} tentativi falliti, {self.hedges} richieste duplicate "
+                    f"({self.hedges_won} più veloci dell'originale)")
+
+
+class Downloader:
+    """
+    Download dei file del modpack durante una sincronizzazione.
+
+    - Sessione HTTP condivisa (connessioni riutilizzate tra i thread).
+    - Scrittura in <file>.part e ripresa con Range di un download interrotto.
+    - SHA-256 calcolato durante il download, senza rileggere il file.
+    - Limite di banda globale opzionale e statistiche per categoria.
+    - Con un MirrorSet: ogni file va alla sorgente più rapida e, se il download
+      fallisce o l'hash non corrisponde, viene ripreso da un'altra sorgente.
+    - Errori temporanei ripetuti secondo la RetryPolicy; gli host che continuano
+      a fallire vengono sospesi dal loro circuit breaker.
+    - Un download molto più lento del previsto viene duplicato (hedging): vale
+      la copia che termina per prima, l'altra viene interrotta.
+    """
+
+    def __init__(self, cancel=None, bandwidth_limit=0, max_workers=4, mirrors=None, policy=None, hedging=True):
+        self.cancel = cancel or CancelToken()
+        self.mirrors = mirrors
+        self.policy = policy or RetryPolicy()
+        self.breakers = mirrors.breakers if mirrors else HostCircuitBreakers()
+        self.hedging = hedging
+        # Eseguita nei thread delle copie in gara: la stessa priorità del pool che le avvia
+        self.thread_initializer = None
+        self.limiter = BandwidthLimiter(bandwidth_limit)
+        self.stats = ThroughputStats()
+        self.latency = LatencyStats()
+        self.session = requests.Session()
+        # Le richieste duplicate usano connessioni aggiuntive
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers * 2)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def fetch(self, url, destination, category=None, expected_sha256="", size=0):
+        """
+        Scarica il file e ritorna lo SHA-256 del contenuto.
+        Con expected_sha256 un contenuto diverso solleva HashMismatch, dopo aver
+        provato tutte le sorgenti disponibili. Gli errori temporanei vengono
+        ripetuti fino a policy.max_attempts giri sulle sorgenti.
+        """
+        started = time.monotonic()
+        tried, excluded = set(), set()
+        attempt, last_error = 1, None
+        while True:
+            self.cancel.check()
+            mirror, source_url = self.acquire_source(url, size, tried | excluded)
+            if source_url is None:
+                # Ogni sorgente utilizzabile è stata provata o è sospesa: nuovo giro dopo l'attesa
+                wait = self.source_wait_time(url, excluded)
+                # Un giro conta come tentativo solo se ha fatto almeno una richiesta: l'attesa
+                # di un host sospeso (429 di altri thread, circuit breaker) non consuma tentativi
+                failed_round = last_error is not None and bool(tried)
+                if wait is None or (failed_round and attempt >= self.policy.max_attempts):
+                    raise last_error or Exception(f"Nessuna sorgente disponibile per {os.path.basename(destination)}")
+                if failed_round:
+                    wait = max(wait, self.policy.delay(attempt, last_error))
+                    attempt += 1
+                # Le sorgenti ferme a lungo fanno fallire subito il file invece di bloccare la sincronizzazione
+                self.policy.wait_for_host(wait, host_of(url), self.cancel)
+                tried = set()
+                continue
+            tried.add(mirror)
+            try:
+                digest = self.fetch_hedged(mirror, source_url, url, destination, category, expected_sha256, size)
+            except OperationCancelled:
+                raise
+            except Exception as e:
+                self.latency.add_failure()
+                last_error = e
+                if not self.policy.retryable(e):
+                    # File mancante o contenuto errato: inutile riprovare su questa sorgente
+                    excluded.add(mirror)
+                continue
+            self.latency.add_file(time.monotonic() - started)
+            return digest
+
+    def acquire_source(self, url, size, exclude):
+        if self.mirrors:
+            return self.mirrors.acquire(url, size, exclude)
+        available = None not in exclude and self.breakers.allows(url)
+        return (None, url) if available else (None, None)
+
+    def source_wait_time(self, url, excluded):
+        """Secondi prima che una sorgente del file torni disponibile, None se non ne restano"""
+        if self.mirrors:
+            return self.mirrors.wait_time(url, excluded)
+        return None if None in excluded else self.breakers.remaining(url)
+
+    def fetch_hedged(self, mirror, source_url, url, destination, category, expected_sha256, size):
+        """Un tentativo di download, duplicato su un'altra sorgente se impiega troppo"""
+        part_path = destination + ".part"
+        hedge_after = self.latency.hedge_after(size) if self.hedging else None
+        if hedge_after is None:
+            digest = self.attempt(mirror, source_url, part_path, category, expected_sha256, size, self.cancel)
+            os.replace(part_path, destination)
+            return digest
+
+        # Le due copie girano in thread separati: una richiesta bloccata in attesa della
+        # risposta non si può interrompere, ma il chiamante non deve aspettarla
+        race = {"winner": None, "started": 0, "finished": 0, "errors": [], "tokens": [], "primary": True, "hedges": 0}
+        lock = threading.Lock()
+        done = threading.Event()
+
+        def run(copy_mirror, copy_url, path, token, remove_callback, primary):
+            if self.thread_initializer:
+                self.thread_initializer()
+            try:
+                digest = self.attempt(copy_mirror, copy_url, path, category, expected_sha256, size, token)
+            except Exception as e:
+                with lock:
+                    race["errors"].append(e)
+                    lost = race["winner"] is not None
+            else:
+                with lock:
+                    lost = race["winner"] is not None
+                    if not lost:
+                        race["winner"] = (path, digest)
+                        for other in race["tokens"]:
+                            if other is not token:
+                                other.cancel()
+            finally:
+                remove_callback()
+            # La copia perdente elimina il proprio file parziale
+            if lost and os.path.exists(path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            with lock:
+                race["finished"] += 1
+                if primary:
+                    race["primary"] = False
+                else:
+                    race["hedges"] -= 1
+                if race["winner"] or race["finished"] == race["started"]:
+                    done.set()
+
+        def start(copy_mirror, copy_url, path, primary=False):
+            token = CancelToken()
+            with lock:
+                # L'originale può essere terminato proprio ora: niente copia orfana
+                if done.is_set() or not (primary or race["primary"]):
+                    return False
+                race["started"] += 1
+                race["hedges"] += 0 if primary else 1
+                race["tokens"].append(token)
+            remove_callback = self.cancel.on_cancel(token.cancel)
+            threading.Thread(target=run, args=(copy_mirror, copy_url, path, token, remove_callback, primary), daemon=True).start()
+            return True
+
+        start(mirror, source_url, part_path, primary=True)
+        done.wait(hedge_after)
+        while not done.is_set():
+            self.cancel.check()
+            with lock:
+                # Una copia alla volta, finché l'originale è in corso (una copia fallita viene sostituita)
+                needs_hedge = race["primary"] and race["hedges"] == 0
+            if needs_hedge:
+                # Preferibilmente un'altra sorgente, altrimenti la stessa su una nuova connessione;
+                # se sono tutte in pausa (429) o il limite di copie è raggiunto si riprova più tardi
+                hedge_mirror, hedge_url = self.acquire_source(url, size, {mirror})
+                if hedge_url is None:
+                    hedge_mirror, hedge_url = self.acquire_source(url, size, set())
+                if hedge_url is not None and not (self.latency.claim_hedge()
+                                                  and start(hedge_mirror, hedge_url, destination + ".hedge.part")):
+                    self.release_source(hedge_mirror, size, cancelled=True)
+            done.wait(0.5)
+        self.cancel.check()
+        with lock:
+            winner, errors = race["winner"], race["errors"]
+        if winner is None:
+            raise errors[0]
+        path, digest = winner
+        if path != part_path:
+            self.latency.hedge_won()
+        os.replace(path, destination)
+        return digest
+
+    def attempt(self, mirror, source_url, part_path, category, expected_sha256, size, cancel):
+        """Una richiesta a una sorgente, con l'aggiornamento di statistiche e circuit breaker"""
+        started = time.monotonic()
+        try:
+            digest, received, first_byte = self.fetch_verified(mirror, source_url, part_path, expected_sha256, cancel)
+        except OperationCancelled:
+            self.release_source(mirror, size, cancelled=True)
+            raise
+        except Exception as e:
+            self.release_source(mirror, size, error=e)
+            # Solo gli errori dell'host contano per il circuit breaker, non un file mancante o diverso
+            if self.policy.retryable(e):
+                self.breakers.record_failure(source_url, retry_after(e) if http_status(e) == 429 else None)
+            raise
+        finished = time.monotonic()
+        self.breakers.record_success(source_url)
+        self.release_source(mirror, size, received, finished - started)
+        self.latency.add_sample(first_byte, received, finished - started - first_byte)
+        self.stats.add(category or "altro", received, started, finished)
+        return digest
+
+    def release_source(self, mirror, size, received=0, seconds=0.0, error=None, cancelled=False):
+        if self.mirrors:
+            self.mirrors.release(mirror, size, received, seconds, error, cancelled)
+
+    def fetch_verified(self, mirror, url, part_path, expected_sha256, cancel):
+        digest, received, resumed, first_byte = self._fetch(url, part_path, cancel)
+        if expected_sha256 and digest != expected_sha256 and resumed:
+            # Il .part poteva venire da un'altra sorgente o essere danneggiato: si riscarica da zero
+            os.remove(part_path)
+            digest, received, resumed, first_byte = self._fetch(url, part_path, cancel)
+        if expected_sha256 and digest != expected_sha256:
+            os.remove(part_path)
+            # L'errore conta contro il file; la sorgente viene esclusa solo se si ripete su altri file
+            excluded = self.mirrors.record_mismatch(mirror, url) if self.mirrors else False
+            name = os.path.basename(part_path).replace(".hedge.part", "").replace(".part", "")
+            raise HashMismatch(f"Hash mismatch per {name}" + (f" da {mirror.name}" if mirror else "")
+                               + (" (sorgente esclusa)" if excluded else ""))
+        return digest, received, first_byte
+
+    def probe_mirrors(self, probe_file):
+        """Misura le sorgenti prima della sincronizzazione; ritorna le righe per il log"""
+        if not self.mirrors or len(self.mirrors) < 2:
+            return []
+        return self.mirrors.probe(self.session, probe_file, self.cancel)
+
+    def summary(self):
+        """Righe del riepilogo a fine sincronizzazione: velocità per categoria e latenza"""
+        lines = self.stats.summary()
+        latency = self.latency.summary()
+        if latency:
+            trips = self.breakers.trips()
+            lines.append(latency + (f", {trips} host sospesi dal circuit breaker" if trips else ""))
+        return lines
+
+    def _fetch(self, url, part_path, cancel):
+        """Scarica in part_path (riprendendo un download interrotto); ritorna hash, byte ricevuti, ripresa e latenza"""
+        sha256_hash = hashlib.sha256()
+        offset = 0
+        if os.path.exists(part_path):
+            with open(part_path, 'rb') as f:
+                for byte_block in iter(lambda: f.read(65536), b""):
+                    sha256_hash.update(byte_block)
+                    offset += len(byte_block)
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        received = 0
+        requested = time.monotonic()
+        with self.session.get(url, stream=True, timeout=self.policy.timeout, headers=headers) as r:
+            first_byte = time.monotonic() - requested
+            if offset and r.status_code == 416:
+                # Il .part non corrisponde più al file sul server: si riparte da zero
+                os.remove(part_path)
+                return self._fetch(url, part_path, cancel)
+            r.raise_for_status()
+            if offset and r.status_code != 206:
+                sha256_hash, offset = hashlib.sha256(), 0
+            # L'annullamento chiude la connessione, interrompendo anche una lettura in attesa
+            remove_callback = cancel.on_cancel(lambda: abort_response(r))
+            try:
+                with open(part_path, 'ab' if offset else 'wb') as f:
+                    for chunk in r.iter_content(chunk_size=65536):
+                        cancel.check()
+                        self.limiter.consume(len(chunk), cancel)
+                        f.write(chunk)
+                        sha256_hash.update(chunk)
+                        received += len(chunk)
+            except Exception:
+                cancel.check()
+                raise
+            finally:
+                remove_callback()
+        cancel.check()
+        return sha256_hash.hexdigest(), received, offset > 0, first_byte
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,109 @@
+import os
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from logging.handlers import RotatingFileHandler
+
+
+class GameLogPipeline:
+    """
+    Legge l'output del gioco e lo inoltra all'interfaccia a blocchi.
+
+    Il thread di lettura scrive ogni riga su un file di log a rotazione e la mette
+    in coda; un secondo thread raccoglie le righe in blocchi limitati per tempo
+    (interval) e dimensione (max_lines) e chiama on_batch una volta per blocco.
+    Un blocco pieno viene inviato subito e se ne inizia un altro: nessuna riga
+    viene scartata. La memoria resta limitata: al più max_pending blocchi
+    consegnati e non ancora confermati dall'interfaccia (batch_done) e max_queued
+    righe in coda. Se l'interfaccia resta indietro il thread di lettura attende,
+    e con lui il gioco quando il buffer della pipe si riempie.
+    on_line, se indicato, riceve ogni riga con l'istante di arrivo (perf_counter)
+    direttamente nel thread di lettura.
+    """
+
+    def __init__(self, log_directory, on_batch, interval=0.1, max_lines=1000, tail_lines=2000,
+                 max_bytes=10 * 1024 * 1024, backup_count=5, on_line=None, max_queued=100_000,
+                 max_pending=8):
+        self.on_batch = on_batch
+        self.on_line = on_line
+        self.interval = interval
+        self.max_lines = max_lines
+        self.tail = deque(maxlen=tail_lines)
+        self.lines_total = 0
+        self.last_line_time = None
+        self.log_file = os.path.join(log_directory, "game.log")
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._pending = threading.Semaphore(max_pending)
+        self._closed = threading.Event()
+        self._threads = []
+
+        os.makedirs(log_directory, exist_ok=True)
+        self._file_logger = logging.getLogger(f"cignolauncher.game.{id(self)}")
+        self._file_logger.propagate = False
+        self._file_logger.setLevel(logging.INFO)
+        self._file_handler = RotatingFileHandler(self.log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        self._file_handler.setFormatter(logging.Formatter("%(message)s"))
+        # Ogni sessione inizia con un file nuovo, quelle precedenti diventano game.log.1, .2, ...
+        if os.path.exists(self.log_file) and os.path.getsize(self.log_file) > 0:
+            self._file_handler.doRollover()
+        self._file_logger.addHandler(self._file_handler)
+
+    def start(self, pipe):
+        for target, args in ((self._read, (pipe,)), (self._batch, ())):
+            thread = threading.Thread(target=target, args=args, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _read(self, pipe):
+        try:
+            for line in iter(pipe.readline, ''):
+                line = line.rstrip("\r\n")
+                if not line:
+                    continue
+                self._file_logger.info(line)
+                self.tail.append(line)
+                self.lines_total += 1
+                self.last_line_time = time.monotonic()
+                if self.on_line:
+                    self.on_line(line, time.perf_counter())
+                self._queue.put(line)
+        except (OSError, ValueError):
+            pass
+        finally:
+            self._closed.set()
+            self._queue.put(None)
+
+    def _batch(self):
+        finished = False
+        while not finished:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.max_lines:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    line = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if line is None:
+                    finished = True
+                    break
+                batch.append(line)
+            # Attende che l'interfaccia abbia mostrato i blocchi precedenti
+            self._pending.acquire()
+            self.on_batch(batch)
+        self._file_handler.close()
+        self._file_logger.removeHandler(self._file_handler)
+
+    def batch_done(self):
+        """Chiamata dall'interfaccia dopo aver mostrato un blocco ricevuto da on_batch"""
+        self._pending.release()
+
+    def wait_closed(self, timeout=None):
+        return self._closed.wait(timeout)
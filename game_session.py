@@ -0,0 +1,153 @@
+import os
+import re
+import hashlib
+from datetime import datetime
+
+from state_store import open_store
+
+
+# Righe con cui Minecraft registra la creazione degli atlanti di texture
+ATLAS_REGEX = r"Created: \d+x\d+x\d+ \S+-atlas"
+
+# Fasi di avvio di Forge/Minecraft: ogni fase inizia quando compare il suo marcatore
+# nell'output del gioco e termina quando inizia la successiva. La prima fase parte da Popen.
+BOOT_PHASES = [
+    ("jvm", "Avvio JVM", None),
+    ("modlauncher", "ModLauncher e scansione mod", r"ModLauncher running"),
+    ("game_init", "Inizializzazione Minecraft", r"Setting user: |Backend library: LWJGL"),
+    ("mod_construction", "Costruzione mod", r"Forge mod loading, version"),
+    ("registries", "Caricamento registri", r"Injecting existing registry data|Freezing registries"),
+    ("resource_reload", "Ricaricamento risorse", r"Reloading ResourceManager"),
+    ("sound", "Motore audio", r"Sound engine started"),
+    ("atlas", "Creazione atlanti texture", ATLAS_REGEX),
+    ("shaders", "Caricamento shader", r"\[(?:Oculus|Iris)\].*(?:shaderpack|[Ss]haders)"),
+]
+
+# Le texture vengono unite negli atlanti subito prima della comparsa del menu principale:
+# il menu è considerato raggiunto all'ultima riga di atlante dopo l'avvio del motore audio
+ATLAS_PATTERN = re.compile(ATLAS_REGEX)
+MENU_AFTER_PHASE = "sound"
+
+
+class BootPhaseParser:
+    """
+    Riconosce in streaming i marcatori del ciclo di vita di Forge e Minecraft e
+    misura la durata di ogni fase fino al menu principale.
+
+    feed() viene chiamato dal thread che legge l'output del gioco con l'istante
+    di arrivo della riga; dopo il menu principale il parser smette di analizzare.
+    """
+
+    def __init__(self, start_time):
+        self.start_time = start_time
+        self.marks = {"jvm": 0.0}
+        self.order = [key for key, _, _ in BOOT_PHASES]
+        self.labels = {key: label for key, label, _ in BOOT_PHASES}
+        self.pattern = re.compile("|".join(f"(?P<{key}>{regex})" for key, _, regex in BOOT_PHASES if regex))
+        self.last_atlas = None
+        self.menu_time = None
+        self.completed = False
+
+    def feed(self, line, timestamp):
+        if self.completed:
+            return False
+        elapsed = timestamp - self.start_time
+        if self.last_atlas is not None and not ATLAS_PATTERN.search(line):
+            # Fine della creazione degli atlanti: il menu era già visibile all'ultima riga
+            self.finish(self.last_atlas)
+            return True
+        match = self.pattern.search(line)
+        if not match:
+            return False
+        key = match.lastgroup
+        if key not in self.marks:
+            self.marks[key] = elapsed
+        if key == "atlas" and MENU_AFTER_PHASE in self.marks:
+            self.last_atlas = elapsed
+        return False
+
+    def finish(self, menu_time=None):
+        """Chiude il parsing (menu raggiunto o gioco chiuso prima del menu)"""
+        if self.completed:
+            return
+        self.menu_time = menu_time if menu_time is not None else self.last_atlas
+        self.completed = True
+
+    def result(self):
+        """Durata di ogni fase riconosciuta, in ordine, e tempo totale fino al menu"""
+        seen = sorted(self.marks.items(), key=lambda item: (item[1], self.order.index(item[0])))
+        end = self.menu_time if self.menu_time is not None else (seen[-1][1] if seen else 0.0)
+        phases = []
+        for i, (key, start) in enumerate(seen):
+            stop = seen[i + 1][1] if i + 1 < len(seen) else end
+            phases.append({"key": key, "label": self.labels[key], "seconds": round(max(0.0, stop - start), 2)})
+        return {"menu_reached": self.menu_time is not None,
+                "total": round(end, 2) if self.menu_time is not None else None,
+                "phases": phases}
+
+
+def mods_fingerprint(mods_folder):
+    """Numero di mod e impronta breve (nome e dimensione) per riconoscere un aggiornamento del modpack"""
+    mods = []
+    if os.path.isdir(mods_folder):
+        for entry in os.scandir(mods_folder):
+            if entry.is_file() and entry.name.endswith(".jar"):
+                mods.append(f"{entry.name}:{entry.stat().st_size}")
+    mods.sort()
+    return len(mods), hashlib.sha256("\n".join(mods).encode()).hexdigest()[:12]
+
+
+class SessionHistory:
+    """Storico delle sessioni di gioco salvato in sessions.json (solo le ultime max_sessions)"""
+
+    # Una fase è considerata regredita se più lenta della mediana precedente di questo fattore e margine
+    REGRESSION_FACTOR = 1.3
+    REGRESSION_MIN_SECONDS = 2.0
+    BASELINE_SESSIONS = 5
+
+    def __init__(self, launcher_directory, max_sessions=30):
+        self.sessions_file = os.path.join(launcher_directory, "sessions.json")
+        self.store = open_store(self.sessions_file, default=lambda: {"sessions": []})
+        self.max_sessions = max_sessions
+        self.sessions = self.load_sessions()
+
+    def load_sessions(self):
+        return self.store.load().setdefault("sessions", [])
+
+    def save_sessions(self):
+        self.store.save({"sessions": self.sessions})
+
+    def begin(self, **info):
+        """Crea il record della nuova sessione (salvato alla fine con finish)"""
+        session = {"started_at": datetime.now().isoformat(timespec='seconds')}
+        session.update(info)
+        return session
+
+    def finish(self, session):
+        self.sessions.append(session)
+        del self.sessions[:-self.max_sessions]
+        self.save_sessions()
+
+    def recent(self, key, count):
+        """Ultime 'count' sessioni che contengono il dato 'key' (dalla più vecchia alla più recente)"""
+        return [s for s in self.sessions if s.get(key)][-count:]
+
+    def find_regressions(self, session):
+        """
+        Confronta le fasi di avvio della sessione con la mediana delle sessioni
+        precedenti. Ritorna (regressioni, modpack_cambiato).
+        """
+        previous = [s for s in self.sessions if s is not session and s.get("boot", {}).get("menu_reached")]
+        previous = previous[-self.BASELINE_SESSIONS:]
+        if not previous or not session.get("boot"):
+            return [], False
+        mods_changed = previous[-1].get("mods_fingerprint") != session.get("mods_fingerprint")
+        regressions = []
+        for phase in session["boot"]["phases"]:
+            samples = sorted(p["seconds"] for s in previous for p in s["boot"]["phases"] if p["key"] == phase["key"])
+            if not samples:
+                continue
+            median = samples[len(samples) // 2]
+            if phase["seconds"] > median * self.REGRESSION_FACTOR and phase["seconds"] - median >= self.REGRESSION_MIN_SECONDS:
+                regressions.append({"label": phase["label"], "seconds": phase["seconds"], "median": median})
+        return regressions, mods_changed
@@ -0,0 +1,127 @@
+import os
+import re
+import math
+
+
+# Decoratori del log unificato: [12.345s][info][gc] messaggio (i campi possono avere spazi di allineamento)
+LINE_PATTERN = re.compile(r"^\[([\d.]+)s\]\[\w+\s*\]\[([\w,]+)\s*\] (.*)$")
+# G1/Parallel/Serial: "GC(12) Pause Young (Normal) (G1 Evacuation Pause) 512M->128M(4096M) 12.345ms"
+PAUSE_PATTERN = re.compile(r"GC\(\d+\) Pause (.+?) (\d+)([KMG])->(\d+)([KMG])\((\d+)([KMG])\) ([\d.]+)ms")
+# ZGC: pause senza occupazione e riepilogo del ciclo con l'occupazione prima/dopo
+ZGC_PAUSE_PATTERN = re.compile(r"GC\(\d+\) Pause (Mark Start|Mark End|Relocate Start) ([\d.]+)ms")
+ZGC_CYCLE_PATTERN = re.compile(r"GC\(\d+\) Garbage Collection \(.+?\) (\d+)M\(\d+%\)->(\d+)M\(\d+%\)")
+COLLECTOR_PATTERN = re.compile(r"Using (.+)$")
+
+UNIT_MB = {"K": 1 / 1024, "M": 1, "G": 1024}
+
+# Margine del heap rispetto ai dati ancora vivi dopo le GC (G1 lavora bene sotto il 35-40% di occupazione)
+HEAP_HEADROOM = 3.0
+
+
+def gc_log_arguments(log_path):
+    """Argomenti JVM per il log unificato del GC su file (Java 9+)"""
+    # Il percorso tra virgolette evita che i ':' dei percorsi Windows vengano interpretati da -Xlog
+    return [f'-Xlog:gc*:file="{log_path}":uptime,level,tags:filecount=0']
+
+
+def percentile(values, fraction):
+    """Percentile con metodo nearest-rank su una lista già ordinata"""
+    if not values:
+        return None
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def parse_gc_log(log_path):
+    """
+    Analizza il log del GC di una sessione.
+    Ritorna un riepilogo (pause, allocazione e occupazione del heap) o None se il log è vuoto.
+    """
+    if not os.path.exists(log_path):
+        return None
+    collector = None
+    pauses = []
+    heap_after = []
+    capacity = None
+    allocated = 0.0
+    previous_after = None
+    first_time = last_time = None
+
+    with open(log_path, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            match = LINE_PATTERN.match(line.rstrip("\n"))
+            if not match:
+                continue
+            uptime, tags, message = float(match.group(1)), match.group(2), match.group(3)
+            if tags == "gc,init" or (tags == "gc" and collector is None):
+                found = COLLECTOR_PATTERN.search(message)
+                if found:
+                    collector = found.group(1)
+                    continue
+
+            before = after = None
+            pause = PAUSE_PATTERN.search(message) if tags == "gc" else None
+            if pause:
+                before = int(pause.group(2)) * UNIT_MB[pause.group(3)]
+                after = int(pause.group(4)) * UNIT_MB[pause.group(5)]
+                capacity = int(pause.group(6)) * UNIT_MB[pause.group(7)]
+                pauses.append(float(pause.group(8)))
+            elif tags in ("gc,phases", "gc"):
+                zgc_pause = ZGC_PAUSE_PATTERN.search(message)
+                if zgc_pause:
+                    pauses.append(float(zgc_pause.group(2)))
+                    continue
+                cycle = ZGC_CYCLE_PATTERN.search(message) if tags == "gc" else None
+                if cycle:
+                    before, after = int(cycle.group(1)), int(cycle.group(2))
+            if after is None:
+                continue
+
+            # Memoria allocata tra due GC: occupazione prima di questa meno quella dopo la precedente
+            if previous_after is not None and before > previous_after:
+                allocated += before - previous_after
+            previous_after = after
+            heap_after.append((uptime, after))
+            first_time = uptime if first_time is None else first_time
+            last_time = uptime
+
+    if not pauses:
+        return None
+    pauses.sort()
+    elapsed = (last_time - first_time) if first_time is not None else 0
+    # Dati vivi stimati sulla seconda metà della sessione: durante il caricamento il heap cresce ancora
+    midpoint = first_time + elapsed / 2 if first_time is not None else 0
+    steady = sorted(after for uptime, after in heap_after if uptime >= midpoint)
+    return {
+        "collector": collector,
+        "pauses": len(pauses),
+        "pause_p50_ms": round(percentile(pauses, 0.5), 2),
+        "pause_p99_ms": round(percentile(pauses, 0.99), 2),
+        "pause_max_ms": round(pauses[-1], 2),
+        "pause_total_ms": round(sum(pauses), 2),
+        "alloc_rate_mb_s": round(allocated / elapsed, 1) if elapsed > 0 else None,
+        "heap_after_gc_avg_mb": round(sum(a for _, a in heap_after) / len(heap_after)) if heap_after else None,
+        "heap_after_gc_max_mb": round(max(a for _, a in heap_after)) if heap_after else None,
+        "live_set_mb": round(percentile(steady, 0.9)) if steady else None,
+        "heap_capacity_mb": round(capacity) if capacity else None
+    }
+
+
+def recommend_heap_from_gc(summary, current_heap_gb, min_gb=2, max_gb=16):
+    """
+    Suggerisce la RAM da allocare a partire dai dati vivi dopo le GC.
+    Ritorna (heap consigliato in GB, motivazione) o (None, None) se i dati non bastano.
+    """
+    if not summary or not summary.get("live_set_mb"):
+        return None, None
+    live_gb = summary["live_set_mb"] / 1024
+    recommended = int(max(min_gb, min(max_gb, math.ceil(live_gb * HEAP_HEADROOM))))
+    if recommended > current_heap_gb:
+        reason = (f"dopo le GC restano {live_gb:.1f} GB occupati su {current_heap_gb} GB: "
+                  f"consigliati {recommended} GB per ridurre le pause")
+    elif recommended < current_heap_gb - 1:
+        reason = (f"dopo le GC restano solo {live_gb:.1f} GB occupati: "
+                  f"{recommended} GB sono sufficienti e lasciano più memoria al sistema")
+    else:
+        recommended = current_heap_gb
+        reason = f"la RAM allocata ({current_heap_gb} GB) è adeguata"
+    return recommended, reason
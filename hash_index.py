@@ -0,0 +1,64 @@
+import os
+import hashlib
+import threading
+
+from state_store import open_store
+
+
+class HashIndex:
+    """
+    Indice degli SHA-256 dei file del modpack, salvato in hash_index.json.
+
+    Per ogni file registra dimensione e mtime: finché non cambiano l'hash viene
+    letto dall'indice invece di rileggere il file. I controlli all'avvio e la
+    sincronizzazione non ricalcolano quindi l'hash di tutto il modpack ogni volta.
+    """
+
+    def __init__(self, launcher_directory):
+        self.launcher_directory = launcher_directory
+        self.store = open_store(os.path.join(launcher_directory, "hash_index.json"), default=lambda: {"files": {}})
+        self.files = self.store.load().setdefault("files", {})
+        self.lock = threading.Lock()
+
+    def key(self, file_path):
+        return os.path.relpath(os.path.abspath(file_path), self.launcher_directory).replace(os.sep, "/")
+
+    @staticmethod
+    def calculate_sha256(file_path, cancel=None):
+        sha256_hash = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for byte_block in iter(lambda: f.read(65536), b""):
+                if cancel:
+                    cancel.check()
+                sha256_hash.update(byte_block)
+        return sha256_hash.hexdigest()
+
+    def sha256(self, file_path, cancel=None):
+        """SHA-256 del file (stringa vuota se non leggibile), ricalcolato solo se il file è cambiato"""
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return ""
+        key = self.key(file_path)
+        with self.lock:
+            entry = self.files.get(key)
+        if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            return entry["sha256"]
+        try:
+            digest = self.calculate_sha256(file_path, cancel)
+        except IOError:
+            return ""
+        self.record(file_path, digest, st)
+        return digest
+
+    def record(self, file_path, digest, st=None):
+        """Registra l'hash di un file appena scritto (già calcolato durante il download)"""
+        st = st or os.stat(file_path)
+        with self.lock:
+            self.files[self.key(file_path)] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": digest}
+            self.store.save()
+
+    def forget(self, file_path):
+        with self.lock:
+            if self.files.pop(self.key(file_path), None) is not None:
+                self.store.save()
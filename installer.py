@@ -0,0 +1,445 @@
+import os
+import sys
+import json
+import hashlib
+import platform
+import zipfile
+import shutil
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import minecraft_launcher_lib
+
+from maintenance import VersionCollector
+from cancellation import CancelToken, abort_response
+from retry import RetryPolicy, HostCircuitBreakers
+
+
+VERSION_MANIFEST_URL = "https://launchermeta.mojang.com/mc/game/version_manifest_v2.json"
+LIBRARIES_URL = "https://libraries.minecraft.net"
+RESOURCES_URL = "https://resources.download.minecraft.net"
+
+
+def empty(*args):
+    pass
+
+
+def get_os_name():
+    """Nome del sistema operativo come usato nelle regole dei JSON di versione"""
+    if sys.platform == "win32":
+        return "windows"
+    if sys.platform == "darwin":
+        return "osx"
+    return "linux"
+
+
+def calculate_sha1(file_path):
+    sha1_hash = hashlib.sha1()
+    try:
+        with open(file_path, "rb") as f:
+            for byte_block in iter(lambda: f.read(65536), b""): sha1_hash.update(byte_block)
+        return sha1_hash.hexdigest()
+    except IOError: return ""
+
+
+class VanillaInstaller:
+    """
+    Installa una versione vanilla di Minecraft scaricando librerie e asset
+    in parallelo con un pool di thread limitato.
+
+    Il callback ha la stessa forma di minecraft_launcher_lib
+    ({"setStatus": ..., "setProgress": ..., "setMax": ...}).
+    Gli errori temporanei di rete vengono ripetuti secondo la RetryPolicy.
+    """
+
+    def __init__(self, minecraft_directory, callback=None, max_workers=16, cancel=None, policy=None):
+        self.minecraft_directory = minecraft_directory
+        self.callback = callback or {}
+        self.max_workers = max_workers
+        self.cancel = cancel or CancelToken()
+        self.policy = policy or RetryPolicy()
+        self.breakers = HostCircuitBreakers()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.os_name = get_os_name()
+        self.stats = {"downloaded": 0, "skipped": 0, "bytes": 0}
+        self._stats_lock = threading.Lock()
+
+    def set_status(self, text):
+        self.callback.get("setStatus", empty)(text)
+
+    def version_json_path(self, version_id):
+        return os.path.join(self.minecraft_directory, "versions", version_id, f"{version_id}.json")
+
+    def install(self, version_id):
+        """Installa (o ripara) la versione indicata"""
+        json_path = self.version_json_path(version_id)
+        if not os.path.isfile(json_path):
+            self.set_status("Download informazioni versione")
+            self.fetch_version_json(version_id, json_path)
+
+        with open(json_path, 'r', encoding='utf-8') as f:
+            version_data = json.load(f)
+
+        tasks = self.library_tasks(version_data)
+        tasks.extend(self.asset_tasks(version_data))
+        tasks.extend(self.client_tasks(version_data))
+
+        self.set_status(f"Download librerie e asset ({len(tasks)} file)")
+        self.run_tasks(tasks)
+        self.cancel.check()
+        self.extract_natives(version_data)
+
+        if "javaVersion" in version_data:
+            self.set_status("Installazione Java runtime")
+            minecraft_launcher_lib.runtime.install_jvm_runtime(
+                version_data["javaVersion"]["component"], self.minecraft_directory, callback=self.callback
+            )
+        self.set_status("Installazione completata")
+        return self.stats
+
+    def fetch_version_json(self, version_id, json_path):
+        def get_manifest():
+            response = self.session.get(VERSION_MANIFEST_URL, timeout=self.policy.timeout)
+            response.raise_for_status()
+            return response.json()
+        for entry in self.policy.run(get_manifest, VERSION_MANIFEST_URL, self.cancel, self.breakers)["versions"]:
+            if entry["id"] == version_id:
+                self.download(entry["url"], json_path, sha1=entry.get("sha1"))
+                return
+        raise Exception(f"Versione {version_id} non trovata")
+
+    def rules_allow(self, rules):
+        """Valuta le regole di una libreria per il sistema corrente (senza feature)"""
+        if not rules:
+            return True
+        allowed = False
+        for rule in rules:
+            if "features" in rule:
+                continue
+            matches = True
+            os_rule = rule.get("os", {})
+            if "name" in os_rule and os_rule["name"] != self.os_name:
+                matches = False
+            if "arch" in os_rule and os_rule["arch"] == "x86" and platform.architecture()[0] != "32bit":
+                matches = False
+            if matches:
+                allowed = rule["action"] == "allow"
+        return allowed
+
+    def native_classifier(self, lib):
+        natives = lib.get("natives", {})
+        classifier = natives.get(self.os_name)
+        if classifier:
+            arch = "32" if platform.architecture()[0] == "32bit" else "64"
+            return classifier.replace("${arch}", arch)
+        return None
+
+    def library_tasks(self, version_data):
+        tasks = []
+        libraries_dir = os.path.join(self.minecraft_directory, "libraries")
+        for lib in version_data.get("libraries", []):
+            if not self.rules_allow(lib.get("rules")):
+                continue
+            downloads = lib.get("downloads", {})
+            artifact = downloads.get("artifact")
+            if artifact and artifact.get("url") and artifact.get("path"):
+                tasks.append((artifact["url"], os.path.join(libraries_dir, artifact["path"]), artifact.get("sha1"), artifact.get("size")))
+            elif not downloads and "name" in lib:
+                group, name, version = lib["name"].split(":")[0:3]
+                rel_path = os.path.join(*group.split("."), name, version, f"{name}-{version}.jar")
+                base_url = lib.get("url", LIBRARIES_URL).rstrip("/")
+                tasks.append((f"{base_url}/{rel_path.replace(os.sep, '/')}", os.path.join(libraries_dir, rel_path), None, None))
+            classifier = self.native_classifier(lib)
+            if classifier and classifier in downloads.get("classifiers", {}):
+                native = downloads["classifiers"][classifier]
+                tasks.append((native["url"], os.path.join(libraries_dir, native["path"]), native.get("sha1"), native.get("size")))
+        return tasks
+
+    def asset_tasks(self, version_data):
+        if "assetIndex" not in version_data:
+            return []
+        index_info = version_data["assetIndex"]
+        index_path = os.path.join(self.minecraft_directory, "assets", "indexes", f"{version_data['assets']}.json")
+        self.download(index_info["url"], index_path, sha1=index_info.get("sha1"))
+        with open(index_path, 'r', encoding='utf-8') as f:
+            objects = json.load(f)["objects"]
+
+        tasks, seen = [], set()
+        objects_dir = os.path.join(self.minecraft_directory, "assets", "objects")
+        for obj in objects.values():
+            file_hash = obj["hash"]
+            if file_hash in seen:
+                continue
+            seen.add(file_hash)
+            tasks.append((f"{RESOURCES_URL}/{file_hash[:2]}/{file_hash}", os.path.join(objects_dir, file_hash[:2], file_hash), file_hash, obj.get("size")))
+        return tasks
+
+    def client_tasks(self, version_data):
+        tasks = []
+        logging_file = version_data.get("logging", {}).get("client", {}).get("file")
+        if logging_file:
+            tasks.append((logging_file["url"], os.path.join(self.minecraft_directory, "assets", "log_configs", logging_file["id"]), logging_file.get("sha1"), logging_file.get("size")))
+        client = version_data.get("downloads", {}).get("client")
+        if client:
+            version_id = version_data["id"]
+            tasks.append((client["url"], os.path.join(self.minecraft_directory, "versions", version_id, f"{version_id}.jar"), client.get("sha1"), client.get("size")))
+        return tasks
+
+    def run_tasks(self, tasks):
+        """Esegue i download nel pool, aggiornando il progresso man mano che terminano"""
+        self.callback.get("setMax", empty)(len(tasks))
+        done = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self.download, url, path, sha1, size) for url, path, sha1, size in tasks]
+            try:
+                for future in as_completed(futures):
+                    future.result()
+                    done += 1
+                    self.callback.get("setProgress", empty)(done)
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                raise
+
+    def is_present(self, path, sha1=None, size=None):
+        """
+        Un file è già presente se esiste, ha la dimensione attesa e lo SHA-1 atteso.
+        La dimensione scarta subito i file troncati senza leggerli; l'hash trova quelli
+        danneggiati della stessa dimensione (l'installer gira solo alla prima
+        installazione, al cambio di versione o per una riparazione).
+        """
+        if not os.path.isfile(path):
+            return False
+        if size is not None and os.path.getsize(path) != size:
+            return False
+        if sha1:
+            return calculate_sha1(path) == sha1
+        return True
+
+    def download(self, url, path, sha1=None, size=None):
+        self.cancel.check()
+        if self.is_present(path, sha1, size):
+            with self._stats_lock:
+                self.stats["skipped"] += 1
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        written = self.policy.run(lambda: self.download_once(url, path, sha1), url, self.cancel, self.breakers)
+        with self._stats_lock:
+            self.stats["downloaded"] += 1
+            self.stats["bytes"] += written
+        return True
+
+    def download_once(self, url, path, sha1=None):
+        part_path = path + ".part"
+        sha1_hash = hashlib.sha1()
+        written = 0
+        with self.session.get(url, stream=True, timeout=self.policy.timeout) as r:
+            r.raise_for_status()
+            # L'annullamento chiude la connessione, interrompendo anche una lettura in attesa
+            remove_callback = self.cancel.on_cancel(lambda: abort_response(r))
+            try:
+                with open(part_path, 'wb') as f:
+                    for chunk in r.iter_content(chunk_size=65536):
+                        self.cancel.check()
+                        f.write(chunk)
+                        sha1_hash.update(chunk)
+                        written += len(chunk)
+            except Exception:
+                self.cancel.check()
+                raise
+            finally:
+                remove_callback()
+        self.cancel.check()
+        if sha1 and sha1_hash.hexdigest() != sha1:
+            os.remove(part_path)
+            raise Exception(f"SHA-1 non valido per {os.path.basename(path)}")
+        os.replace(part_path, path)
+        return written
+
+    def extract_natives(self, version_data):
+        """Estrae le natives vecchio stile (librerie con chiave 'natives') nella cartella della versione"""
+        natives_dir = os.path.join(self.minecraft_directory, "versions", version_data["id"], "natives")
+        libraries_dir = os.path.join(self.minecraft_directory, "libraries")
+        for lib in version_data.get("libraries", []):
+            if not self.rules_allow(lib.get("rules")):
+                continue
+            classifier = self.native_classifier(lib)
+            native = lib.get("downloads", {}).get("classifiers", {}).get(classifier) if classifier else None
+            if not native:
+                continue
+            exclude = lib.get("extract", {}).get("exclude", [])
+            jar_path = os.path.join(libraries_dir, native["path"])
+            os.makedirs(natives_dir, exist_ok=True)
+            with zipfile.ZipFile(jar_path) as zf:
+                for member in zf.namelist():
+                    if member.endswith("/") or any(member.startswith(e) for e in exclude):
+                        continue
+                    target = os.path.normpath(os.path.join(natives_dir, member))
+                    if not target.startswith(os.path.normpath(natives_dir) + os.sep):
+                        continue
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    with zf.open(member) as src, open(target, 'wb') as dst:
+                        dst.write(src.read())
+
+
+class ForgeArtifactCache:
+    """
+    Cache degli output dell'installazione di Forge (JSON di versione, librerie
+    e jar generati dai processori), indicizzata per versione di Minecraft,
+    versione di Forge e hash del client vanilla da cui sono stati generati.
+
+    Permette di reinstallare o riparare Forge senza rete e senza rieseguire
+    i processori.
+    """
+
+    def __init__(self, cache_directory, minecraft_directory, log=None, max_entries=2, cancel=None):
+        self.cache_directory = cache_directory
+        self.minecraft_directory = minecraft_directory
+        self.log = log or (lambda message, level="INFO": None)
+        self.max_entries = max_entries
+        self.cancel = cancel or CancelToken()
+        self.versions = VersionCollector(minecraft_directory)
+
+    @staticmethod
+    def forge_version_id(forge_version):
+        return forge_version.replace("-", "-forge-", 1)
+
+    def input_hash(self, minecraft_version):
+        """Hash degli input dei processori: versione e SHA-1 dichiarato del client vanilla"""
+        data = self.versions.load_version_json(minecraft_version)
+        client_sha1 = (data or {}).get("downloads", {}).get("client", {}).get("sha1")
+        if not client_sha1:
+            return None
+        return hashlib.sha1(f"{minecraft_version}:{client_sha1}".encode()).hexdigest()
+
+    def entry_dir(self, minecraft_version, forge_version):
+        input_hash = self.input_hash(minecraft_version)
+        if not input_hash:
+            return None
+        return os.path.join(self.cache_directory, f"{forge_version}-{input_hash[:16]}")
+
+    def load_entry(self, minecraft_version, forge_version):
+        entry_dir = self.entry_dir(minecraft_version, forge_version)
+        if not entry_dir:
+            return None, None
+        try:
+            with open(os.path.join(entry_dir, "entry.json"), 'r', encoding='utf-8') as f:
+                return entry_dir, json.load(f)
+        except (OSError, ValueError):
+            return entry_dir, None
+
+    def collect_outputs(self, forge_version):
+        """Percorsi (relativi a minecraft_directory) dei file prodotti dall'installazione di Forge"""
+        version_id = self.forge_version_id(forge_version)
+        data = self.versions.load_version_json(version_id)
+        if not data:
+            return []
+        outputs = set()
+        version_dir = os.path.join(self.minecraft_directory, "versions", version_id)
+        for root, _, filenames in os.walk(version_dir):
+            for filename in filenames:
+                outputs.add(os.path.relpath(os.path.join(root, filename), self.minecraft_directory))
+
+        libraries_dir = os.path.join(self.minecraft_directory, "libraries")
+        library_files, _ = self.versions.referenced_libraries([version_id])
+        for rel_path in library_files:
+            if os.path.isfile(os.path.join(libraries_dir, rel_path)):
+                outputs.add(os.path.join("libraries", rel_path))
+        for prefix in self.versions.forge_generated_prefixes(data):
+            for root, _, filenames in os.walk(os.path.join(libraries_dir, prefix)):
+                for filename in filenames:
+                    outputs.add(os.path.relpath(os.path.join(root, filename), self.minecraft_directory))
+        return sorted(outputs)
+
+    def store(self, minecraft_version, forge_version):
+        """Salva in cache gli output dell'installazione di Forge appena completata"""
+        entry_dir = self.entry_dir(minecraft_version, forge_version)
+        outputs = self.collect_outputs(forge_version)
+        if not entry_dir or not outputs:
+            return False
+
+        temp_dir = entry_dir + ".tmp"
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        files = {}
+        for rel_path in outputs:
+            target = os.path.join(temp_dir, "files", rel_path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            files[rel_path.replace(os.sep, "/")] = self.copy_with_sha1(os.path.join(self.minecraft_directory, rel_path), target)
+
+        entry = {
+            "minecraft_version": minecraft_version,
+            "forge_version": forge_version,
+            "input_hash": self.input_hash(minecraft_version),
+            "created_at": datetime.now().isoformat(),
+            "files": files
+        }
+        with open(os.path.join(temp_dir, "entry.json"), 'w', encoding='utf-8') as f:
+            json.dump(entry, f, indent=2)
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.replace(temp_dir, entry_dir)
+        self.prune()
+        return True
+
+    def outputs_present(self, minecraft_version, forge_version):
+        """
+        Controllo rapido (solo dimensioni) che gli output in cache siano presenti
+        in minecraft_directory. Senza una voce in cache non è possibile verificarlo.
+        """
+        entry_dir, entry = self.load_entry(minecraft_version, forge_version)
+        if not entry:
+            return True
+        for rel_path in entry["files"]:
+            cached = os.path.join(entry_dir, "files", rel_path)
+            installed = os.path.join(self.minecraft_directory, rel_path)
+            try:
+                if os.path.getsize(installed) != os.path.getsize(cached):
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def restore(self, minecraft_version, forge_version):
+        """Ripristina gli output di Forge dalla cache. Ritorna False se non disponibili o corrotti"""
+        entry_dir, entry = self.load_entry(minecraft_version, forge_version)
+        if not entry or entry.get("input_hash") != self.input_hash(minecraft_version):
+            return False
+        for rel_path, expected_sha1 in entry["files"].items():
+            self.cancel.check()
+            source = os.path.join(entry_dir, "files", rel_path)
+            target = os.path.join(self.minecraft_directory, rel_path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            try:
+                if self.copy_with_sha1(source, target + ".part") != expected_sha1:
+                    raise IOError("hash non valido")
+                os.replace(target + ".part", target)
+            except OSError as e:
+                self.log(f"Cache Forge non valida ({rel_path}): {e}", "ERROR")
+                if os.path.exists(target + ".part"): os.remove(target + ".part")
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                return False
+        return True
+
+    def prune(self):
+        """Mantiene solo le voci di cache più recenti"""
+        if not os.path.isdir(self.cache_directory):
+            return
+        entries = [os.path.join(self.cache_directory, name) for name in os.listdir(self.cache_directory)]
+        entries = sorted((e for e in entries if os.path.isdir(e) and not e.endswith(".tmp")), key=os.path.getmtime, reverse=True)
+        for old_entry in entries[self.max_entries:]:
+            shutil.rmtree(old_entry, ignore_errors=True)
+
+    @staticmethod
+    def copy_with_sha1(source, target):
+        sha1_hash = hashlib.sha1()
+        with open(source, 'rb') as src, open(target, 'wb') as dst:
+            for chunk in iter(lambda: src.read(1024 * 1024), b""):
+                sha1_hash.update(chunk)
+                dst.write(chunk)
+        return sha1_hash.hexdigest()
@@ -0,0 +1,241 @@
+import os
+import sys
+import json
+import ctypes
+import hashlib
+import subprocess
+from datetime import datetime
+
+from state_store import open_store
+
+
+GB = 1024 ** 3
+
+# Heap minimo consigliato per il modpack e minimo assoluto della raccomandazione automatica
+MODPACK_MIN_HEAP_GB = 4
+MIN_HEAP_GB = 2
+# Memoria libera da lasciare oltre all'heap (memoria nativa della JVM, launcher)
+FREE_MEMORY_HEADROOM_GB = 1
+
+# Profili JVM disponibili: etichetta mostrata nelle impostazioni e dimensione heap desiderata
+JVM_PROFILES = {
+    "balanced": {"label": "Bilanciato", "target_heap_gb": 6},
+    "low_latency": {"label": "Bassa latenza (G1)", "target_heap_gb": 6},
+    "zgc": {"label": "ZGC", "target_heap_gb": 8},
+    "low_memory": {"label": "Poca memoria", "target_heap_gb": 3}
+}
+
+
+def get_system_memory():
+    """Ritorna (memoria totale, memoria disponibile) in byte, o (None, None) se non rilevabile"""
+    try:
+        if sys.platform == "win32":
+            class MEMORYSTATUSEX(ctypes.Structure):
+                _fields_ = [("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong),
+                            ("ullTotalPhys", ctypes.c_ulonglong), ("ullAvailPhys", ctypes.c_ulonglong),
+                            ("ullTotalPageFile", ctypes.c_ulonglong), ("ullAvailPageFile", ctypes.c_ulonglong),
+                            ("ullTotalVirtual", ctypes.c_ulonglong), ("ullAvailVirtual", ctypes.c_ulonglong),
+                            ("ullAvailExtendedVirtual", ctypes.c_ulonglong)]
+            status = MEMORYSTATUSEX()
+            status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+            ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status))
+            return status.ullTotalPhys, status.ullAvailPhys
+        if sys.platform == "darwin":
+            total = int(subprocess.run(["sysctl", "-n", "hw.memsize"], capture_output=True, text=True).stdout)
+            # macOS non espone facilmente la memoria disponibile: stima prudente
+            return total, total // 2
+        meminfo = {}
+        with open("/proc/meminfo", 'r') as f:
+            for line in f:
+                key, value = line.split(":", 1)
+                meminfo[key] = int(value.split()[0]) * 1024
+        return meminfo["MemTotal"], meminfo.get("MemAvailable", meminfo.get("MemFree"))
+    except Exception:
+        return None, None
+
+
+def get_java_major_version(java_executable):
+    """Legge la versione principale di Java dal file 'release' del runtime (senza avviare la JVM)"""
+    if not os.path.isabs(java_executable):
+        return None
+    java_home = os.path.dirname(os.path.dirname(os.path.realpath(java_executable)))
+    try:
+        with open(os.path.join(java_home, "release"), 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith("JAVA_VERSION="):
+                    version = line.split("=", 1)[1].strip().strip('"')
+                    parts = version.split(".")
+                    return int(parts[1]) if parts[0] == "1" else int(parts[0])
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def recommend_heap_gb(profile, total_bytes, available_bytes):
+    """
+    Dimensione heap consigliata: quella desiderata dal profilo, limitata in modo
+    da lasciare memoria al sistema operativo e da restare nella memoria libera
+    (con FREE_MEMORY_HEADROOM_GB di margine), così da evitare lo swap.
+    Se il risultato è sotto il minimo del modpack lo segnala free_memory_warning.
+    """
+    target = JVM_PROFILES.get(profile, JVM_PROFILES["balanced"])["target_heap_gb"]
+    if not total_bytes:
+        return min(target, MODPACK_MIN_HEAP_GB)
+    total_gb = total_bytes / GB
+    # Riserva per sistema operativo, launcher e memoria nativa della JVM
+    reserve_gb = max(2, total_gb * 0.25)
+    heap = min(target, total_gb - reserve_gb)
+    if available_bytes:
+        heap = min(heap, available_bytes / GB - FREE_MEMORY_HEADROOM_GB)
+    return int(max(MIN_HEAP_GB, min(16, heap)))
+
+
+def free_memory_warning(heap_gb, available_bytes):
+    """Avviso se l'heap è sotto il minimo del modpack o supera la memoria libera, altrimenti None"""
+    free = f"{available_bytes / GB:.1f} GB liberi" if available_bytes else "memoria libera non rilevata"
+    if heap_gb < MODPACK_MIN_HEAP_GB:
+        return (f"Memoria insufficiente per il modpack: {heap_gb} GB di heap ({free}, minimo consigliato "
+                f"{MODPACK_MIN_HEAP_GB} GB), chiudi altri programmi prima di giocare")
+    if available_bytes and available_bytes / GB - FREE_MEMORY_HEADROOM_GB < heap_gb:
+        return (f"Memoria libera insufficiente: {free} per {heap_gb} GB di heap, il sistema userà lo swap; "
+                f"chiudi altri programmi prima di giocare")
+    return None
+
+
+def build_jvm_arguments(profile, heap_gb, cpu_count=None, java_major=None):
+    """Argomenti JVM (heap e garbage collector) per il profilo scelto"""
+    cpu_count = cpu_count or os.cpu_count() or 2
+    if profile == "zgc" and (java_major is None or java_major < 15):
+        # ZGC in produzione solo da Java 15: ripiego sul profilo G1 a bassa latenza
+        profile = "low_latency"
+
+    if profile == "low_memory":
+        return [f"-Xmx{heap_gb}G", f"-Xms{min(2, heap_gb)}G", "-XX:+UseG1GC",
+                "-XX:+UseStringDeduplication", "-XX:MaxGCPauseMillis=200",
+                f"-XX:ParallelGCThreads={max(1, min(2, cpu_count - 1))}",
+                "-XX:ConcGCThreads=1"]
+
+    arguments = [f"-Xmx{heap_gb}G", f"-Xms{heap_gb}G"]
+    # Lascia almeno un core al thread di rendering e al sistema
+    parallel_threads = max(1, min(8, cpu_count - 2))
+    concurrent_threads = max(1, parallel_threads // 4)
+    if profile == "zgc":
+        arguments += ["-XX:+UseZGC", f"-XX:ConcGCThreads={concurrent_threads}"]
+    elif profile == "low_latency":
+        arguments += ["-XX:+UseG1GC", "-XX:+ParallelRefProcEnabled", "-XX:MaxGCPauseMillis=50",
+                      "-XX:+UnlockExperimentalVMOptions", "-XX:G1NewSizePercent=30",
+                      "-XX:G1MaxNewSizePercent=40", "-XX:G1HeapRegionSize=8M",
+                      "-XX:G1ReservePercent=20", "-XX:InitiatingHeapOccupancyPercent=15",
+                      f"-XX:ParallelGCThreads={parallel_threads}", f"-XX:ConcGCThreads={concurrent_threads}"]
+    else:
+        arguments += ["-XX:+UseG1GC", "-XX:MaxGCPauseMillis=200",
+                      f"-XX:ParallelGCThreads={parallel_threads}", f"-XX:ConcGCThreads={concurrent_threads}"]
+    return arguments
+
+
+class ClassDataSharing:
+    """
+    Gestisce un archivio CDS (Class Data Sharing) dinamico della JVM.
+
+    Al primo avvio ("training") la JVM registra le classi caricate con
+    -XX:ArchiveClassesAtExit; negli avvii successivi l'archivio viene riusato
+    con -XX:SharedArchiveFile. L'archivio è legato a un'impronta di mod,
+    versione di Forge e runtime Java: se una di queste cambia viene rigenerato.
+    """
+
+    MAX_TRAINING_ATTEMPTS = 2
+    MAX_BOOT_SAMPLES = 10
+
+    def __init__(self, launcher_directory):
+        self.cds_directory = os.path.join(launcher_directory, "cds")
+        self.archive_path = os.path.join(self.cds_directory, "forge.jsa")
+        self.state_file = os.path.join(self.cds_directory, "cds.json")
+        os.makedirs(self.cds_directory, exist_ok=True)
+        self.store = open_store(self.state_file, default=lambda: {
+            "fingerprint": None, "status": "none", "attempts": 0, "boot_times": {"cds": [], "no_cds": []}
+        })
+        self.state = self.load_state()
+        self.session_mode = None
+
+    def load_state(self):
+        return self.store.load()
+
+    def save_state(self):
+        self.store.save(self.state)
+
+    @staticmethod
+    def java_identity(java_executable):
+        """Identifica il runtime Java tramite percorso, stat dell'eseguibile e file 'release'"""
+        identity = [os.path.realpath(java_executable)] if os.path.isabs(java_executable) else [java_executable]
+        if os.path.isabs(java_executable):
+            java_home = os.path.dirname(os.path.dirname(os.path.realpath(java_executable)))
+            for path in (java_executable, os.path.join(java_home, "release")):
+                try:
+                    st = os.stat(path)
+                    identity.append(f"{st.st_size}:{st.st_mtime_ns}")
+                except OSError:
+                    pass
+        return identity
+
+    def fingerprint(self, mods_folder, forge_version, java_executable):
+        """Impronta di mod installate, versione di Forge e runtime Java"""
+        mods = []
+        if os.path.isdir(mods_folder):
+            for entry in sorted(os.scandir(mods_folder), key=lambda e: e.name):
+                if entry.is_file() and entry.name.endswith(".jar"):
+                    st = entry.stat()
+                    mods.append(f"{entry.name}:{st.st_size}:{st.st_mtime_ns}")
+        data = json.dumps({"mods": mods, "forge": forge_version, "java": self.java_identity(java_executable)})
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def jvm_arguments(self, mods_folder, forge_version, java_executable):
+        """Argomenti JVM per questo avvio: riuso dell'archivio o sessione di training"""
+        fingerprint = self.fingerprint(mods_folder, forge_version, java_executable)
+        if self.state.get("fingerprint") != fingerprint:
+            # Mod, Forge o Java cambiati: l'archivio esistente non è più valido
+            if os.path.exists(self.archive_path):
+                os.remove(self.archive_path)
+            self.state.update({"fingerprint": fingerprint, "status": "none", "attempts": 0})
+            self.save_state()
+
+        if self.state["status"] == "ready" and os.path.exists(self.archive_path):
+            self.session_mode = "cds"
+            return [f"-XX:SharedArchiveFile={self.archive_path}", "-Xshare:auto"]
+        if self.state["attempts"] < self.MAX_TRAINING_ATTEMPTS:
+            self.session_mode = "training"
+            self.state["status"] = "training"
+            self.state["attempts"] += 1
+            self.save_state()
+            return [f"-XX:ArchiveClassesAtExit={self.archive_path}"]
+        self.session_mode = "no_cds"
+        return []
+
+    def finish_session(self):
+        """Da chiamare alla chiusura del gioco: conferma l'archivio registrato durante il training"""
+        mode, self.session_mode = self.session_mode, None
+        if mode == "training":
+            if os.path.exists(self.archive_path) and os.path.getsize(self.archive_path) > 0:
+                self.state["status"] = "ready"
+                self.state["created_at"] = datetime.now().isoformat()
+            else:
+                self.state["status"] = "none"
+            self.save_state()
+        return self.state["status"]
+
+    def record_boot_time(self, seconds):
+        """Registra il tempo di avvio della sessione corrente, separando avvii con e senza archivio"""
+        if self.session_mode not in ("cds", "no_cds", "training"):
+            return
+        key = "cds" if self.session_mode == "cds" else "no_cds"
+        samples = self.state.setdefault("boot_times", {"cds": [], "no_cds": []}).setdefault(key, [])
+        samples.append(round(seconds, 1))
+        del samples[:-self.MAX_BOOT_SAMPLES]
+        self.save_state()
+
+    def boot_time_summary(self):
+        """Ritorna la media dei tempi di avvio con e senza archivio"""
+        summary = {}
+        for key, samples in self.state.get("boot_times", {}).items():
+            if samples:
+                summary[key] = round(sum(samples) / len(samples), 1)
+        return summary
@@ -0,0 +1,128 @@
+import os
+import json
+
+import minecraft_launcher_lib
+
+from state_store import open_store
+
+
+# Segnaposto sostituiti ad ogni avvio con i valori reali
+USERNAME_PLACEHOLDER = "${cigno_username}"
+UUID_PLACEHOLDER = "${cigno_uuid}"
+TOKEN_PLACEHOLDER = "${cigno_token}"
+JVM_ARGUMENTS_PLACEHOLDER = "${cigno_jvm_arguments}"
+
+
+class LaunchCommandCache:
+    """
+    Cache del comando di avvio di Minecraft.
+
+    Il comando viene generato una sola volta con dei segnaposto al posto dei campi
+    che cambiano ad ogni avvio (account, argomenti JVM) e salvato in launch_cache.json
+    insieme alle statistiche (dimensione e mtime) dei file da cui dipende.
+    Finché nessuno di questi file cambia il comando viene riutilizzato.
+    """
+
+    def __init__(self, launcher_directory, minecraft_directory):
+        self.minecraft_directory = minecraft_directory
+        self.cache_file = os.path.join(launcher_directory, "launch_cache.json")
+        self.store = open_store(self.cache_file)
+        self.cache = self.load_cache()
+
+    def load_cache(self):
+        return self.store.load()
+
+    def save_cache(self):
+        self.store.save(self.cache)
+
+    def invalidate(self):
+        self.cache = {}
+        self.store.delete()
+
+    @staticmethod
+    def file_stat(path):
+        try:
+            st = os.stat(path)
+            return [st.st_size, st.st_mtime_ns]
+        except OSError:
+            return None
+
+    def version_json_chain(self, version_id):
+        """Percorsi dei JSON di versione seguendo inheritsFrom"""
+        paths = []
+        while version_id:
+            path = os.path.join(self.minecraft_directory, "versions", version_id, f"{version_id}.json")
+            paths.append(path)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    version_id = json.load(f).get("inheritsFrom")
+            except (OSError, ValueError):
+                break
+        return paths
+
+    def dependencies(self, version_id, command):
+        """File da cui dipende il comando: JSON di versione, classpath ed eseguibile Java"""
+        paths = self.version_json_chain(version_id)
+        if "-cp" in command:
+            classpath = command[command.index("-cp") + 1]
+            paths.extend(p for p in classpath.split(os.pathsep) if p)
+        if command and os.path.isabs(command[0]):
+            paths.append(command[0])
+        return {path: self.file_stat(path) for path in paths}
+
+    @staticmethod
+    def template_key(version_id, static_options):
+        return json.dumps({"version": version_id, "options": static_options}, sort_keys=True)
+
+    def is_valid(self, version_id, static_options):
+        """Rivalidazione economica: confronta solo le statistiche dei file"""
+        if self.cache.get("key") != self.template_key(version_id, static_options):
+            return False
+        for path, stat in self.cache.get("stats", {}).items():
+            if self.file_stat(path) != stat:
+                return False
+        return True
+
+    def build_template(self, version_id, static_options):
+        options = dict(static_options)
+        options.update({
+            "username": USERNAME_PLACEHOLDER,
+            "uuid": UUID_PLACEHOLDER,
+            "token": TOKEN_PLACEHOLDER,
+            "jvmArguments": [JVM_ARGUMENTS_PLACEHOLDER]
+        })
+        command = minecraft_launcher_lib.command.get_minecraft_command(version_id, self.minecraft_directory, options)
+        self.cache = {
+            "key": self.template_key(version_id, static_options),
+            "command": command,
+            "stats": self.dependencies(version_id, command)
+        }
+        self.save_cache()
+        return command
+
+    def get_template(self, version_id, static_options):
+        """
+        Ritorna (template, from_cache). static_options contiene solo le opzioni che non
+        cambiano tra un avvio e l'altro (launcherName, gameDirectory, ...).
+        """
+        if self.is_valid(version_id, static_options):
+            return self.cache["command"], True
+        return self.build_template(version_id, static_options), False
+
+    @staticmethod
+    def fill_template(template, username, uuid, token, jvm_arguments):
+        """Sostituisce i segnaposto del template con i valori del singolo avvio"""
+        command = []
+        for arg in template:
+            if arg == JVM_ARGUMENTS_PLACEHOLDER:
+                command.extend(jvm_arguments)
+                continue
+            command.append(arg.replace(USERNAME_PLACEHOLDER, username)
+                              .replace(UUID_PLACEHOLDER, uuid)
+                              .replace(TOKEN_PLACEHOLDER, token))
+        return command
+
+    def get_command(self, version_id, static_options, username, uuid, token, jvm_arguments):
+        """Ritorna (comando, from_cache) con i campi del singolo avvio già sostituiti"""
+        template, from_cache = self.get_template(version_id, static_options)
+        return self.fill_template(template, username, uuid, token, jvm_arguments), from_cache
@@ -0,0 +1,370 @@
+import re
+import time
+from array import array
+from bisect import bisect_right, bisect_left
+
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, QCheckBox, QComboBox, QLabel, QListView
+from PyQt6.QtGui import QColor, QFont
+from PyQt6.QtCore import Qt, QAbstractListModel, QModelIndex, QTimer
+
+
+# Livelli dei record: il bit GAME_FLAG indica che la riga proviene dal gioco
+DEBUG, INFO, SUCCESS, WARN, ERROR = range(5)
+LEVEL_NAMES = ["DEBUG", "INFO", "SUCCESS", "WARN", "ERROR"]
+LEVEL_CODES = {"DEBUG": DEBUG, "TRACE": DEBUG, "INFO": INFO, "SUCCESS": SUCCESS,
+               "WARN": WARN, "WARNING": WARN, "ERROR": ERROR, "FATAL": ERROR}
+GAME_FLAG = 0x10
+
+LAUNCHER_COLORS = {DEBUG: "#b0b0b0", INFO: "#4fc3f7", SUCCESS: "#66bb6a", WARN: "#ffee58", ERROR: "#ef5350"}
+GAME_COLORS = {DEBUG: "#b0b0b0", INFO: "#ffa726", SUCCESS: "#ffa726", WARN: "#ffee58", ERROR: "#ef5350"}
+
+# Livello nel formato di log di Forge/log4j: "[12:00:00] [Render thread/WARN] [...]"
+GAME_LEVEL_PATTERN = re.compile(r"/(TRACE|DEBUG|INFO|WARN|ERROR|FATAL)\]")
+
+
+def parse_game_level(line):
+    """Ricava il livello di una riga di log del gioco"""
+    match = GAME_LEVEL_PATTERN.search(line, 0, 120)
+    return (LEVEL_CODES[match.group(1)] if match else INFO) | GAME_FLAG
+
+
+class _Chunk:
+    """Blocco di record: testo UTF-8 contiguo (righe separate da \\n) e array compatti"""
+    __slots__ = ("text", "offsets", "timestamps", "levels")
+
+    def __init__(self):
+        self.text = bytearray()
+        self.offsets = array('I')
+        self.timestamps = array('d')
+        self.levels = array('b')
+
+
+class LogBuffer:
+    """
+    Buffer circolare compatto di record di log (timestamp, livello, offset nel testo).
+
+    I record sono divisi in blocchi di CHUNK_SIZE; quando si supera la capacità
+    viene scartato il blocco più vecchio. Ogni record ha un numero di sequenza
+    crescente che resta valido finché il record è nel buffer.
+    """
+
+    CHUNK_SIZE = 4096
+
+    def __init__(self, capacity=1_000_000):
+        self.capacity = max(capacity, self.CHUNK_SIZE * 2)
+        self.chunks = []
+        self.first_seq = 0
+        self.next_seq = 0
+
+    def __len__(self):
+        return self.next_seq - self.first_seq
+
+    def eviction_needed(self, incoming):
+        """Numero di record da scartare (a blocchi interi) per fare spazio a 'incoming' record"""
+        excess = len(self) + incoming - self.capacity
+        if excess <= 0:
+            return 0
+        chunks = -(-excess // self.CHUNK_SIZE)
+        return min(chunks * self.CHUNK_SIZE, (len(self.chunks) - 1) * self.CHUNK_SIZE) if len(self.chunks) > 1 else 0
+
+    def drop_front(self, count):
+        """Scarta i primi 'count' record (multiplo di CHUNK_SIZE)"""
+        chunks = count // self.CHUNK_SIZE
+        del self.chunks[:chunks]
+        self.first_seq += chunks * self.CHUNK_SIZE
+
+    def append(self, timestamp, level, text):
+        if not self.chunks or len(self.chunks[-1].offsets) >= self.CHUNK_SIZE:
+            self.chunks.append(_Chunk())
+        chunk = self.chunks[-1]
+        chunk.offsets.append(len(chunk.text))
+        chunk.text += text.encode('utf-8', 'replace') + b"\n"
+        chunk.timestamps.append(timestamp)
+        chunk.levels.append(level)
+        self.next_seq += 1
+        return self.next_seq - 1
+
+    def locate(self, seq):
+        chunk = self.chunks[seq // self.CHUNK_SIZE - self.first_seq // self.CHUNK_SIZE]
+        return chunk, seq % self.CHUNK_SIZE
+
+    def record(self, seq):
+        """Ritorna (timestamp, livello, testo) del record"""
+        chunk, i = self.locate(seq)
+        start = chunk.offsets[i]
+        end = chunk.offsets[i + 1] - 1 if i + 1 < len(chunk.offsets) else len(chunk.text) - 1
+        return chunk.timestamps[i], chunk.levels[i], chunk.text[start:end].decode('utf-8', 'replace')
+
+    def search(self, pattern=None, is_regex=False, min_level=DEBUG, start_seq=None):
+        """
+        Ritorna i numeri di sequenza dei record che contengono pattern (sottostringa
+        senza distinzione maiuscole/minuscole o regex) con livello >= min_level.
+        La ricerca lavora direttamente sui byte dei blocchi, senza decodificare le righe.
+        """
+        start_seq = self.first_seq if start_seq is None else max(start_seq, self.first_seq)
+        matcher = self.compile(pattern, is_regex)
+        result = array('q')
+        for chunk_index, chunk in enumerate(self.chunks):
+            base = (self.first_seq // self.CHUNK_SIZE + chunk_index) * self.CHUNK_SIZE
+            if base + len(chunk.offsets) <= start_seq:
+                continue
+            first = max(0, start_seq - base)
+            candidates = range(first, len(chunk.offsets)) if matcher is None else self.matching_records(chunk, matcher, first)
+            levels = chunk.levels
+            for i in candidates:
+                if (levels[i] & ~GAME_FLAG) >= min_level:
+                    result.append(base + i)
+        return result
+
+    @staticmethod
+    def compile(pattern, is_regex):
+        if not pattern:
+            return None
+        if is_regex:
+            # I blocchi contengono molte righe: ^ e $ devono valere per ogni riga
+            return re.compile(pattern.encode('utf-8'), re.IGNORECASE | re.MULTILINE)
+        return pattern.lower().encode('utf-8')
+
+    @staticmethod
+    def matching_records(chunk, matcher, first):
+        """Indici dei record del blocco che contengono una corrispondenza"""
+        offsets = chunk.offsets
+        position = offsets[first] if first < len(offsets) else len(chunk.text)
+        found = []
+        if isinstance(matcher, bytes):
+            text = bytes(chunk.text).lower()
+            while True:
+                position = text.find(matcher, position)
+                if position < 0:
+                    break
+                i = bisect_right(offsets, position) - 1
+                found.append(i)
+                # Passa alla riga successiva: basta una corrispondenza per record
+                position = offsets[i + 1] if i + 1 < len(offsets) else len(text)
+        else:
+            text = chunk.text
+            while position < len(text):
+                match = matcher.search(text, position)
+                if match is None:
+                    break
+                i = bisect_right(offsets, match.start()) - 1
+                end = offsets[i + 1] - 1 if i + 1 < len(offsets) else len(text) - 1
+                # Una corrispondenza che supera il \n finale unisce due record: si ricerca nella sola riga
+                if match.end() <= end or matcher.search(text, offsets[i], end):
+                    found.append(i)
+                position = end + 1
+        return found
+
+
+class LogListModel(QAbstractListModel):
+    """Modello Qt sopra LogBuffer: le righe vengono formattate solo quando la vista le mostra"""
+
+    def __init__(self, capacity=1_000_000, parent=None):
+        super().__init__(parent)
+        self.buffer = LogBuffer(capacity)
+        self.filtered = None
+        self.filter_args = (None, False, DEBUG)
+        self.colors = {}
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.filtered) if self.filtered is not None else len(self.buffer)
+
+    def seq_for_row(self, row):
+        return self.filtered[row] if self.filtered is not None else self.buffer.first_seq + row
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self.format_record(self.seq_for_row(index.row()))
+        if role == Qt.ItemDataRole.ForegroundRole:
+            chunk, i = self.buffer.locate(self.seq_for_row(index.row()))
+            return self.color(chunk.levels[i])
+        return None
+
+    def format_record(self, seq):
+        timestamp, level, text = self.buffer.record(seq)
+        name = "GAME" if level & GAME_FLAG else LEVEL_NAMES[level]
+        return f"[{time.strftime('%H:%M:%S', time.localtime(timestamp))}] [{name}] {text}"
+
+    def color(self, level):
+        if level not in self.colors:
+            palette = GAME_COLORS if level & GAME_FLAG else LAUNCHER_COLORS
+            self.colors[level] = QColor(palette[level & ~GAME_FLAG])
+        return self.colors[level]
+
+    def append_records(self, records):
+        """Aggiunge una lista di (timestamp, livello, testo) con un solo inserimento nel modello"""
+        if not records:
+            return
+        evict = self.buffer.eviction_needed(len(records))
+        if evict:
+            new_first = self.buffer.first_seq + evict
+            removed = bisect_left(self.filtered, new_first) if self.filtered is not None else evict
+            if removed:
+                self.beginRemoveRows(QModelIndex(), 0, removed - 1)
+            self.buffer.drop_front(evict)
+            if self.filtered is not None:
+                del self.filtered[:removed]
+            if removed:
+                self.endRemoveRows()
+
+        first_new = self.buffer.next_seq
+        for timestamp, level, text in records:
+            self.buffer.append(timestamp, level, text)
+
+        if self.filtered is None:
+            rows = len(records)
+            new_seqs = None
+        else:
+            new_seqs = self.buffer.search(*self.filter_args, start_seq=first_new)
+            rows = len(new_seqs)
+        if not rows:
+            return
+        start = self.rowCount() if new_seqs is None else len(self.filtered)
+        if new_seqs is None:
+            start -= rows
+        self.beginInsertRows(QModelIndex(), start, start + rows - 1)
+        if new_seqs is not None:
+            self.filtered.extend(new_seqs)
+        self.endInsertRows()
+
+    def set_filter(self, pattern=None, is_regex=False, min_level=DEBUG):
+        """Applica ricerca e filtro per livello tramite l'indice dei record"""
+        self.beginResetModel()
+        self.filter_args = (pattern or None, is_regex, min_level)
+        if pattern or min_level > DEBUG:
+            self.filtered = self.buffer.search(*self.filter_args)
+        else:
+            self.filtered = None
+        self.endResetModel()
+
+
+class LogViewer(QWidget):
+    """Console del launcher: vista virtualizzata con filtro per livello e ricerca"""
+
+    def __init__(self, capacity=1_000_000, parent=None):
+        super().__init__(parent)
+        self.model = LogListModel(capacity, self)
+
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("Cerca nel log...")
+        self.regex_checkbox = QCheckBox("Regex")
+        self.level_combo = QComboBox()
+        self.level_combo.addItem("Tutti i livelli", DEBUG)
+        self.level_combo.addItem("Info e superiori", INFO)
+        self.level_combo.addItem("Avvisi ed errori", WARN)
+        self.level_combo.addItem("Solo errori", ERROR)
+        self.result_label = QLabel("")
+        self.result_label.setObjectName("StatusLabel")
+
+        self.view = QListView()
+        self.view.setObjectName("LogView")
+        self.view.setModel(self.model)
+        # Righe di altezza uniforme e layout a lotti: la vista non misura ogni riga
+        # e aggiunge al layout solo quelle nuove, anche con milioni di record
+        self.view.setUniformItemSizes(True)
+        self.view.setLayoutMode(QListView.LayoutMode.Batched)
+        self.view.setBatchSize(1000)
+        self.view.setSelectionMode(QListView.SelectionMode.ExtendedSelection)
+
+        # Ritardo sulla ricerca per non rifiltrare ad ogni tasto premuto
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(250)
+        self.filter_timer.timeout.connect(self.apply_filter)
+        self.search_edit.textChanged.connect(self.filter_timer.start)
+        self.regex_checkbox.toggled.connect(self.apply_filter)
+        self.level_combo.currentIndexChanged.connect(self.apply_filter)
+
+        # Modalità "coda": la vista viene staccata dal modello e si mostrano solo le ultime righe
+        self.tail_mode = False
+        self.tail_lines = 12
+        self.tail_label = QLabel()
+        self.tail_label.setObjectName("LogTail")
+        self.tail_label.setTextFormat(Qt.TextFormat.PlainText)
+        self.tail_label.setAlignment(Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignTop)
+        self.tail_label.setFont(QFont("Consolas", 9))
+        self.tail_label.hide()
+        self.tail_seq = None
+        self.tail_timer = QTimer(self)
+        self.tail_timer.setInterval(1000)
+        self.tail_timer.timeout.connect(self.update_tail)
+
+        toolbar = QHBoxLayout()
+        toolbar.setContentsMargins(0, 0, 0, 0)
+        toolbar.addWidget(self.search_edit, 1)
+        toolbar.addWidget(self.regex_checkbox)
+        toolbar.addWidget(self.level_combo)
+        toolbar.addWidget(self.result_label)
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addLayout(toolbar)
+        layout.addWidget(self.view)
+        layout.addWidget(self.tail_label, 1)
+
+    def append_records(self, records):
+        if self.tail_mode:
+            # Nessuna vista collegata: i record finiscono solo nel buffer
+            self.model.append_records(records)
+            return
+        scrollbar = self.view.verticalScrollBar()
+        at_bottom = scrollbar.value() >= scrollbar.maximum() - 2
+        self.model.append_records(records)
+        if at_bottom:
+            self.view.scrollToBottom()
+        if self.model.filtered is not None:
+            self.update_result_label()
+
+    def apply_filter(self):
+        pattern = self.search_edit.text()
+        is_regex = self.regex_checkbox.isChecked()
+        if is_regex and pattern:
+            # Stessa compilazione della ricerca, che lavora sui byte (ad esempio \u00e8 non è valido)
+            try:
+                LogBuffer.compile(pattern, is_regex)
+            except re.error as e:
+                self.result_label.setText(f"Regex non valida: {e.msg}")
+                return
+        self.model.set_filter(pattern, is_regex, self.level_combo.currentData())
+        self.update_result_label()
+        self.view.scrollToBottom()
+
+    def update_result_label(self):
+        if self.model.filtered is None:
+            self.result_label.setText("")
+        else:
+            self.result_label.setText(f"{len(self.model.filtered)} risultati")
+
+    def set_tail_mode(self, enabled):
+        """Attiva/disattiva la modalità a basso consumo che mostra solo le ultime righe, aggiornate ogni secondo"""
+        if enabled == self.tail_mode:
+            return
+        self.tail_mode = enabled
+        for widget in (self.search_edit, self.regex_checkbox, self.level_combo):
+            widget.setEnabled(not enabled)
+        if enabled:
+            self.view.setModel(None)
+            self.view.hide()
+            self.tail_seq = None
+            self.update_tail()
+            self.tail_label.show()
+            self.tail_timer.start()
+        else:
+            self.tail_timer.stop()
+            self.tail_label.hide()
+            self.tail_label.clear()
+            self.view.setModel(self.model)
+            self.view.show()
+            self.view.scrollToBottom()
+
+    def update_tail(self):
+        buffer = self.model.buffer
+        if buffer.next_seq == self.tail_seq:
+            return
+        self.tail_seq = buffer.next_seq
+        first = max(buffer.first_seq, buffer.next_seq - self.tail_lines)
+        self.tail_label.setText("\n".join(self.model.format_record(seq) for seq in range(first, buffer.next_seq)))
@@ -12,7 +12,6 @@ from PyQt6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QLa
                              QSpacerItem, QSizePolicy)
 from PyQt6.QtGui import QIcon, QFont, QPixmap
 from PyQt6.QtCore import Qt, QObject, pyqtSignal, QThread
-from utils import ImageDownloader
 
 def resource_path(relative_path):
     try:
@@ -241,38 +240,10 @@ class LoginDialog(QDialog):
                 head_label.setPixmap(pixmap.scaled(32, 32, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation))
     
     def load_head_image_for_dialog(self, uuid):
-        # Usa la cartella heads definita nel launcher principale (parent)
-        heads_folder = self.parent().heads_folder
-        cached_path = os.path.join(heads_folder, f"{uuid}.png")
-        
+        # Usa il servizio immagini condiviso del launcher principale (parent)
         target_label = self.head_labels.get(uuid)
         if not target_label: return
-
-        if os.path.exists(cached_path):
-            pixmap = QPixmap(cached_path)
-            target_label.setPixmap(pixmap.scaled(32, 32, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation))
-            return
-        
-        # Imposta placeholder
-        pixmap = QPixmap(resource_path("assets/steve_head.png"))
-        target_label.setPixmap(pixmap.scaled(32, 32, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation))
-
-        self.downloader_thread = QThread()
-        self.image_worker = ImageDownloader(uuid, heads_folder)
-        self.image_worker.moveToThread(self.downloader_thread)
-        
-        self.image_worker.image_ready.connect(self.on_image_loaded_for_dialog)
-        self.downloader_thread.started.connect(self.image_worker.run)
-        self.image_worker.finished.connect(self.downloader_thread.quit)
-        self.image_worker.finished.connect(self.image_worker.deleteLater)
-        self.downloader_thread.finished.connect(self.downloader_thread.deleteLater)
-        
-        self.downloader_thread.start()
-
-    def on_image_loaded_for_dialog(self, uuid, pixmap):
-        target_label = self.head_labels.get(uuid)
-        if target_label and not pixmap.isNull():
-             target_label.setPixmap(pixmap.scaled(32, 32, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation))
+        self.parent().image_service.load_into(target_label, uuid, 32, placeholder=resource_path("assets/steve_head.png"))
 
     def setup_microsoft_tab(self):
         layout = QVBoxLayout(self.microsoft_tab)
@@ -0,0 +1,316 @@
+import os
+import json
+import hashlib
+import shutil
+
+from state_store import open_store
+
+
+# Categorie in cui i file possono essere modificati dall'utente dopo l'installazione
+PROTECTED_CATEGORIES = {"config", "root"}
+
+# Chiavi del manifest che non sono categorie di file
+MANIFEST_METADATA_KEYS = {"version", "minecraft_version", "forge_version", "modpack_name", "last_updated", "sources"}
+
+
+def format_size(num_bytes):
+    """Formatta una dimensione in byte in modo leggibile"""
+    size = float(num_bytes)
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024 or unit == "GB":
+            return f"{size:.1f} {unit}" if unit != "B" else f"{int(size)} B"
+        size /= 1024
+
+
+class OrphanCollector:
+    """
+    Garbage collection dei file del modpack non più presenti nel manifest.
+
+    Tiene traccia in owned_files.json di tutti i file scritti dal launcher: solo
+    questi possono essere rimossi, i file creati dall'utente non vengono mai toccati.
+    """
+
+    def __init__(self, launcher_directory, get_target_folder, log=None):
+        self.launcher_directory = launcher_directory
+        self.get_target_folder = get_target_folder
+        self.owned_file = os.path.join(launcher_directory, "owned_files.json")
+        self.store = open_store(self.owned_file, default=lambda: {"files": {}})
+        self.log = log or (lambda message, level="INFO": None)
+        self.owned = self.load_owned()
+
+    def load_owned(self):
+        """Carica il registro dei file posseduti dal launcher"""
+        return self.store.load()
+
+    def save_owned(self):
+        """Salva il registro dei file posseduti dal launcher"""
+        self.store.save(self.owned)
+
+    def has_record(self):
+        """Ritorna True se esiste già un registro dei file posseduti"""
+        return bool(self.owned.get("files"))
+
+    @staticmethod
+    def make_key(category, path):
+        return f"{category}/{path}"
+
+    @staticmethod
+    def split_key(key):
+        category, _, path = key.partition("/")
+        return category, path
+
+    def iter_manifest_files(self, manifest):
+        for category, files in manifest.items():
+            if category in MANIFEST_METADATA_KEYS or not isinstance(files, list):
+                continue
+            for file_info in files:
+                yield category, file_info
+
+    def record_applied(self, manifest):
+        """Registra come posseduti tutti i file del manifest applicato"""
+        files = self.owned.setdefault("files", {})
+        for category, file_info in self.iter_manifest_files(manifest):
+            path = file_info.get("path", file_info["name"])
+            files[self.make_key(category, path)] = {
+                "sha256": file_info.get("sha256", ""),
+                "size": file_info.get("size", 0)
+            }
+        self.save_owned()
+
+    def file_path(self, category, path):
+        return os.path.normpath(os.path.join(self.get_target_folder(category), path))
+
+    def collect(self, manifest, dry_run=False):
+        """
+        Rimuove i file posseduti dal launcher che non compaiono più nel manifest.
+        Ritorna un report con file rimossi, byte recuperati e file preservati.
+        """
+        wanted = {self.make_key(category, file_info.get("path", file_info["name"]))
+                  for category, file_info in self.iter_manifest_files(manifest)}
+
+        report = {"removed": [], "kept": [], "files": 0, "bytes": 0, "dry_run": dry_run}
+        files = self.owned.get("files", {})
+
+        for key in sorted(set(files) - wanted):
+            category, path = self.split_key(key)
+            file_path = self.file_path(category, path)
+            if not os.path.isfile(file_path):
+                if not dry_run:
+                    del files[key]
+                continue
+
+            # I file modificabili dall'utente si eliminano solo se sono ancora identici
+            if category in PROTECTED_CATEGORIES:
+                expected_hash = files[key].get("sha256")
+                if not expected_hash or self.calculate_sha256(file_path) != expected_hash:
+                    report["kept"].append(key)
+                    if not dry_run:
+                        del files[key]
+                    continue
+
+            size = os.path.getsize(file_path)
+            if not dry_run:
+                try:
+                    os.remove(file_path)
+                except OSError as e:
+                    self.log(f"Errore rimozione {key}: {e}", "ERROR")
+                    continue
+                del files[key]
+                self.remove_empty_dirs(os.path.dirname(file_path), self.get_target_folder(category))
+            report["removed"].append(key)
+            report["files"] += 1
+            report["bytes"] += size
+
+        if not dry_run:
+            self.save_owned()
+        return report
+
+    def remove_empty_dirs(self, folder, stop_at):
+        """Rimuove le cartelle rimaste vuote (es. sottocartelle di config rinominate)"""
+        stop_at = os.path.normpath(stop_at)
+        folder = os.path.normpath(folder)
+        while folder != stop_at and folder.startswith(stop_at + os.sep):
+            try:
+                os.rmdir(folder)
+            except OSError:
+                return
+            folder = os.path.dirname(folder)
+
+    def calculate_sha256(self, file_path):
+        sha256_hash = hashlib.sha256()
+        try:
+            with open(file_path, "rb") as f:
+                for byte_block in iter(lambda: f.read(65536), b""): sha256_hash.update(byte_block)
+            return sha256_hash.hexdigest()
+        except IOError: return ""
+
+
+class VersionCollector:
+    """
+    Garbage collection delle versioni installate in minecraft_directory.
+
+    Parte dalle versioni ancora in uso, segue la catena inheritsFrom dei JSON di
+    versione e rimuove librerie, natives e cartelle di versione non più raggiungibili.
+    """
+
+    # Argomenti FML che indicano le librerie generate dai processori di Forge
+    FML_ARGUMENTS = ("--fml.mcVersion", "--fml.mcpVersion", "--fml.forgeVersion")
+
+    def __init__(self, minecraft_directory, log=None):
+        self.minecraft_directory = minecraft_directory
+        self.versions_dir = os.path.join(minecraft_directory, "versions")
+        self.libraries_dir = os.path.join(minecraft_directory, "libraries")
+        self.log = log or (lambda message, level="INFO": None)
+
+    def load_version_json(self, version_id):
+        json_path = os.path.join(self.versions_dir, version_id, f"{version_id}.json")
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def reachable_versions(self, roots):
+        """Ritorna l'insieme delle versioni raggiungibili dalle radici tramite inheritsFrom"""
+        reachable = set()
+        pending = [root for root in roots if root]
+        while pending:
+            version_id = pending.pop()
+            if version_id in reachable:
+                continue
+            reachable.add(version_id)
+            data = self.load_version_json(version_id)
+            if data and data.get("inheritsFrom"):
+                pending.append(data["inheritsFrom"])
+        return reachable
+
+    @staticmethod
+    def library_path(name):
+        """Converte un nome Maven (group:artifact:version[:classifier][@ext]) in un percorso relativo"""
+        if "@" in name:
+            name, suffix = name.split("@", 1)
+        else:
+            suffix = "jar"
+        parts = name.split(":")
+        if len(parts) < 3:
+            return None
+        group, artifact, version = parts[0:3]
+        classifiers = "".join(f"-{p}" for p in parts[3:])
+        return os.path.join(*group.split("."), artifact, version, f"{artifact}-{version}{classifiers}.{suffix}")
+
+    def referenced_libraries(self, version_ids):
+        """
+        Ritorna i percorsi relativi (file) e i prefissi (cartelle) delle librerie
+        usate dalle versioni indicate.
+        """
+        files, prefixes = set(), set()
+        for version_id in version_ids:
+            data = self.load_version_json(version_id)
+            if not data:
+                continue
+            for lib in data.get("libraries", []):
+                downloads = lib.get("downloads", {})
+                artifact = downloads.get("artifact")
+                if artifact and artifact.get("path"):
+                    files.add(os.path.normpath(artifact["path"]))
+                for classifier in downloads.get("classifiers", {}).values():
+                    if classifier.get("path"):
+                        files.add(os.path.normpath(classifier["path"]))
+                if "name" in lib:
+                    path = self.library_path(lib["name"])
+                    if path:
+                        files.add(path)
+                        # Le natives vecchio stile sono salvate accanto al jar con un classificatore
+                        prefixes.add(os.path.dirname(path))
+            prefixes.update(self.forge_generated_prefixes(data))
+        return files, prefixes
+
+    def forge_generated_prefixes(self, data):
+        """Cartelle delle librerie generate dai processori di Forge (client patchato, srg, extra)"""
+        game_args = data.get("arguments", {}).get("game", [])
+        values = {}
+        for i, arg in enumerate(game_args):
+            if isinstance(arg, str) and arg in self.FML_ARGUMENTS and i + 1 < len(game_args):
+                values[arg] = game_args[i + 1]
+        mc_version = values.get("--fml.mcVersion")
+        mcp_version = values.get("--fml.mcpVersion")
+        forge_version = values.get("--fml.forgeVersion")
+        prefixes = set()
+        if mc_version and mcp_version:
+            prefixes.add(os.path.join("net", "minecraft", "client", f"{mc_version}-{mcp_version}"))
+            prefixes.add(os.path.join("de", "oceanlabs", "mcp", "mcp_config", f"{mc_version}-{mcp_version}"))
+        if mc_version and forge_version:
+            prefixes.add(os.path.join("net", "minecraftforge", "forge", f"{mc_version}-{forge_version}"))
+        return prefixes
+
+    def folder_size(self, folder):
+        total = 0
+        for root, _, filenames in os.walk(folder):
+            for filename in filenames:
+                try:
+                    total += os.path.getsize(os.path.join(root, filename))
+                except OSError:
+                    pass
+        return total
+
+    def collect(self, roots, dry_run=True):
+        """
+        Calcola (e, se dry_run è False, rimuove) versioni e librerie non raggiungibili.
+        Ritorna un report con l'elenco degli elementi e lo spazio recuperabile.
+        """
+        reachable = self.reachable_versions(roots)
+        report = {"reachable": sorted(reachable), "versions": [], "libraries": [],
+                  "files": 0, "bytes": 0, "dry_run": dry_run}
+
+        # Senza JSON leggibili per le radici non è possibile stabilire cosa sia in uso
+        if not any(self.load_version_json(v) for v in reachable):
+            self.log("Nessuna versione in uso trovata, pulizia annullata.", "ERROR")
+            return report
+
+        if os.path.isdir(self.versions_dir):
+            for version_id in sorted(os.listdir(self.versions_dir)):
+                version_path = os.path.join(self.versions_dir, version_id)
+                if version_id in reachable or not os.path.isdir(version_path):
+                    continue
+                size = self.folder_size(version_path)
+                report["versions"].append({"id": version_id, "bytes": size})
+                report["bytes"] += size
+                if not dry_run:
+                    shutil.rmtree(version_path, ignore_errors=True)
+
+        referenced_files, referenced_prefixes = self.referenced_libraries(reachable)
+        if os.path.isdir(self.libraries_dir):
+            for root, _, filenames in os.walk(self.libraries_dir):
+                rel_root = os.path.relpath(root, self.libraries_dir)
+                if any(rel_root == p or rel_root.startswith(p + os.sep) for p in referenced_prefixes):
+                    continue
+                for filename in filenames:
+                    rel_path = os.path.normpath(os.path.join(rel_root, filename))
+                    if rel_path in referenced_files:
+                        continue
+                    file_path = os.path.join(root, filename)
+                    try:
+                        size = os.path.getsize(file_path)
+                    except OSError:
+                        continue
+                    report["libraries"].append(rel_path)
+                    report["files"] += 1
+                    report["bytes"] += size
+                    if not dry_run:
+                        try:
+                            os.remove(file_path)
+                        except OSError as e:
+                            self.log(f"Errore rimozione libreria {rel_path}: {e}", "ERROR")
+            if not dry_run:
+                self.prune_empty_dirs(self.libraries_dir)
+
+        report["files"] += len(report["versions"])
+        return report
+
+    def prune_empty_dirs(self, top):
+        for root, dirs, filenames in os.walk(top, topdown=False):
+            if root != top and not dirs and not filenames:
+                try:
+                    os.rmdir(root)
+                except OSError:
+                    pass
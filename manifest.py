@@ -6,13 +6,15 @@ import argparse
 from datetime import datetime
 
 class ManifestGenerator:
-    def __init__(self, base_folder, base_url):
+    def __init__(self, base_folder, base_url, mirrors=None):
         """
         base_folder: Cartella principale contenente le sottocartelle del modpack
         base_url: URL base (es: https://raw.githubusercontent.com/Baloreg/Cignopack/main)
+        mirrors: URL base alternativi con la stessa struttura (mirror, cache in LAN)
         """
         self.base_folder = Path(base_folder)
         self.base_url = base_url.rstrip('/')
+        self.mirrors = [m.rstrip('/') for m in (mirrors or [])]
         
         # File e cartelle da ignorare
         self.ignore_patterns = {
@@ -348,6 +350,10 @@ class ManifestGenerator:
             "last_updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
         
+        # Sorgenti alternative: il launcher riscrive gli URL dei file su ogni mirror
+        if self.mirrors:
+            manifest["sources"] = {"base_url": self.base_url, "mirrors": self.mirrors}
+        
         total_files = 0
         
         # Processa i file nella root (se ci sono)
@@ -511,7 +517,7 @@ class ManifestGenerator:
         print("=" * 60)
         
         for category in set(list(old_manifest.keys()) + list(new_manifest.keys())):
-            if category in ['version', 'minecraft_version', 'forge_version', 'modpack_name', 'last_updated']:
+            if category in ['version', 'minecraft_version', 'forge_version', 'modpack_name', 'last_updated', 'sources']:
                 continue
             
             old_files = {f['path']: f for f in old_manifest.get(category, [])}
@@ -561,6 +567,9 @@ Esempi di utilizzo:
   # Genera manifest da cartella (processa TUTTE le sottocartelle)
   python manifest_generator.py ./modpack https://raw.githubusercontent.com/user/repo/main
 
+  # Aggiungi mirror alternativi a GitHub
+  python manifest_generator.py ./modpack https://... --mirror https://mirror.example/cignopack
+
   # Specifica nome modpack e versioni
   python manifest_generator.py ./modpack https://... --name "MioModpack" --minecraft 1.20.1 --forge 1.20.1-47.3.0
 
@@ -602,6 +611,13 @@ Lo script processerà AUTOMATICAMENTE tutte le sottocartelle trovate!
         default='1.20.1-47.3.0',
         help='Versione di Forge (default: 1.20.1-47.3.0)'
     )
+    parser.add_argument(
+        '--mirror',
+        action='append',
+        default=[],
+        metavar='URL',
+        help='URL base di un mirror con la stessa struttura (ripetibile)'
+    )
     parser.add_argument(
         '--verify',
         action='store_true',
@@ -615,7 +631,7 @@ Lo script processerà AUTOMATICAMENTE tutte le sottocartelle trovate!
     
     args = parser.parse_args()
     
-    generator = ManifestGenerator(args.base_folder, args.base_url)
+    generator = ManifestGenerator(args.base_folder, args.base_url, args.mirror)
     
     if args.verify:
         generator.verify_manifest(args.output)
@@ -0,0 +1,222 @@
+import time
+import hashlib
+import threading
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+
+from maintenance import format_size
+from retry import HostCircuitBreakers
+
+
+# Dimensione massima del file usato per misurare le sorgenti (scaricato per intero e verificato)
+PROBE_MAX_BYTES = 256 * 1024
+PROBE_TIMEOUT = 5
+# Velocità presunta di una sorgente non ancora misurata
+DEFAULT_THROUGHPUT = 1024 * 1024
+# File diversi con hash errato dopo i quali una sorgente viene esclusa: un singolo
+# errore può essere un file aggiornato da poco, non ancora propagato
+MAX_MISMATCHES = 3
+
+
+def pick_probe_file(files):
+    """Il file più grande entro PROBE_MAX_BYTES con hash noto: misura latenza e velocità e verifica il contenuto"""
+    candidates = [f for f in files if f.get("sha256") and 0 < (f.get("size") or 0) <= PROBE_MAX_BYTES]
+    return max(candidates, key=lambda f: f["size"]) if candidates else None
+
+
+class Mirror:
+    """Una sorgente dei file del modpack: URL base con la stessa struttura del repository"""
+
+    def __init__(self, name, base_url, primary=False):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.primary = primary
+        self.latency = None      # secondi fino alle intestazioni della risposta
+        self.throughput = None   # byte/s, media mobile dei download completati
+        self.active_bytes = 0
+        self.files = 0
+        self.bytes = 0
+        self.failures = 0
+        self.mismatched = set()  # file serviti con hash errato
+        self.untrusted = False   # troppi file con hash errato: esclusa per tutta la sincronizzazione
+
+    def estimated_seconds(self, size):
+        """Tempo stimato per completare size byte dopo quelli già assegnati a questa sorgente"""
+        throughput = self.throughput or DEFAULT_THROUGHPUT
+        return (self.latency or 0) + (self.active_bytes + size) / throughput
+
+
+class MirrorSet:
+    """
+    Sorgenti alternative dei file del modpack (GitHub, GitHub Releases, mirror, cache in LAN).
+
+    Il manifest può dichiararle in "sources":
+        {"base_url": "https://raw.githubusercontent.com/...", "mirrors": ["https://mirror.example/cignopack"]}
+    Gli URL dei file che iniziano con base_url vengono riscritti su ogni mirror.
+    Ogni file va alla sorgente con il minor tempo di completamento stimato (latenza
+    e velocità misurate, byte già in download), così il carico si distribuisce tra
+    le sorgenti veloci. Il Downloader verifica l'hash di ogni file: un contenuto
+    diverso dal manifest esclude la sorgente solo per quel file, e dopo
+    MAX_MISMATCHES file diversi per tutta la sincronizzazione (mai l'ultima
+    sorgente affidabile). Una sorgente che continua a fallire viene sospesa dal suo
+    circuit breaker.
+    """
+
+    def __init__(self, base_url, mirror_urls=(), breakers=None):
+        self.base_url = base_url.rstrip('/')
+        self.mirrors = [Mirror(self.mirror_name(self.base_url), self.base_url, primary=True)]
+        for url in mirror_urls:
+            url = (url or "").strip().rstrip('/')
+            if url and all(m.base_url != url for m in self.mirrors):
+                self.mirrors.append(Mirror(self.mirror_name(url), url))
+        self.breakers = breakers or HostCircuitBreakers()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_manifest(cls, manifest, default_base_url, extra_urls=(), breakers=None):
+        sources = manifest.get("sources") if isinstance(manifest.get("sources"), dict) else {}
+        base_url = sources.get("base_url") or default_base_url
+        return cls(base_url, list(sources.get("mirrors") or []) + list(extra_urls), breakers)
+
+    @staticmethod
+    def mirror_name(url):
+        parsed = urlparse(url)
+        return parsed.netloc or url
+
+    def __len__(self):
+        return len(self.mirrors)
+
+    def relative_path(self, url):
+        """Percorso del file rispetto a base_url, None se l'URL non appartiene al repository"""
+        prefix = self.base_url + "/"
+        return url[len(prefix) - 1:] if url.startswith(prefix) else None
+
+    def acquire(self, url, size, exclude=()):
+        """
+        Sceglie la sorgente per un file e ne prenota i byte.
+        Ritorna (mirror, url) oppure (None, None) se non restano sorgenti da provare
+        o quelle rimaste sono sospese dal circuit breaker (vedi wait_time).
+        """
+        relative = self.relative_path(url)
+        if relative is None:
+            # File esterno al repository (non presente sui mirror): solo l'URL originale
+            available = None not in exclude and self.breakers.allows(url)
+            return (None, url) if available else (None, None)
+        with self.lock:
+            available = [m for m in self.mirrors
+                         if m not in exclude and not m.untrusted and self.breakers.allows(m.base_url)]
+            if not available:
+                return None, None
+            mirror = min(available, key=lambda m: (m.estimated_seconds(size), not m.primary))
+            mirror.active_bytes += size
+            return mirror, mirror.base_url + relative
+
+    def wait_time(self, url, exclude=()):
+        """
+        Secondi prima che almeno una sorgente affidabile del file torni disponibile,
+        None se non ne restano (tutte escluse o con hash errato).
+        """
+        if self.relative_path(url) is None:
+            return None if None in exclude else self.breakers.remaining(url)
+        with self.lock:
+            trusted = [m for m in self.mirrors if m not in exclude and not m.untrusted]
+        return min((self.breakers.remaining(m.base_url) for m in trusted), default=None)
+
+    def release(self, mirror, size, received=0, seconds=0.0, error=None, cancelled=False):
+        """Registra l'esito di un download e aggiorna la velocità misurata della sorgente"""
+        if mirror is None:
+            return
+        with self.lock:
+            mirror.active_bytes = max(0, mirror.active_bytes - size)
+            if cancelled:
+                return
+            if error is not None:
+                mirror.failures += 1
+                return
+            mirror.files += 1
+            mirror.bytes += received
+            # I file piccoli misurano soprattutto la latenza: la velocità si aggiorna solo sui più grandi
+            transfer = seconds - (mirror.latency or 0)
+            if received >= PROBE_MAX_BYTES and transfer > 0:
+                self.update_throughput(mirror, received / transfer)
+
+    @staticmethod
+    def update_throughput(mirror, measured):
+        mirror.throughput = measured if mirror.throughput is None else 0.7 * mirror.throughput + 0.3 * measured
+
+    def record_mismatch(self, mirror, url):
+        """
+        Registra un file servito con hash errato. Ritorna True se la sorgente è stata
+        esclusa: succede dopo MAX_MISMATCHES file diversi e solo se resta un'altra
+        sorgente affidabile.
+        """
+        if mirror is None:
+            return False
+        with self.lock:
+            # Lo stesso file scaricato due volte (copia duplicata) conta una volta sola
+            mirror.mismatched.add(url[len(mirror.base_url):] if url.startswith(mirror.base_url + "/") else url)
+            if mirror.untrusted or len(mirror.mismatched) < MAX_MISMATCHES:
+                return False
+            if not any(m is not mirror and not m.untrusted for m in self.mirrors):
+                return False
+            mirror.untrusted = True
+            return True
+
+    def probe(self, session, probe_file, cancel=None):
+        """
+        Misura in parallelo latenza e velocità di ogni sorgente scaricando probe_file
+        e ne verifica l'hash. Ritorna le righe del riepilogo, dalla sorgente migliore.
+        """
+        relative = self.relative_path(probe_file["url"]) if probe_file else None
+        if relative is None:
+            return []
+        with ThreadPoolExecutor(max_workers=len(self.mirrors)) as executor:
+            results = list(executor.map(lambda m: self.probe_mirror(session, m, relative, probe_file["sha256"], cancel),
+                                        self.mirrors))
+        lines = []
+        ranked = sorted(zip(self.mirrors, results), key=lambda item: item[0].estimated_seconds(0) if not item[1] else float("inf"))
+        for mirror, error in ranked:
+            if error:
+                lines.append(f"{mirror.name}: non disponibile ({error})")
+            else:
+                lines.append(f"{mirror.name}: {mirror.latency * 1000:.0f} ms, {format_size(mirror.throughput)}/s")
+        return lines
+
+    def probe_mirror(self, session, mirror, relative, expected_sha256, cancel=None):
+        """Ritorna None se la sorgente risponde con il contenuto atteso, altrimenti il motivo dell'errore"""
+        if cancel and cancel.cancelled:
+            return "annullato"
+        started = time.monotonic()
+        try:
+            with session.get(mirror.base_url + relative, stream=True, timeout=PROBE_TIMEOUT) as r:
+                r.raise_for_status()
+                first_byte = time.monotonic()
+                sha256_hash = hashlib.sha256()
+                received = 0
+                for chunk in r.iter_content(chunk_size=65536):
+                    sha256_hash.update(chunk)
+                    received += len(chunk)
+                finished = time.monotonic()
+        except Exception as e:
+            self.breakers.trip(mirror.base_url)
+            return type(e).__name__
+        if sha256_hash.hexdigest() != expected_sha256:
+            self.record_mismatch(mirror, mirror.base_url + relative)
+            return "contenuto non aggiornato"
+        with self.lock:
+            mirror.latency = first_byte - started
+            # Anche un file piccolo dà una stima iniziale; i download veri la correggono
+            self.update_throughput(mirror, received / max(finished - first_byte, 0.001))
+        return None
+
+    def summary(self):
+        """Righe del riepilogo a fine sincronizzazione: file e byte serviti da ogni sorgente"""
+        lines = []
+        with self.lock:
+            for mirror in self.mirrors:
+                paused = not self.breakers.allows(mirror.base_url)
+                state = " (esclusa: hash errato)" if mirror.untrusted else (" (sospesa)" if paused else "")
+                mismatches = f", {len(mirror.mismatched)} con hash errato" if mirror.mismatched else ""
+                lines.append(f"{mirror.name}: {mirror.files} file, {format_size(mirror.bytes)}, "
+                             f"{mirror.failures} errori{mismatches}{state}")
+        return lines
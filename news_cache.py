@@ -0,0 +1,199 @@
+import os
+import time
+import hashlib
+
+import requests
+
+from state_store import open_store
+
+try:
+    from PIL import Image, ImageSequence
+except ImportError:
+    Image = None
+
+
+class NewsAssetCache:
+    """
+    Cache delle immagini delle news in news_assets/.
+
+    - Validazione tramite stat (dimensione e mtime registrati in index.json):
+      lo SHA-256 viene calcolato solo al download o se il file è cambiato su disco.
+    - Senza hash atteso nel news.json il file viene rivalidato con una GET condizionale.
+    - Dimensione totale limitata con eliminazione LRU; i file non più indicizzati vengono rimossi.
+    - Le animazioni vengono salvate anche già ridimensionate alla larghezza di visualizzazione,
+      così QMovie non deve riscalare ogni frame durante la riproduzione.
+    """
+
+    def __init__(self, assets_folder, max_bytes=50 * 1024 * 1024, log=None):
+        self.assets_folder = assets_folder
+        self.max_bytes = max_bytes
+        self.index_file = os.path.join(assets_folder, "index.json")
+        self.store = open_store(self.index_file, default=lambda: {"assets": {}})
+        self.log = log or (lambda message, level="INFO": None)
+        self.assets = self.load_index()
+
+    def load_index(self):
+        return self.store.load().setdefault("assets", {})
+
+    def save_index(self):
+        self.store.save({"assets": self.assets})
+
+    def local_path(self, url, suffix=""):
+        hashed_name = hashlib.md5(url.encode()).hexdigest()
+        return os.path.join(self.assets_folder, f"{hashed_name}{suffix}{os.path.splitext(url)[1]}")
+
+    @staticmethod
+    def calculate_sha256(file_path):
+        sha256_hash = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for byte_block in iter(lambda: f.read(65536), b""):
+                sha256_hash.update(byte_block)
+        return sha256_hash.hexdigest()
+
+    @staticmethod
+    def stat_matches(entry, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        return entry.get("size") == st.st_size and entry.get("mtime_ns") == st.st_mtime_ns
+
+    def record_file(self, entry, path, sha256=None):
+        st = os.stat(path)
+        entry.update({"size": st.st_size, "mtime_ns": st.st_mtime_ns,
+                      "sha256": sha256 or self.calculate_sha256(path)})
+
+    def get(self, url, expected_sha256=None):
+        """Ritorna il percorso locale dell'immagine, scaricandola solo se necessario (None se non disponibile)"""
+        path = self.local_path(url)
+        entry = self.assets.setdefault(url, {"file": os.path.basename(path)})
+        valid = False
+        if os.path.exists(path):
+            if not self.stat_matches(entry, path):
+                # File nuovo per l'indice (o modificato su disco): unico caso in cui serve ricalcolare l'hash
+                self.record_file(entry, path)
+            valid = expected_sha256 is None or entry["sha256"] == expected_sha256
+
+        if not (valid and expected_sha256):
+            headers = {}
+            if valid:
+                if entry.get("etag"):
+                    headers["If-None-Match"] = entry["etag"]
+                if entry.get("last_modified"):
+                    headers["If-Modified-Since"] = entry["last_modified"]
+            try:
+                self.download(url, path, entry, headers, expected_sha256)
+            except Exception as e:
+                self.log(f"Errore scaricando immagine news: {e}", "ERROR")
+
+        if not os.path.exists(path):
+            self.assets.pop(url, None)
+            self.save_index()
+            return None
+        entry["last_used"] = time.time()
+        self.evict(keep=url)
+        self.save_index()
+        return path
+
+    def download(self, url, path, entry, headers, expected_sha256):
+        response = requests.get(url, headers=headers, timeout=15, stream=True)
+        if response.status_code == 304:
+            return
+        response.raise_for_status()
+        self.log(f"Download nuova versione di: {os.path.basename(url)}", "INFO")
+        temp_path = path + ".part"
+        sha256_hash = hashlib.sha256()
+        with open(temp_path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=65536):
+                f.write(chunk)
+                sha256_hash.update(chunk)
+        digest = sha256_hash.hexdigest()
+        if expected_sha256 and digest != expected_sha256:
+            os.remove(temp_path)
+            raise ValueError(f"hash non corrispondente per {os.path.basename(url)}")
+        os.replace(temp_path, path)
+        entry.update({"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")})
+        self.record_file(entry, path, digest)
+        # L'immagine è cambiata: la versione ridimensionata va rigenerata
+        self.remove_scaled(entry)
+
+    def scaled_animation(self, url, width):
+        """
+        Ritorna il percorso della GIF già ridimensionata alla larghezza indicata,
+        creandola se serve. Senza Pillow ritorna None (la scala resta a carico di QMovie).
+        """
+        entry = self.assets.get(url)
+        source = self.local_path(url)
+        if Image is None or not entry or not os.path.exists(source):
+            return None
+        scaled = entry.get("scaled")
+        scaled_path = os.path.join(self.assets_folder, scaled["file"]) if scaled else None
+        if (scaled and scaled.get("width") == width and scaled.get("source_sha256") == entry["sha256"]
+                and self.stat_matches(scaled, scaled_path)):
+            return scaled_path
+
+        self.remove_scaled(entry)
+        scaled_path = self.local_path(url, f".{width}")
+        try:
+            with Image.open(source) as image:
+                if image.width <= 0:
+                    return None
+                height = max(1, round(width * image.height / image.width))
+                frames, durations = [], []
+                for frame in ImageSequence.Iterator(image):
+                    frames.append(frame.convert("RGBA").resize((width, height), Image.LANCZOS))
+                    durations.append(frame.info.get("duration", image.info.get("duration", 100)))
+                frames[0].save(scaled_path, save_all=True, append_images=frames[1:], duration=durations,
+                               loop=image.info.get("loop", 0), disposal=2)
+        except Exception as e:
+            self.log(f"Impossibile ridimensionare l'animazione delle news: {e}", "ERROR")
+            return None
+        entry["scaled"] = {"file": os.path.basename(scaled_path), "width": width, "source_sha256": entry["sha256"]}
+        self.record_file_stat(entry["scaled"], scaled_path)
+        self.evict(keep=url)
+        self.save_index()
+        return scaled_path
+
+    @staticmethod
+    def record_file_stat(entry, path):
+        st = os.stat(path)
+        entry.update({"size": st.st_size, "mtime_ns": st.st_mtime_ns})
+
+    def remove_scaled(self, entry):
+        scaled = entry.pop("scaled", None)
+        if scaled:
+            try:
+                os.remove(os.path.join(self.assets_folder, scaled["file"]))
+            except OSError:
+                pass
+
+    def entry_size(self, entry):
+        return entry.get("size", 0) + entry.get("scaled", {}).get("size", 0)
+
+    def evict(self, keep=None):
+        """Rimuove i file orfani e poi le immagini usate meno di recente oltre il limite di dimensione"""
+        referenced = {"index.json"}
+        for entry in self.assets.values():
+            referenced.add(entry["file"])
+            if entry.get("scaled"):
+                referenced.add(entry["scaled"]["file"])
+        for name in os.listdir(self.assets_folder):
+            if name not in referenced and not name.endswith(".part"):
+                try:
+                    os.remove(os.path.join(self.assets_folder, name))
+                except OSError:
+                    pass
+
+        total = sum(self.entry_size(entry) for entry in self.assets.values())
+        for url, entry in sorted(self.assets.items(), key=lambda item: item[1].get("last_used", 0)):
+            if total <= self.max_bytes:
+                break
+            if url == keep:
+                continue
+            total -= self.entry_size(entry)
+            self.remove_scaled(entry)
+            try:
+                os.remove(os.path.join(self.assets_folder, entry["file"]))
+            except OSError:
+                pass
+            del self.assets[url]
@@ -0,0 +1,177 @@
+import os
+import sys
+import time
+import ctypes
+
+# Diritto minimo per leggere tempi, memoria e I/O di un altro processo su Windows
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+
+
+class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+    _fields_ = [("cb", ctypes.c_ulong), ("PageFaultCount", ctypes.c_ulong),
+                ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+
+def working_set_size(handle):
+    """Memoria residente di un processo Windows, None se non leggibile"""
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(PROCESS_MEMORY_COUNTERS)
+    if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+        return counters.WorkingSetSize
+    return None
+
+
+def launcher_footprint():
+    """Ritorna (istante, tempo CPU, RSS in byte o None) del processo del launcher"""
+    return time.monotonic(), time.process_time(), current_rss()
+
+
+def current_rss():
+    """Memoria residente attuale del processo corrente"""
+    try:
+        if sys.platform.startswith("linux"):
+            with open("/proc/self/statm", 'r') as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        if sys.platform == "win32":
+            return working_set_size(ctypes.windll.kernel32.GetCurrentProcess())
+    except (OSError, ValueError, AttributeError):
+        pass
+    return None
+
+
+def cpu_percent_between(first, second):
+    """Uso medio della CPU del launcher tra due footprint"""
+    elapsed = second[0] - first[0]
+    return round((second[1] - first[1]) / elapsed * 100, 1) if elapsed > 0 else None
+
+
+class ProcessSampler:
+    """
+    Campiona le risorse del processo di gioco leggendo /proc/<pid> su Linux e
+    GetProcessTimes/GetProcessMemoryInfo/GetProcessIoCounters su Windows.
+
+    Ogni campione costa poche letture, senza avviare processi esterni. La CPU è
+    calcolata come differenza del tempo CPU tra due campioni, quindi le pause
+    (ad esempio con il launcher minimizzato) non falsano i valori. Su Windows il
+    numero di thread non è disponibile e vale None.
+    """
+
+    MAX_SERIES = 300
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.handle = self.open_process(pid) if sys.platform == "win32" else None
+        self.available = self.handle is not None or (sys.platform.startswith("linux") and os.path.isdir(f"/proc/{pid}"))
+        on_proc = self.available and self.handle is None
+        self.clock_ticks = os.sysconf("SC_CLK_TCK") if on_proc else 100
+        self.page_size = os.sysconf("SC_PAGE_SIZE") if on_proc else 4096
+        self.previous = None
+        self.series = []
+        self.samples = 0
+        self.peak_rss = 0
+        self.max_threads = 0
+        self.cpu_percent_total = 0.0
+        self.cpu_samples = 0
+        self.last = None
+
+    @staticmethod
+    def open_process(pid):
+        try:
+            open_process = ctypes.windll.kernel32.OpenProcess
+            # Un HANDLE è grande quanto un puntatore: il tipo di ritorno predefinito (int) lo troncherebbe
+            open_process.restype = ctypes.c_void_p
+            handle = open_process(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        except (OSError, AttributeError):
+            return None
+        return ctypes.c_void_p(handle) if handle else None
+
+    def close(self):
+        if self.handle is not None:
+            ctypes.windll.kernel32.CloseHandle(self.handle)
+            self.handle = None
+            self.available = False
+
+    def read_stat(self):
+        if self.handle is not None:
+            return self.read_stat_windows()
+        with open(f"/proc/{self.pid}/stat", 'r') as f:
+            data = f.read()
+        # Il nome del processo può contenere spazi: i campi numerici iniziano dopo l'ultima ')'
+        fields = data[data.rindex(")") + 2:].split()
+        cpu_seconds = (int(fields[11]) + int(fields[12])) / self.clock_ticks
+        return cpu_seconds, int(fields[17]), int(fields[21]) * self.page_size
+
+    def read_stat_windows(self):
+        kernel32 = ctypes.windll.kernel32
+        creation, exit_time, kernel, user = (ctypes.c_ulonglong() for _ in range(4))
+        if not kernel32.GetProcessTimes(self.handle, ctypes.byref(creation), ctypes.byref(exit_time),
+                                        ctypes.byref(kernel), ctypes.byref(user)):
+            raise OSError("GetProcessTimes non riuscito")
+        # FILETIME in unità da 100 ns
+        cpu_seconds = (kernel.value + user.value) / 10 ** 7
+        return cpu_seconds, None, working_set_size(self.handle) or 0
+
+    def read_io(self):
+        if self.handle is not None:
+            # IO_COUNTERS: operazioni di lettura/scrittura/altro, poi i byte nello stesso ordine
+            counters = (ctypes.c_ulonglong * 6)()
+            if ctypes.windll.kernel32.GetProcessIoCounters(self.handle, counters):
+                return counters[3], counters[4]
+            return 0, 0
+        counters = {}
+        try:
+            with open(f"/proc/{self.pid}/io", 'r') as f:
+                for line in f:
+                    key, value = line.split(":", 1)
+                    counters[key] = int(value)
+        except (OSError, ValueError):
+            pass
+        return counters.get("read_bytes", 0), counters.get("write_bytes", 0)
+
+    def sample(self, timestamp):
+        """Legge un campione; ritorna un dizionario o None se il processo non è più leggibile"""
+        if not self.available:
+            return None
+        try:
+            cpu_seconds, threads, rss = self.read_stat()
+        except (OSError, ValueError, IndexError):
+            return None
+        read_bytes, write_bytes = self.read_io()
+
+        cpu_percent = None
+        if self.previous is not None and timestamp > self.previous[0]:
+            cpu_percent = (cpu_seconds - self.previous[1]) / (timestamp - self.previous[0]) * 100
+        self.previous = (timestamp, cpu_seconds)
+
+        self.last = {"cpu_seconds": round(cpu_seconds, 2), "cpu_percent": round(cpu_percent, 1) if cpu_percent is not None else None,
+                     "rss": rss, "threads": threads, "read_bytes": read_bytes, "write_bytes": write_bytes}
+        self.samples += 1
+        self.peak_rss = max(self.peak_rss, rss)
+        if threads is not None:
+            self.max_threads = max(self.max_threads, threads)
+        if cpu_percent is not None:
+            self.cpu_percent_total += cpu_percent
+            self.cpu_samples += 1
+            self.series.append([round(timestamp, 1), round(cpu_percent, 1), round(rss / 1024 ** 2), threads])
+            if len(self.series) > self.MAX_SERIES:
+                # Dimezza la risoluzione della serie invece di scartare l'inizio della sessione
+                self.series = self.series[::2]
+        return self.last
+
+    def summary(self):
+        """Riepilogo da salvare nel record della sessione"""
+        if not self.samples or self.last is None:
+            return None
+        return {
+            "samples": self.samples,
+            "cpu_seconds": self.last["cpu_seconds"],
+            "avg_cpu_percent": round(self.cpu_percent_total / self.cpu_samples, 1) if self.cpu_samples else None,
+            "peak_rss": self.peak_rss,
+            "max_threads": self.max_threads,
+            "read_bytes": self.last["read_bytes"],
+            "write_bytes": self.last["write_bytes"],
+            "series": self.series
+        }
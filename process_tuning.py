@@ -0,0 +1,140 @@
+import os
+import sys
+import ctypes
+import threading
+
+
+# Priorità ionice (classe best-effort, livello 0 = massimo)
+IOPRIO_CLASS_BE = 2
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_SHIFT = 13
+
+# Numero della syscall ioprio_set per architettura
+IOPRIO_SET_SYSCALL = {"x86_64": 251, "aarch64": 30, "i686": 289, "armv7l": 314}
+
+WINDOWS_ABOVE_NORMAL_PRIORITY_CLASS = 0x8000
+WINDOWS_THREAD_PRIORITY_BELOW_NORMAL = -1
+
+
+def set_io_priority(pid, io_class, level=0):
+    """Imposta la priorità di I/O (equivalente di ionice) su Linux. Ritorna True se applicata"""
+    if not sys.platform.startswith("linux"):
+        return False
+    syscall_nr = IOPRIO_SET_SYSCALL.get(os.uname().machine)
+    if syscall_nr is None:
+        return False
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        return libc.syscall(syscall_nr, IOPRIO_WHO_PROCESS, pid, (io_class << IOPRIO_CLASS_SHIFT) | level) == 0
+    except Exception:
+        return False
+
+
+def transparent_huge_pages_available():
+    """True se il kernel permette alla JVM di usare le transparent huge pages (madvise o always)"""
+    try:
+        with open("/sys/kernel/mm/transparent_hugepage/enabled", 'r') as f:
+            mode = f.read()
+        return "[madvise]" in mode or "[always]" in mode
+    except OSError:
+        return False
+
+
+def static_huge_pages_available():
+    """True se sono state riservate huge pages statiche (necessarie per -XX:+UseLargePages su Linux)"""
+    try:
+        with open("/proc/meminfo", 'r') as f:
+            for line in f:
+                if line.startswith("HugePages_Free:"):
+                    return int(line.split()[1]) > 0
+    except (OSError, ValueError):
+        pass
+    return False
+
+
+def large_pages_jvm_arguments():
+    """Argomenti JVM per le pagine di memoria grandi, solo dove il sistema le supporta"""
+    if not sys.platform.startswith("linux"):
+        return []
+    if static_huge_pages_available():
+        return ["-XX:+UseLargePages"]
+    if transparent_huge_pages_available():
+        return ["-XX:+UseTransparentHugePages"]
+    return []
+
+
+def set_process_affinity(pid, cores):
+    """
+    Assegna i core a tutti i thread di un processo: su Linux sched_setaffinity
+    agisce su un solo thread, e la JVM ne ha già avviati diversi subito dopo Popen.
+    """
+    try:
+        tids = [int(tid) for tid in os.listdir(f"/proc/{pid}/task")]
+    except OSError:
+        tids = [pid]
+    for tid in tids:
+        try:
+            os.sched_setaffinity(tid, cores)
+        except OSError:
+            # Thread terminato nel frattempo; se fallisce il thread principale l'errore è reale
+            if tid == pid:
+                raise
+
+
+def apply_game_priority(process, use_affinity=False):
+    """
+    Applica il profilo di scheduling al processo di gioco dopo Popen.
+    Ritorna (modifiche riuscite, modifiche non consentite dal sistema) per il log.
+    """
+    applied, refused = [], []
+    pid = process.pid
+    if sys.platform == "win32":
+        try:
+            if ctypes.windll.kernel32.SetPriorityClass(int(process._handle), WINDOWS_ABOVE_NORMAL_PRIORITY_CLASS):
+                applied.append("priorità alta")
+            else:
+                refused.append("priorità alta")
+        except Exception:
+            refused.append("priorità alta")
+        return applied, refused
+
+    try:
+        # Un utente senza privilegi (CAP_SYS_NICE) non può scendere sotto 0: resta la priorità normale
+        os.setpriority(os.PRIO_PROCESS, pid, -5)
+        applied.append("nice -5")
+    except (OSError, AttributeError):
+        refused.append("nice -5 (servono privilegi di amministratore)")
+    if set_io_priority(pid, IOPRIO_CLASS_BE, 0):
+        applied.append("ionice best-effort 0")
+
+    if use_affinity and hasattr(os, "sched_setaffinity"):
+        cores = sorted(os.sched_getaffinity(0))
+        if len(cores) > 2:
+            try:
+                # Il primo core resta libero per il launcher e il sistema; il launcher non viene
+                # vincolato, così i suoi thread non restano legati a un solo core
+                set_process_affinity(pid, cores[1:])
+                applied.append(f"affinità {len(cores) - 1} core")
+            except OSError:
+                refused.append("affinità")
+    return applied, refused
+
+
+def demote_current_thread():
+    """Abbassa la priorità CPU (e I/O su Linux) del thread corrente del launcher"""
+    if sys.platform == "win32":
+        try:
+            kernel32 = ctypes.windll.kernel32
+            kernel32.SetThreadPriority(kernel32.GetCurrentThread(), WINDOWS_THREAD_PRIORITY_BELOW_NORMAL)
+        except Exception:
+            pass
+        return
+    if not sys.platform.startswith("linux"):
+        return
+    try:
+        # Su Linux setpriority con il TID agisce sul singolo thread
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+    except OSError:
+        pass
+    set_io_priority(threading.get_native_id(), IOPRIO_CLASS_IDLE)
@@ -0,0 +1,201 @@
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+
+
+# Stati HTTP per cui ha senso riprovare: il server è sovraccarico o temporaneamente in errore
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class HostUnavailable(Exception):
+    """L'host è sospeso dal circuit breaker più a lungo dell'attesa massima della policy"""
+
+
+def host_of(url):
+    return urlparse(url).netloc
+
+
+def http_status(error):
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def retry_after(error):
+    """Secondi indicati dal server nell'intestazione Retry-After (429/503), None se assente"""
+    response = getattr(error, "response", None)
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """
+    Quando e quanto attendere prima di ripetere un download fallito.
+
+    - Timeout ed errori di connessione: nuovo tentativo (con ripresa dal .part).
+    - 5xx: attesa esponenziale con jitter (full jitter, evita che tutti i thread
+      riprovino nello stesso istante).
+    - 429: si rispetta Retry-After, altrimenti attesa esponenziale raddoppiata.
+    - Altri 4xx (404, 403) e hash errati: inutile riprovare sulla stessa sorgente.
+    """
+
+    def __init__(self, max_attempts=4, base_delay=0.5, max_delay=30.0, connect_timeout=5, read_timeout=15):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # requests applica read_timeout a ogni lettura, non al download intero
+        self.timeout = (connect_timeout, read_timeout)
+
+    def retryable(self, error):
+        if isinstance(error, (requests.Timeout, requests.ConnectionError, requests.exceptions.ChunkedEncodingError)):
+            return True
+        return http_status(error) in RETRY_STATUSES
+
+    def delay(self, attempt, error=None):
+        """Attesa prima del tentativo successivo (attempt parte da 1)"""
+        ceiling = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        if http_status(error) == 429:
+            after = retry_after(error)
+            if after is not None:
+                return min(self.max_delay, after)
+            ceiling = min(self.max_delay, ceiling * 2)
+        return random.uniform(0, ceiling)
+
+    def wait_for_host(self, seconds, host, cancel):
+        """Attende la fine della pausa di un host; se supera max_delay l'host è considerato non disponibile"""
+        if seconds > self.max_delay:
+            raise HostUnavailable(f"{host} non risponde: richieste sospese per {seconds:.0f} s dopo ripetuti errori")
+        cancel.wait(seconds)
+
+    def run(self, operation, url, cancel, breakers=None):
+        """
+        Esegue operation() ripetendola secondo la policy, per i download da una sola
+        sorgente. Le attese rispettano il circuit breaker dell'host e l'annullamento.
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            if breakers:
+                self.wait_for_host(breakers.remaining(url), host_of(url), cancel)
+            cancel.check()
+            try:
+                result = operation()
+            except Exception as e:
+                cancel.check()
+                # Solo gli errori dell'host contano per il circuit breaker, non un file mancante
+                if breakers and self.retryable(e):
+                    breakers.record_failure(url, retry_after(e) if http_status(e) == 429 else None)
+                if attempt >= self.max_attempts or not self.retryable(e):
+                    raise
+                cancel.wait(self.delay(attempt, e))
+                continue
+            if breakers:
+                breakers.record_success(url)
+            return result
+
+
+class CircuitBreaker:
+    """
+    Stato di un host: dopo threshold errori consecutivi le richieste vengono sospese
+    per cooldown secondi (aperto). Allo scadere le richieste riprendono (semiaperto):
+    un successo chiude il circuito, un errore lo riapre con pausa raddoppiata.
+    """
+
+    def __init__(self, threshold=5, cooldown=10.0, max_cooldown=120.0):
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.failures = 0
+        self.open_until = 0.0
+        self.half_open = False
+        self.trips = 0
+
+    def remaining(self, now):
+        return max(0.0, self.open_until - now)
+
+    def record_success(self):
+        self.failures = 0
+        self.half_open = False
+        self.cooldown = self.base_cooldown
+
+    def record_failure(self, now, pause=None):
+        """Ritorna True se l'errore ha aperto il circuito"""
+        self.failures += 1
+        if now < self.open_until:
+            return False
+        if pause:
+            # Retry-After di un 429: l'host chiede solo di rallentare per il tempo indicato
+            self.open_until = now + pause
+            return False
+        if self.half_open or self.failures >= self.threshold:
+            if self.half_open:
+                self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+            self.open_until = now + self.cooldown
+            self.half_open = True
+            self.trips += 1
+            return True
+        return False
+
+
+class HostCircuitBreakers:
+    """Circuit breaker per host, condivisi da tutti i thread di download"""
+
+    def __init__(self, threshold=5, cooldown=10.0, log=None):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.log = log
+        self.breakers = {}
+        self.lock = threading.Lock()
+
+    def _get(self, host):
+        if host not in self.breakers:
+            self.breakers[host] = CircuitBreaker(self.threshold, self.cooldown)
+        return self.breakers[host]
+
+    def remaining(self, url):
+        """Secondi di pausa rimasti per l'host dell'URL (0 se le richieste sono consentite)"""
+        with self.lock:
+            breaker = self.breakers.get(host_of(url))
+            return breaker.remaining(time.monotonic()) if breaker else 0.0
+
+    def allows(self, url):
+        return self.remaining(url) == 0
+
+    def record_success(self, url):
+        with self.lock:
+            breaker = self.breakers.get(host_of(url))
+            if breaker:
+                breaker.record_success()
+
+    def record_failure(self, url, pause=None):
+        host = host_of(url)
+        with self.lock:
+            breaker = self._get(host)
+            opened = breaker.record_failure(time.monotonic(), pause)
+            seconds = breaker.remaining(time.monotonic())
+        if opened and self.log:
+            self.log(f"Troppi errori da {host}: richieste sospese per {seconds:.0f} s")
+
+    def trip(self, url):
+        """Apre subito il circuito (sorgente che non risponde alla verifica iniziale)"""
+        with self.lock:
+            breaker = self._get(host_of(url))
+            breaker.failures = breaker.threshold - 1
+            breaker.record_failure(time.monotonic())
+
+    def trips(self):
+        with self.lock:
+            return sum(breaker.trips for breaker in self.breakers.values())
@@ -0,0 +1,49 @@
+import os
+
+from state_store import open_store
+
+
+class LauncherSettings:
+    """Impostazioni del launcher salvate in settings.json"""
+
+    DEFAULTS = {
+        "jvm_profile": "balanced",
+        "auto_ram": True,
+        "ram_gb": 4,
+        "performance_mode": False,
+        "performance_affinity": False,
+        "sampler_interval": 2,
+        "gc_logging": False,
+        "stall_watchdog": True,
+        "game_mode": True,
+        "game_mode_tray": False,
+        "download_order": "small_first",
+        "bandwidth_limit_mb": 0,
+        "download_mirror": "",
+        "download_retries": 4,
+        "download_timeout": 15,
+        "download_hedging": True
+    }
+
+    def __init__(self, launcher_directory):
+        self.settings_file = os.path.join(launcher_directory, "settings.json")
+        self.store = open_store(self.settings_file)
+        self.values = self.load_settings()
+
+    def load_settings(self):
+        values = dict(self.DEFAULTS)
+        values.update(self.store.load())
+        return values
+
+    def save_settings(self):
+        self.store.save(self.values)
+
+    def get(self, key):
+        return self.values.get(key, self.DEFAULTS.get(key))
+
+    def set(self, key, value):
+        """Aggiorna un'impostazione e la salva subito su disco"""
+        if self.values.get(key) == value:
+            return
+        self.values[key] = value
+        self.save_settings()
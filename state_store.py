@@ -0,0 +1,176 @@
+import os
+import json
+import atexit
+import threading
+
+
+# Uno store per file: istanze diverse della stessa classe condividono dati e scritture in attesa
+_stores = {}
+_stores_lock = threading.Lock()
+# Chi mostra gli errori di scrittura (il launcher li porta nella console); fino alla
+# registrazione gli errori restano in attesa
+_error_handler = None
+_unreported_errors = []
+
+
+def atomic_write(path, data, backup=False):
+    """
+    Scrive i byte su file tramite file temporaneo, fsync e rename: il file
+    contiene sempre la versione precedente o quella nuova, mai una scrittura a metà.
+    Con backup=True la versione precedente resta in <path>.bak.
+    """
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    if backup and os.path.exists(path):
+        os.replace(path, f"{path}.bak")
+    os.replace(temp_path, path)
+
+
+def open_store(path, default=dict, flush_delay=1.0):
+    """Ritorna lo StateStore del file indicato, creandolo al primo utilizzo"""
+    key = os.path.normcase(os.path.abspath(path))
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = StateStore(path, default, flush_delay)
+        return _stores[key]
+
+
+def flush_all():
+    """Scrive subito tutti i salvataggi ancora in attesa"""
+    with _stores_lock:
+        stores = list(_stores.values())
+    for store in stores:
+        store.flush()
+
+
+def set_error_handler(handler):
+    """
+    handler(messaggio) riceve gli errori di scrittura degli store, anche dai thread
+    dei salvataggi rimandati. Gli errori avvenuti prima vengono consegnati subito.
+    """
+    global _error_handler
+    with _stores_lock:
+        _error_handler = handler
+        errors = list(_unreported_errors)
+        _unreported_errors.clear()
+    for message in errors:
+        handler(message)
+
+
+def _report_error(message):
+    with _stores_lock:
+        handler = _error_handler
+        if handler is None:
+            _unreported_errors.append(message)
+    if handler is not None:
+        handler(message)
+
+
+atexit.register(flush_all)
+
+
+class StateStore:
+    """
+    File di stato JSON con cache in memoria e scritture atomiche.
+
+    - load() legge il file una sola volta; le chiamate successive usano la copia in memoria.
+    - save() serializza subito i dati ma rimanda la scrittura di flush_delay secondi:
+      più modifiche ravvicinate producono una sola scrittura su disco.
+      save(immediate=True) scrive subito (account, stato dell'installazione).
+    - Ogni scrittura conserva la versione precedente in .bak, usata se il file
+      principale è illeggibile. Un file corrotto viene spostato in .corrupt.
+
+    status dopo load(): "ok", "missing", "backup" (recuperato dal .bak) o "corrupt".
+    last_error: messaggio dell'ultima scrittura fallita, None dopo una riuscita;
+    ogni errore viene anche passato al gestore registrato con set_error_handler.
+    """
+
+    def __init__(self, path, default=dict, flush_delay=1.0):
+        self.path = path
+        self.default = default
+        self.flush_delay = flush_delay
+        self.data = None
+        self.status = None
+        self.last_error = None
+        self._pending = None
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        if self.data is None:
+            self.data = self.read()
+        return self.data
+
+    def read(self):
+        self.status = "missing"
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.status = "ok"
+                    return json.load(f)
+            except:
+                self.status = "corrupt"
+                try:
+                    os.replace(self.path, f"{self.path}.corrupt")
+                except OSError:
+                    pass
+        backup_path = f"{self.path}.bak"
+        if os.path.exists(backup_path):
+            try:
+                with open(backup_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.status = "backup"
+                return data
+            except:
+                pass
+        return self.default()
+
+    def save(self, data=None, immediate=False):
+        if data is not None:
+            self.data = data
+        # Serializzazione nel thread chiamante: il thread che scrive non legge mai dati in modifica
+        payload = json.dumps(self.data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        with self._lock:
+            self._pending = payload
+            if immediate:
+                self._cancel_timer()
+                self._write_pending()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.flush_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            self._cancel_timer()
+            self._write_pending()
+
+    def delete(self):
+        """Elimina il file e le sue copie, annullando le scritture in attesa"""
+        with self._lock:
+            self._cancel_timer()
+            self._pending = None
+            self.data = None
+            for path in (self.path, f"{self.path}.bak"):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _write_pending(self):
+        if self._pending is None:
+            return
+        payload, self._pending = self._pending, None
+        try:
+            atomic_write(self.path, payload, backup=True)
+        except OSError as e:
+            self.last_error = f"Impossibile salvare {os.path.basename(self.path)}: {e}"
+            _report_error(self.last_error)
+        else:
+            self.last_error = None
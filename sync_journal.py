@@ -0,0 +1,90 @@
+import os
+import json
+import time
+import threading
+
+from state_store import atomic_write
+
+
+class SyncJournal:
+    """
+    Registro append-only della sincronizzazione del modpack (sync_journal.jsonl).
+
+    Ogni file completato (scaricato e verificato, o già valido) viene aggiunto
+    con hash, dimensione e mtime. Se il launcher si chiude o va in crash durante
+    l'aggiornamento, alla sincronizzazione successiva i file registrati e non
+    più modificati vengono saltati senza ricalcolarne l'hash.
+    A sincronizzazione completata il registro viene eliminato.
+    """
+
+    def __init__(self, launcher_directory):
+        self.path = os.path.join(launcher_directory, "sync_journal.jsonl")
+        self.file = None
+        self.committed = {}
+        self.lock = threading.Lock()
+
+    def load(self):
+        """Ritorna i file completati da una sincronizzazione interrotta (chiave -> record)"""
+        committed = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Ultima riga troncata da un crash durante la scrittura
+                        continue
+                    if record.get("op") == "file":
+                        committed[record["key"]] = record
+                    elif record.get("op") == "end":
+                        committed = {}
+        except OSError:
+            pass
+        self.committed = committed
+        return committed
+
+    def begin(self, manifest_version=None):
+        """Compatta il registro (solo i file ancora validi) e lo apre in aggiunta"""
+        lines = [{"op": "begin", "version": manifest_version, "at": round(time.time())}]
+        lines.extend(self.committed.values())
+        atomic_write(self.path, "".join(json.dumps(r, separators=(",", ":")) + "\n" for r in lines).encode("utf-8"))
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+    def is_committed(self, key, file_path, expected_sha256):
+        """True se il file è stato completato in precedenza e non è cambiato da allora"""
+        record = self.committed.get(key)
+        if not record or record.get("sha256") != expected_sha256:
+            return False
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return False
+        return record["size"] == st.st_size and record["mtime_ns"] == st.st_mtime_ns
+
+    def commit(self, key, file_path, sha256, sync=True):
+        """
+        Registra un file completato. sync=False per i file già presenti e validi:
+        perderli in un crash del sistema costa solo un nuovo controllo dell'hash.
+        """
+        st = os.stat(file_path)
+        record = {"op": "file", "key": key, "sha256": sha256, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        # I file vengono completati da più thread di download
+        with self.lock:
+            self.committed[key] = record
+            self.file.write(json.dumps(record, separators=(",", ":")) + "\n")
+            self.file.flush()
+            if sync:
+                os.fsync(self.file.fileno())
+
+    def close(self):
+        """Chiude il registro lasciandolo su disco (sincronizzazione interrotta)"""
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def finish(self):
+        """Sincronizzazione completata: il registro non serve più"""
+        self.close()
+        self.committed = {}
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,109 @@
+import time
+import threading
+from datetime import datetime, timedelta
+
+import minecraft_launcher_lib
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+
+
+class TokenRefresher(QObject):
+    """
+    Rinnova in background i token degli account Microsoft prima della scadenza.
+
+    - Controllo all'avvio e poi periodico (solo quando il launcher non sta
+      eseguendo altri task), così premere Gioca non attende mai i servizi Microsoft/Xbox.
+    - Una sola richiesta per account alla volta: le richieste concorrenti vengono
+      unite, evitando di consumare due volte lo stesso refresh token.
+    - I risultati vengono applicati nel thread principale e salvati da AccountManager.
+    """
+
+    refreshed = pyqtSignal(str, dict)
+    failed = pyqtSignal(str, str)
+
+    CHECK_INTERVAL_MS = 5 * 60 * 1000
+    # Anticipo rispetto alla scadenza con cui il token viene rinnovato
+    REFRESH_LEAD = timedelta(minutes=30)
+    # Attesa prima di riprovare un account il cui rinnovo è fallito
+    RETRY_SECONDS = 10 * 60
+
+    def __init__(self, account_manager, client_id, client_secret, is_busy=None, log=None, parent=None):
+        super().__init__(parent)
+        self.account_manager = account_manager
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.is_busy = is_busy
+        self.log = log or (lambda message, level="INFO": None)
+        self.in_flight = {}
+        self.last_failure = {}
+        self.refreshed.connect(self.on_refreshed)
+        self.failed.connect(self.on_failed)
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.check)
+
+    def start(self):
+        self.timer.start(self.CHECK_INTERVAL_MS)
+        # All'avvio il controllo avviene anche se il launcher sta già cercando aggiornamenti
+        QTimer.singleShot(0, lambda: self.check(force=True))
+
+    def needs_refresh(self, account, lead=None):
+        if not account or account.get("type") != "microsoft":
+            return False
+        try:
+            expires_at = datetime.fromisoformat(account.get("expires_at", "1970-01-01T00:00:00"))
+        except ValueError:
+            return True
+        return datetime.now() >= expires_at - (self.REFRESH_LEAD if lead is None else lead)
+
+    def check(self, force=False):
+        if not force and self.is_busy and self.is_busy():
+            return
+        now = time.monotonic()
+        for account_id, account in list(self.account_manager.get_all_accounts().items()):
+            if not self.needs_refresh(account) or not account.get("refresh_token"):
+                continue
+            if now - self.last_failure.get(account_id, -self.RETRY_SECONDS) < self.RETRY_SECONDS:
+                continue
+            self.refresh(account_id)
+
+    def is_refreshing(self, account_id):
+        return account_id in self.in_flight
+
+    def refresh(self, account_id):
+        """
+        Avvia il rinnovo dell'account; se è già in corso non ne avvia un altro.
+        Il risultato arriva con i segnali refreshed/failed.
+        """
+        if account_id in self.in_flight:
+            return
+        account = self.account_manager.get_all_accounts().get(account_id)
+        refresh_token = account.get("refresh_token") if account else None
+        if not refresh_token:
+            self.failed.emit(account_id, "refresh token non trovato")
+            return
+        self.in_flight[account_id] = time.perf_counter()
+        threading.Thread(target=self._refresh_worker, args=(account_id, refresh_token), daemon=True).start()
+
+    def _refresh_worker(self, account_id, refresh_token):
+        try:
+            new_data = minecraft_launcher_lib.microsoft_account.complete_refresh(
+                client_id=self.client_id,
+                client_secret=self.client_secret,
+                redirect_uri="http://localhost:5000/callback",
+                refresh_token=refresh_token
+            )
+        except Exception as e:
+            self.failed.emit(account_id, str(e))
+            return
+        self.refreshed.emit(account_id, new_data)
+
+    def on_refreshed(self, account_id, new_data):
+        started = self.in_flight.pop(account_id, None)
+        self.last_failure.pop(account_id, None)
+        if self.account_manager.update_microsoft_tokens(account_id, new_data):
+            elapsed = f" in {time.perf_counter() - started:.1f} s" if started else ""
+            self.log(f"Token Microsoft di {new_data.get('name', account_id)} rinnovato in background{elapsed}.", "SUCCESS")
+
+    def on_failed(self, account_id, error):
+        self.in_flight.pop(account_id, None)
+        self.last_failure[account_id] = time.monotonic()
+        self.log(f"Impossibile rinnovare il token Microsoft: {error}", "ERROR")
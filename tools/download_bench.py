@@ -0,0 +1,307 @@
+"""
+Banco di prova locale per il Downloader: sorgenti HTTP finte con guasti iniettati.
+
+Avvia su 127.0.0.1 alcuni server che servono file casuali e, con le probabilità
+indicate, rispondono 503, 429 (Retry-After), chiudono la connessione o restano
+fermi prima di rispondere. Ogni scenario scarica i file con Downloader, MirrorSet
+e RetryPolicy del launcher, stampa i riepiloghi e controlla il risultato atteso.
+
+Scenari:
+  failover  sorgente principale irraggiungibile, mirror sano
+  stale     mirror con file vecchi (hash errato) accanto alla sorgente principale,
+            e una sola sorgente con alcuni file vecchi
+  retry     503, 429, connessioni interrotte: tutti i file arrivano con i tentativi
+  hedge     richieste bloccate: confronto della latenza con e senza hedging
+
+Uso:
+  python tools/download_bench.py              tutti gli scenari
+  python tools/download_bench.py retry hedge  solo quelli indicati
+
+Il codice di uscita è 1 se un controllo fallisce.
+"""
+import os
+import sys
+import time
+import random
+import hashlib
+import argparse
+import tempfile
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from downloads import Downloader, HashMismatch
+from mirrors import MirrorSet, MAX_MISMATCHES, pick_probe_file
+from retry import RetryPolicy, HostCircuitBreakers
+
+
+# Porta senza servizio in ascolto: connessione rifiutata subito
+UNREACHABLE_URL = "http://127.0.0.1:9"
+
+
+class FaultServer:
+    """
+    Server HTTP che serve directory iniettando guasti con le probabilità di faults:
+    {"503": p, "429": p, "reset": p, "stall": p}. Una richiesta "stall" attende
+    stall_seconds prima di rispondere normalmente.
+    """
+
+    def __init__(self, directory, faults=None, seed=0, stall_seconds=8.0, retry_after=1):
+        self.faults = faults or {}
+        self.random = random.Random(seed)
+        self.stall_seconds = stall_seconds
+        self.retry_after = retry_after
+        self.requests = 0
+        self.injected = {}
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), partial(self.handler(), directory=directory))
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def pick_fault(self):
+        with self.lock:
+            self.requests += 1
+            value = self.random.random()
+            for fault, probability in self.faults.items():
+                if value < probability:
+                    self.injected[fault] = self.injected.get(fault, 0) + 1
+                    return fault
+                value -= probability
+        return None
+
+    def handler(self):
+        bench = self
+
+        class Handler(SimpleHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                fault = bench.pick_fault()
+                if fault in ("503", "429"):
+                    self.send_response(int(fault))
+                    if fault == "429":
+                        self.send_header("Retry-After", str(bench.retry_after))
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                if fault == "reset":
+                    self.close_connection = True
+                    self.connection.shutdown(2)
+                    return
+                if fault == "stall":
+                    time.sleep(bench.stall_seconds)
+                return super().do_GET()
+
+        return Handler
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def make_files(directory, count, seed=1, sizes=(5000, 60000, 300000)):
+    """Crea count file casuali; ritorna le voci in stile manifest (senza URL)"""
+    rnd = random.Random(seed)
+    files = []
+    for i in range(count):
+        size = rnd.choice(sizes)
+        data = rnd.getrandbits(size * 8).to_bytes(size, 'little')
+        name = f"f{i}.bin"
+        with open(os.path.join(directory, name), 'wb') as f:
+            f.write(data)
+        files.append({"name": name, "path": name, "size": len(data), "sha256": hashlib.sha256(data).hexdigest()})
+    return files
+
+
+def make_stale_copy(source, directory, files, every=3):
+    """Copia i file in directory alterando un file ogni every (mirror non aggiornato)"""
+    for i, entry in enumerate(files):
+        with open(os.path.join(source, entry["name"]), 'rb') as f:
+            data = f.read()
+        with open(os.path.join(directory, entry["name"]), 'wb') as f:
+            f.write(b"old" + data[3:] if i % every == 0 else data)
+
+
+def download_all(downloader, base_url, files, output, workers=4):
+    """Scarica i file in parallelo; ritorna (file verificati, errori, secondi)"""
+    os.makedirs(output, exist_ok=True)
+    errors = []
+
+    def fetch(entry):
+        try:
+            digest = downloader.fetch(f"{base_url}/{entry['name']}", os.path.join(output, entry["name"]),
+                                      "mods", entry["sha256"], entry["size"])
+            return digest == entry["sha256"]
+        except Exception as e:
+            errors.append((entry["name"], e))
+            return False
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(workers) as executor:
+        ok = sum(executor.map(fetch, files))
+    return ok, errors, time.monotonic() - started
+
+
+def report(label, downloader, ok, total, errors, seconds, mirrors=None, logs=()):
+    print(f"== {label}: {ok}/{total} file verificati in {seconds:.1f} s")
+    for line in downloader.summary() + (mirrors.summary() if mirrors else []):
+        print(f"   {line}")
+    for line in logs:
+        print(f"   log: {line}")
+    for name, error in errors[:3]:
+        print(f"   errore {name}: {error}")
+
+
+def leftover_parts(directory):
+    return [name for name in os.listdir(directory) if name.endswith(".part")]
+
+
+class Bench:
+    """Esegue gli scenari in una cartella temporanea e raccoglie i controlli falliti"""
+
+    def __init__(self, workdir, count):
+        self.workdir = workdir
+        self.source = os.path.join(workdir, "source")
+        os.makedirs(self.source)
+        self.files = make_files(self.source, count)
+        self.servers = []
+        self.failures = []
+
+    def server(self, directory=None, faults=None, seed=0, **kwargs):
+        server = FaultServer(directory or self.source, faults, seed, **kwargs)
+        self.servers.append(server)
+        return server
+
+    def check(self, condition, message):
+        print(f"   [{'ok' if condition else 'FALLITO'}] {message}")
+        if not condition:
+            self.failures.append(message)
+
+    def output(self, label):
+        return os.path.join(self.workdir, f"out-{label}")
+
+    def close(self):
+        for server in self.servers:
+            server.close()
+
+    def failover(self):
+        """La sorgente principale non risponde: tutti i file arrivano dal mirror"""
+        mirror = self.server(seed=1)
+        logs = []
+        mirrors = MirrorSet(UNREACHABLE_URL, [mirror.url], HostCircuitBreakers(log=logs.append))
+        downloader = Downloader(mirrors=mirrors, policy=RetryPolicy(max_attempts=3, base_delay=0.1))
+        probe_file = pick_probe_file(self.files)
+        for line in downloader.probe_mirrors(dict(probe_file, url=f"{UNREACHABLE_URL}/{probe_file['name']}")):
+            print(f"   sonda: {line}")
+        ok, errors, seconds = download_all(downloader, UNREACHABLE_URL, self.files, self.output("failover"))
+        report("failover", downloader, ok, len(self.files), errors, seconds, mirrors, logs)
+        self.check(ok == len(self.files), "tutti i file scaricati dal mirror")
+        self.check(mirrors.mirrors[1].files == len(self.files), "il mirror ha servito ogni file")
+        downloader.close()
+
+    def stale(self):
+        """Un mirror con file vecchi viene escluso; con una sola sorgente falliscono solo i file vecchi"""
+        stale_directory = os.path.join(self.workdir, "stale")
+        os.makedirs(stale_directory)
+        make_stale_copy(self.source, stale_directory, self.files)
+        primary = self.server(seed=2)
+        stale = self.server(stale_directory, seed=3)
+
+        mirrors = MirrorSet(primary.url, [stale.url])
+        downloader = Downloader(mirrors=mirrors, policy=RetryPolicy(max_attempts=3, base_delay=0.1))
+        # La sonda sceglie il mirror vecchio come più veloce, così riceve file finché non viene escluso
+        stale_mirror = mirrors.mirrors[1]
+        stale_mirror.latency, stale_mirror.throughput = 0.0, 10 ** 9
+        ok, errors, seconds = download_all(downloader, primary.url, self.files, self.output("stale"))
+        report("stale (due sorgenti)", downloader, ok, len(self.files), errors, seconds, mirrors)
+        self.check(ok == len(self.files), "tutti i file verificati nonostante il mirror non aggiornato")
+        self.check(stale_mirror.untrusted and len(stale_mirror.mismatched) >= MAX_MISMATCHES,
+                   f"mirror escluso dopo {MAX_MISMATCHES} file con hash errato")
+        downloader.close()
+
+        only = MirrorSet(stale.url)
+        downloader = Downloader(mirrors=only, policy=RetryPolicy(max_attempts=3, base_delay=0.1))
+        ok, errors, seconds = download_all(downloader, stale.url, self.files, self.output("stale-only"))
+        report("stale (unica sorgente)", downloader, ok, len(self.files), errors, seconds, only)
+        expected = sum(1 for i in range(len(self.files)) if i % 3)
+        self.check(ok == expected and all(isinstance(e, HashMismatch) for _, e in errors),
+                   "con una sola sorgente falliscono solo i file con hash errato")
+        self.check(not only.mirrors[0].untrusted, "l'unica sorgente non viene mai esclusa")
+        downloader.close()
+
+    def retry(self):
+        """503, 429 con Retry-After e connessioni interrotte: i tentativi recuperano ogni file"""
+        faults = {"503": 0.08, "429": 0.04, "reset": 0.05}
+        server = self.server(faults=faults, seed=4)
+        downloader = Downloader(policy=RetryPolicy(max_attempts=5, base_delay=0.2), hedging=False)
+        output = self.output("retry")
+        ok, errors, seconds = download_all(downloader, server.url, self.files, output)
+        report("retry", downloader, ok, len(self.files), errors, seconds)
+        print(f"   guasti iniettati: {server.injected}")
+        self.check(ok == len(self.files), "tutti i file scaricati nonostante 503/429/connessioni interrotte")
+        self.check(all(server.injected.get(fault) for fault in faults), "ogni tipo di guasto è stato iniettato")
+        self.check(not leftover_parts(output), "nessun file .part rimasto")
+        downloader.close()
+
+        # Host sempre in errore: il circuit breaker fa fallire i file invece di bloccare la sincronizzazione
+        down = self.server(faults={"503": 1.0}, seed=5)
+        downloader = Downloader(policy=RetryPolicy(max_attempts=5, base_delay=0.2, max_delay=5))
+        ok, errors, seconds = download_all(downloader, down.url, self.files[:20], self.output("down"))
+        report("host sempre in errore", downloader, ok, 20, errors, seconds)
+        self.check(ok == 0 and seconds < 60, "i file falliscono in tempi limitati con l'host fermo")
+        downloader.close()
+
+    def hedge(self):
+        """Richieste bloccate: l'hedging riduce la coda della latenza"""
+        p99 = {}
+        for hedging in (False, True):
+            server = self.server(faults={"stall": 0.05}, seed=6, stall_seconds=6)
+            downloader = Downloader(policy=RetryPolicy(max_attempts=3, base_delay=0.1), hedging=hedging)
+            output = self.output(f"hedge-{hedging}")
+            ok, errors, seconds = download_all(downloader, server.url, self.files, output)
+            report(f"hedging {'attivo' if hedging else 'disattivato'}", downloader, ok, len(self.files), errors, seconds)
+            durations = sorted(downloader.latency.durations)
+            p99[hedging] = downloader.latency.percentile(durations, 0.99) if durations else float("inf")
+            self.check(ok == len(self.files), "tutti i file scaricati")
+            self.check(not leftover_parts(output), "nessun file .part o .hedge.part rimasto")
+            if hedging:
+                self.check(downloader.latency.hedges > 0, "almeno una richiesta duplicata")
+            downloader.close()
+        self.check(p99[True] < p99[False], f"p99 con hedging {p99[True]:.2f} s < senza {p99[False]:.2f} s")
+
+
+SCENARIOS = ["failover", "stale", "retry", "hedge"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Banco di prova del Downloader con guasti iniettati")
+    parser.add_argument("scenarios", nargs="*", help=f"Scenari da eseguire: {', '.join(SCENARIOS)} (predefinito: tutti)")
+    parser.add_argument("--files", type=int, default=120, help="Numero di file per scenario")
+    args = parser.parse_args()
+    unknown = [name for name in args.scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"scenari sconosciuti: {', '.join(unknown)}")
+
+    with tempfile.TemporaryDirectory(prefix="download-bench-") as workdir:
+        bench = Bench(workdir, args.files)
+        try:
+            for name in args.scenarios or SCENARIOS:
+                getattr(bench, name)()
+        finally:
+            bench.close()
+
+    if bench.failures:
+        print(f"\n{len(bench.failures)} controlli falliti")
+        return 1
+    print("\nTutti i controlli superati")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
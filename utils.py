@@ -1,35 +1,204 @@
 # utils.py
 
 import os
+import time
+from collections import OrderedDict
+
 import requests
-from PyQt6.QtCore import QObject, pyqtSignal
+from PyQt6 import sip
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal, Qt
 from PyQt6.QtGui import QPixmap
 
-# Classe Worker per scaricare immagini in background
-class ImageDownloader(QObject):
-    finished = pyqtSignal()
-    image_ready = pyqtSignal(str, QPixmap)
+from state_store import open_store
+
+
+# Segnali emessi dai task del pool (QRunnable non è un QObject)
+class _FetchSignals(QObject):
+    finished = pyqtSignal(dict)
+
 
-    def __init__(self, uuid, heads_folder):
+# Task del pool: scarica (o rivalida) l'avatar di un UUID. Non crea QPixmap: non è consentito fuori dal thread principale
+class _FetchTask(QRunnable):
+    def __init__(self, uuid, path, etag, last_modified, signals):
         super().__init__()
         self.uuid = uuid
-        self.heads_folder = heads_folder
+        self.path = path
+        self.etag = etag
+        self.last_modified = last_modified
+        self.signals = signals
 
     def run(self):
+        result = {"uuid": self.uuid, "status": "error", "etag": self.etag, "last_modified": self.last_modified}
         try:
-            image_path = os.path.join(self.heads_folder, f"{self.uuid}.png")
-            # Scarica solo se l'immagine non è in cache
-            if not os.path.exists(image_path):
-                url = f"https://crafatar.com/avatars/{self.uuid}?size=48&overlay"
-                response = requests.get(url, timeout=10)
+            headers = {}
+            if self.etag and os.path.exists(self.path):
+                headers["If-None-Match"] = self.etag
+            if self.last_modified and os.path.exists(self.path):
+                headers["If-Modified-Since"] = self.last_modified
+            url = f"https://crafatar.com/avatars/{self.uuid}?size=48&overlay"
+            response = requests.get(url, headers=headers, timeout=10)
+            if response.status_code == 304:
+                result["status"] = "not_modified"
+            else:
                 response.raise_for_status()
-                with open(image_path, 'wb') as f:
+                temp_path = self.path + ".part"
+                with open(temp_path, 'wb') as f:
                     f.write(response.content)
-            
-            pixmap = QPixmap(image_path)
-            if not pixmap.isNull():
-                self.image_ready.emit(self.uuid, pixmap)
+                os.replace(temp_path, self.path)
+                result.update({"status": "ok", "etag": response.headers.get("ETag"),
+                               "last_modified": response.headers.get("Last-Modified"), "size": len(response.content)})
         except Exception as e:
-            print(f"Errore download immagine per {self.uuid}: {e}")
-        finally:
-            self.finished.emit()
\ No newline at end of file
+            result["error"] = str(e)
+        self.signals.finished.emit(result)
+
+
+class ImageService(QObject):
+    """
+    Servizio unico per gli avatar degli account, condiviso da launcher e dialog di login.
+
+    - Pool di thread condiviso per i download (max_workers).
+    - Cache in memoria LRU delle QPixmap già scalate, limitata in byte.
+    - Cache su disco in heads/ con scadenza (ttl) e rivalidazione tramite ETag/Last-Modified:
+      l'immagine scaduta viene mostrata subito e sostituita se il server ne ha una nuova.
+    - Richieste duplicate per lo stesso UUID vengono unite in un solo download.
+    - Dimensione totale su disco limitata, eliminando gli avatar usati meno di recente.
+    """
+
+    def __init__(self, heads_folder, ttl=24 * 3600, max_workers=4, memory_limit=4 * 1024 * 1024,
+                 disk_limit=5 * 1024 * 1024, parent=None):
+        super().__init__(parent)
+        self.heads_folder = heads_folder
+        self.ttl = ttl
+        self.memory_limit = memory_limit
+        self.disk_limit = disk_limit
+        self.index_file = os.path.join(heads_folder, "index.json")
+        self.store = open_store(self.index_file)
+        self.index = self.load_index()
+        self.memory = OrderedDict()
+        self.memory_bytes = 0
+        self.pending = {}
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_workers)
+        self.signals = _FetchSignals(self)
+        self.signals.finished.connect(self.on_fetch_finished)
+
+    def load_index(self):
+        return self.store.load()
+
+    def save_index(self):
+        self.store.save(self.index)
+
+    def image_path(self, uuid):
+        return os.path.join(self.heads_folder, f"{uuid}.png")
+
+    def load_into(self, label, uuid, size, placeholder=None):
+        """Mostra l'avatar in una QLabel; ignora il risultato se la label è già stata distrutta"""
+        def apply(pixmap):
+            if not sip.isdeleted(label) and not pixmap.isNull():
+                label.setPixmap(pixmap)
+        if placeholder and not self.is_cached(uuid, size):
+            apply(self.scaled(QPixmap(placeholder), size))
+        self.request(uuid, size, apply)
+
+    def is_cached(self, uuid, size):
+        return (uuid, size) in self.memory or os.path.exists(self.image_path(uuid))
+
+    def request(self, uuid, size, callback):
+        """
+        Richiede l'avatar alla dimensione indicata. callback(QPixmap) viene chiamata nel
+        thread principale: subito se l'immagine è in cache, di nuovo se viene aggiornata.
+        """
+        pixmap = self.from_memory(uuid, size)
+        if pixmap is None and os.path.exists(self.image_path(uuid)):
+            pixmap = self.store_memory(uuid, size, self.scaled(QPixmap(self.image_path(uuid)), size))
+        if pixmap is not None and not pixmap.isNull():
+            self.touch(uuid)
+            callback(pixmap)
+            if self.is_fresh(uuid):
+                return
+
+        if uuid in self.pending:
+            self.pending[uuid].append((size, callback))
+            return
+        self.pending[uuid] = [(size, callback)]
+        entry = self.index.get(uuid, {})
+        self.pool.start(_FetchTask(uuid, self.image_path(uuid), entry.get("etag"), entry.get("last_modified"), self.signals))
+
+    def is_fresh(self, uuid):
+        entry = self.index.get(uuid)
+        return bool(entry) and time.time() - entry.get("fetched_at", 0) < self.ttl
+
+    def touch(self, uuid):
+        if uuid in self.index:
+            self.index[uuid]["last_used"] = time.time()
+
+    def on_fetch_finished(self, result):
+        uuid = result["uuid"]
+        callbacks = self.pending.pop(uuid, [])
+        if result["status"] == "error":
+            print(f"Errore download immagine per {uuid}: {result.get('error')}")
+            return
+
+        entry = self.index.setdefault(uuid, {})
+        entry.update({"etag": result.get("etag"), "last_modified": result.get("last_modified"),
+                      "fetched_at": time.time(), "last_used": time.time()})
+        if result["status"] == "not_modified":
+            self.save_index()
+            return
+
+        entry["size"] = result.get("size", 0)
+        # Immagine cambiata: le versioni scalate in memoria non sono più valide
+        for key in [key for key in self.memory if key[0] == uuid]:
+            self.drop_memory(key)
+        self.enforce_disk_limit()
+        self.save_index()
+        original = QPixmap(self.image_path(uuid))
+        for size, callback in callbacks:
+            callback(self.store_memory(uuid, size, self.scaled(original, size)))
+
+    @staticmethod
+    def scaled(pixmap, size):
+        return pixmap.scaled(size, size, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
+
+    def from_memory(self, uuid, size):
+        pixmap = self.memory.get((uuid, size))
+        if pixmap is not None:
+            self.memory.move_to_end((uuid, size))
+        return pixmap
+
+    def store_memory(self, uuid, size, pixmap):
+        key = (uuid, size)
+        if key in self.memory:
+            self.drop_memory(key)
+        if pixmap.isNull():
+            return pixmap
+        self.memory[key] = pixmap
+        self.memory_bytes += pixmap.width() * pixmap.height() * 4
+        while self.memory_bytes > self.memory_limit and len(self.memory) > 1:
+            self.drop_memory(next(iter(self.memory)))
+        return pixmap
+
+    def drop_memory(self, key):
+        pixmap = self.memory.pop(key)
+        self.memory_bytes -= pixmap.width() * pixmap.height() * 4
+
+    def clear_memory(self):
+        """Libera le immagini decodificate (usato dalla modalità gioco)"""
+        self.memory.clear()
+        self.memory_bytes = 0
+
+    def enforce_disk_limit(self):
+        """Elimina gli avatar usati meno di recente finché la cache su disco supera il limite"""
+        entries = sorted(self.index.items(), key=lambda item: item[1].get("last_used", 0))
+        total = sum(entry.get("size", 0) for _, entry in entries)
+        for uuid, entry in entries:
+            if total <= self.disk_limit:
+                break
+            if uuid in self.pending:
+                continue
+            try:
+                os.remove(self.image_path(uuid))
+            except OSError:
+                pass
+            total -= entry.get("size", 0)
+            del self.index[uuid]
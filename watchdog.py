@@ -0,0 +1,160 @@
+import os
+import sys
+import json
+import time
+import shutil
+import signal
+import threading
+import subprocess
+from datetime import datetime
+
+from process_sampler import ProcessSampler
+
+
+class StallWatchdog:
+    """
+    Controlla il processo di gioco e riconosce i blocchi.
+
+    - Blocco: durante il caricamento, nessuna riga di log e CPU quasi ferma per
+      stall_seconds. Dopo l'avvio il silenzio è normale (il gioco scrive poco
+      mentre si gioca) e senza un campione della CPU non si segnala mai nulla.
+    - Ciclo infinito durante il caricamento: output e CPU al massimo, ma nessuna
+      nuova fase di avvio per busy_seconds.
+
+    Al blocco raccoglie alcuni thread dump (jcmd Thread.print, o SIGQUIT se jcmd
+    non è disponibile) e le ultime righe del log in un archivio zip in
+    diagnostics/, pronto da allegare a una segnalazione.
+    """
+
+    CHECK_INTERVAL = 5
+    IDLE_CPU_PERCENT = 10
+    BUSY_CPU_PERCENT = 90
+    DUMP_COUNT = 3
+    DUMP_INTERVAL = 2
+    MAX_BUNDLES = 3
+
+    def __init__(self, process, game_log, java_executable, diagnostics_directory, on_stall,
+                 boot_progress=None, stall_seconds=90, busy_seconds=180, session_info=None):
+        self.process = process
+        self.game_log = game_log
+        self.java_executable = java_executable
+        self.diagnostics_directory = diagnostics_directory
+        self.on_stall = on_stall
+        # Funzione che ritorna (fasi di avvio riconosciute, avvio completato)
+        self.boot_progress = boot_progress
+        self.stall_seconds = stall_seconds
+        self.busy_seconds = busy_seconds
+        self.session_info = session_info or {}
+        self.sampler = ProcessSampler(process.pid)
+        self.bundles = []
+        self._stop = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        start = time.monotonic()
+        last_progress = (None, start)
+        stalled = False
+        lines_after_dump = 0
+        while not self._stop.wait(self.CHECK_INTERVAL) and self.process.poll() is None:
+            now = time.monotonic()
+            sample = self.sampler.sample(now)
+            cpu = sample["cpu_percent"] if sample else None
+            silence = now - (self.game_log.last_line_time or start)
+
+            reason = None
+            progress, booted = self.boot_progress() if self.boot_progress else (None, False)
+            if progress != last_progress[0]:
+                last_progress = (progress, now)
+            # A gioco avviato il silenzio è normale; senza CPU misurata il silenzio da solo non basta
+            if not booted and cpu is not None:
+                if silence >= self.stall_seconds and cpu < self.IDLE_CPU_PERCENT:
+                    reason = f"nessun output da {silence:.0f} s con CPU al {cpu:.0f}%"
+                elif (self.boot_progress and cpu >= self.BUSY_CPU_PERCENT and silence < self.CHECK_INTERVAL * 2
+                      and now - last_progress[1] >= self.busy_seconds):
+                    reason = f"caricamento fermo da {now - last_progress[1]:.0f} s con CPU al {cpu:.0f}%"
+
+            if reason and not stalled and len(self.bundles) < self.MAX_BUNDLES:
+                # Un solo archivio per episodio: il successivo solo dopo che il gioco si è ripreso
+                stalled = True
+                bundle = self.collect_bundle(reason, cpu)
+                if bundle:
+                    self.bundles.append(bundle)
+                # Le righe scritte dai dump via SIGQUIT non indicano che il gioco si sia ripreso
+                lines_after_dump = self.game_log.lines_total
+                self.on_stall(reason, bundle)
+            elif not reason and self.game_log.lines_total > lines_after_dump:
+                stalled = False
+        self.sampler.close()
+
+    def jcmd_path(self):
+        """jcmd del runtime usato dal gioco, altrimenti quello nel PATH"""
+        name = "jcmd.exe" if sys.platform == "win32" else "jcmd"
+        if os.path.isabs(self.java_executable):
+            candidate = os.path.join(os.path.dirname(os.path.realpath(self.java_executable)), name)
+            if os.path.exists(candidate):
+                return candidate
+        return shutil.which(name)
+
+    def thread_dump(self):
+        """Ritorna (metodo, testo del dump) o (None, messaggio) se non è possibile ottenerlo"""
+        jcmd = self.jcmd_path()
+        if jcmd:
+            try:
+                result = subprocess.run([jcmd, str(self.process.pid), "Thread.print", "-l"],
+                                        capture_output=True, text=True, timeout=20, errors='ignore')
+                if result.returncode == 0 and result.stdout.strip():
+                    return "jcmd", result.stdout
+            except (OSError, subprocess.TimeoutExpired):
+                pass
+        if hasattr(signal, "SIGQUIT"):
+            # La JVM scrive il dump sul proprio stdout, che finisce nel log del gioco
+            lines_before = self.game_log.lines_total
+            try:
+                os.kill(self.process.pid, signal.SIGQUIT)
+            except OSError as e:
+                return None, f"SIGQUIT non riuscito: {e}"
+            time.sleep(self.DUMP_INTERVAL)
+            new_lines = self.game_log.lines_total - lines_before
+            tail = list(self.game_log.tail)
+            return "sigquit", "\n".join(tail[-new_lines:] if 0 < new_lines <= len(tail) else tail)
+        return None, "jcmd non disponibile e SIGQUIT non supportato su questo sistema"
+
+    def collect_bundle(self, reason, cpu):
+        """Salva dump dei thread, coda del log e informazioni sulla sessione in uno zip"""
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        folder = os.path.join(self.diagnostics_directory, f"stall-{stamp}")
+        try:
+            os.makedirs(folder, exist_ok=True)
+            methods = []
+            for i in range(self.DUMP_COUNT):
+                if self.process.poll() is not None:
+                    break
+                taken_at = datetime.now()
+                method, text = self.thread_dump()
+                methods.append(method)
+                with open(os.path.join(folder, f"threads-{i + 1}-{taken_at.strftime('%H%M%S')}.txt"), 'w', encoding='utf-8') as f:
+                    f.write(f"# {taken_at.isoformat()} ({method or 'non disponibile'})\n{text}\n")
+                if method is None:
+                    break
+                if i + 1 < self.DUMP_COUNT:
+                    time.sleep(self.DUMP_INTERVAL)
+
+            with open(os.path.join(folder, "game-log-tail.txt"), 'w', encoding='utf-8') as f:
+                f.write("\n".join(self.game_log.tail))
+            info = dict(self.session_info)
+            info.update({"detected_at": datetime.now().isoformat(timespec='seconds'), "reason": reason,
+                         "cpu_percent": cpu, "dump_methods": methods, "pid": self.process.pid,
+                         "full_log": self.game_log.log_file, "platform": sys.platform})
+            with open(os.path.join(folder, "info.json"), 'w', encoding='utf-8') as f:
+                json.dump(info, f, indent=2)
+
+            archive = shutil.make_archive(folder, "zip", folder)
+            shutil.rmtree(folder, ignore_errors=True)
+            return archive
+        except OSError:
+            return None